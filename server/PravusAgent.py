@@ -1,19 +1,35 @@
 from typing import List, Dict, Any, Optional, Tuple
 import time
 import re
+import threading
+from collections import OrderedDict
 from WarrantyAgent import WarrantyAgent
 from googletrans import Translator
+from conversation_store import ConversationStore, open_conversation_store
+from config import (
+    SESSION_MAX_LIVE, SESSION_TTL, MEMORY_MAX_HISTORY, MEMORY_MAX_TRACKED, MEMORY_MAX_TRACKED_ENTRIES
+)
+
+# Session used by clients that don't send a session_id
+DEFAULT_SESSION = 'default'
 
 class ConversationMemory:
     """Memory system for tracking conversation history"""
     
-    def __init__(self, retriever, max_history: int = 100):
+    def __init__(self, retriever, max_history: int = 100, max_tracked: int = MEMORY_MAX_TRACKED,
+                 max_tracked_entries: int = MEMORY_MAX_TRACKED_ENTRIES, warranty_agent: WarrantyAgent = None,
+                 session_id: Optional[str] = None, store: Optional[ConversationStore] = None):
         self.max_history = max_history
+        self.session_id = session_id
+        self.store = store  # Persists turns (see conversation_store.py)
+        self.store_version = None  # Store version this memory was loaded at
+        self.max_tracked = max_tracked  # Topics/devices/issues kept per table
+        self.max_tracked_entries = max_tracked_entries  # Mentions kept per topic/device/issue
         self.conversations = []  # List of conversation turns
         self.topics = {}  # Track topics discussed
         self.devices = {}  # Track devices mentioned
         self.issues = {}  # Track issues discussed
-        self.warranty_agent = WarrantyAgent(retriever)
+        self.warranty_agent = warranty_agent or WarrantyAgent(retriever)
 
     def add_turn(self, user_input: str, response: str, metadata: Dict = None):
         """Add a conversation turn to memory"""
@@ -24,6 +40,13 @@ class ConversationMemory:
             'metadata': metadata or {}
         }
         
+        self._apply_turn(turn)
+        if self.store is not None:
+            self.store.append(self.session_id, turn)
+        
+        print(f"💾 MEMORY: Added turn #{len(self.conversations)}, total turns: {len(self.conversations)}")
+    
+    def _apply_turn(self, turn: Dict):
         self.conversations.append(turn)
         
         # Keep only recent conversations
@@ -31,46 +54,58 @@ class ConversationMemory:
             self.conversations = self.conversations[-self.max_history:]
         
         # Update topic tracking
-        self._update_topics(user_input, metadata)
-        self._update_devices(user_input, metadata)
-        self._update_issues(user_input, metadata)
-        
-        print(f"💾 MEMORY: Added turn #{len(self.conversations)}, total turns: {len(self.conversations)}")
+        metadata = turn['metadata']
+        self._update_topics(turn['user_input'], metadata, turn['timestamp'])
+        self._update_devices(turn['user_input'], metadata, turn['timestamp'])
+        self._update_issues(turn['user_input'], metadata, turn['timestamp'])
+    
+    def restore(self, turns: List[Dict], version=None):
+        """Rebuild the memory from stored turns (oldest first); tracking is replayed from them."""
+        self.conversations = []
+        self.topics, self.devices, self.issues = {}, {}, {}
+        for turn in turns:
+            self._apply_turn(turn)
+        self.store_version = version
+    
+    def _track(self, table: Dict, key: str, entry: Dict):
+        """
+        Record a mention in a tracking table, keeping the most recently mentioned
+        max_tracked keys and the last max_tracked_entries mentions of each.
+        """
+        entries = table.pop(key, [])
+        entries.append(entry)
+        table[key] = entries[-self.max_tracked_entries:]
+        while len(table) > self.max_tracked:
+            del table[next(iter(table))]
     
-    def _update_topics(self, user_input: str, metadata: Dict):
+    def _update_topics(self, user_input: str, metadata: Dict, timestamp: float):
         """Track topics discussed in conversation"""
         category = metadata.get('query_category')
         if category:
-            if category not in self.topics:
-                self.topics[category] = []
-            self.topics[category].append({
+            self._track(self.topics, category, {
                 'input': user_input,
-                'timestamp': time.time()
+                'timestamp': timestamp
             })
     
-    def _update_devices(self, user_input: str, metadata: Dict):
+    def _update_devices(self, user_input: str, metadata: Dict, timestamp: float):
         """Track devices mentioned in conversation"""
         device_type = metadata.get('device_type')
         if device_type:
-            if device_type not in self.devices:
-                self.devices[device_type] = []
-            self.devices[device_type].append({
+            self._track(self.devices, device_type, {
                 'input': user_input,
-                'timestamp': time.time()
+                'timestamp': timestamp
             })
     
-    def _update_issues(self, user_input: str, metadata: Dict):
+    def _update_issues(self, user_input: str, metadata: Dict, timestamp: float):
         """Track issues discussed in conversation"""
         device_details = metadata.get('device_details', {})
         if device_details is None:
             device_details = {}
         issues = device_details.get('issues', [])
         for issue in issues:
-            if issue not in self.issues:
-                self.issues[issue] = []
-            self.issues[issue].append({
+            self._track(self.issues, issue, {
                 'input': user_input,
-                'timestamp': time.time(),
+                'timestamp': timestamp,
                 'device_type': metadata.get('device_type')
             })
     
@@ -158,12 +193,26 @@ class ConversationMemory:
         
         return has_followup_words or (has_pronouns and len(self.conversations) > 0)
     
+    def usage(self) -> Dict:
+        """Turns, tracked mentions and approximate bytes held (text plus a fixed per-entry overhead)."""
+        tracked = [entry for table in (self.topics, self.devices, self.issues) for entries in table.values() for entry in entries]
+        text_bytes = sum(len(turn['user_input']) + len(turn['response'] or '') + len(str(turn['metadata']))
+                         for turn in self.conversations)
+        text_bytes += sum(len(entry['input']) for entry in tracked)
+        return {
+            'turns': len(self.conversations),
+            'tracked_entries': len(tracked),
+            'approx_bytes': text_bytes + 200 * (len(self.conversations) + len(tracked))
+        }
+    
     def clear_memory(self):
         """Clear all conversation memory"""
         self.conversations.clear()
         self.topics.clear()
         self.devices.clear()
         self.issues.clear()
+        if self.store is not None:
+            self.store.clear(self.session_id)
         print("💾 MEMORY: Cleared all conversation history")
 
     def get_latest_problem_context(self):
@@ -187,12 +236,122 @@ class ConversationMemory:
         return False   
 
 
+class ConversationSessions:
+    """
+    ConversationMemory per chat session.
+    
+    Sessions are created on first use and kept in least-recently-used order: at
+    most max_sessions stay live, and sessions idle for ttl_seconds are dropped.
+    All sessions share one WarrantyAgent.
+    
+    With a persistent store, a session that isn't live here is loaded from it on
+    first use, and a live one is reloaded when another worker added turns to it.
+    """
+    
+    def __init__(self, retriever, max_sessions: int = SESSION_MAX_LIVE, ttl_seconds: int = SESSION_TTL,
+                 max_history: int = MEMORY_MAX_HISTORY, store: Optional[ConversationStore] = None):
+        self.retriever = retriever
+        self.store = store or ConversationStore()
+        self.max_sessions = max(1, max_sessions)
+        self.ttl_seconds = ttl_seconds
+        self.max_history = max_history
+        self.warranty_agent = WarrantyAgent(retriever)
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+    
+    def get(self, session_id: Optional[str]) -> ConversationMemory:
+        """The session's memory, created if it is new or was evicted."""
+        session_id = session_id or DEFAULT_SESSION
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None and self._changed_elsewhere(session_id, session['memory']):
+                print(f"💾 MEMORY: Session {session_id} changed in another worker, reloading")
+                self._load(session_id, session['memory'])
+            if session is None:
+                session = {'memory': self._new_memory(session_id), 'created': now}
+                self._load(session_id, session['memory'])
+                self._sessions[session_id] = session
+                self.created += 1
+                while len(self._sessions) > self.max_sessions:
+                    evicted, _ = self._sessions.popitem(last=False)
+                    self.evicted_lru += 1
+                    print(f"💾 MEMORY: Evicted least recently used session {evicted}")
+            else:
+                self._sessions.move_to_end(session_id)
+            session['last_used'] = now
+            return session['memory']
+    
+    def _new_memory(self, session_id: str) -> ConversationMemory:
+        return ConversationMemory(self.retriever, max_history=self.max_history, warranty_agent=self.warranty_agent,
+                                  session_id=session_id, store=self.store)
+    
+    def _load(self, session_id: str, memory: ConversationMemory):
+        """Fill a memory from the store, if it has the session (caller holds the lock)."""
+        try:
+            stored = self.store.load(session_id, self.max_history)
+        except Exception as e:
+            print(f"❌ MEMORY: Could not load session {session_id}: {str(e)}")
+            return
+        if stored is not None:
+            memory.restore(stored['turns'], stored['version'])
+    
+    def _changed_elsewhere(self, session_id: str, memory: ConversationMemory) -> bool:
+        try:
+            return self.store.changed_elsewhere(session_id, memory.store_version)
+        except Exception as e:
+            print(f"❌ MEMORY: Could not check session {session_id}: {str(e)}")
+            return False
+    
+    def _expire(self, now: float):
+        """Drop sessions idle longer than the TTL; the oldest are first (caller holds the lock)."""
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session['last_used'] <= self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self.evicted_ttl += 1
+    
+    def clear(self, session_id: Optional[str]):
+        """Forget a session (it starts empty if used again)."""
+        with self._lock:
+            self._sessions.pop(session_id or DEFAULT_SESSION, None)
+        self.store.clear(session_id or DEFAULT_SESSION)
+    
+    def get_stats(self) -> Dict:
+        with self._lock:
+            self._expire(time.time())
+            memories = [session['memory'] for session in self._sessions.values()]
+            stats = {
+                'live_sessions': len(memories),
+                'max_sessions': self.max_sessions,
+                'ttl_seconds': self.ttl_seconds,
+                'created': self.created,
+                'evicted_lru': self.evicted_lru,
+                'evicted_ttl': self.evicted_ttl
+            }
+        usage = [memory.usage() for memory in memories]
+        stats['turns'] = sum(u['turns'] for u in usage)
+        stats['tracked_entries'] = sum(u['tracked_entries'] for u in usage)
+        stats['approx_bytes'] = sum(u['approx_bytes'] for u in usage)
+        stats['largest_session_bytes'] = max((u['approx_bytes'] for u in usage), default=0)
+        try:
+            stats['store'] = self.store.get_stats()
+        except Exception as e:
+            stats['store'] = {'error': str(e)}
+        return stats
+
+
 class PravusAgent:
     def __init__(self, retriever, llm, tools: Dict[str, Any]):
         self.retriever = retriever
         self.llm = llm
         self.tools = tools
-        self.memory = ConversationMemory(retriever, max_history=100)  # Enhanced memory system
+        self.sessions = ConversationSessions(retriever, store=open_conversation_store())  # Conversation memory per chat session
 
     def detect_device_type(self, user_input: str) -> Dict:
         """Detect device type and extract relevant information"""
@@ -308,7 +467,8 @@ class PravusAgent:
         print(f"🔍 DETECT_DEVICE_TYPE: Final result: {result}")
         return result
 
-    def enhance_context_with_memory(self, user_input: str, context: Dict, monitor_state: Dict) -> Dict:
+    def enhance_context_with_memory(self, user_input: str, context: Dict, monitor_state: Dict,
+                                    memory: ConversationMemory) -> Dict:
         """Enhance context with conversation history and memory"""
         enhanced_context = context.copy()
         
@@ -319,12 +479,12 @@ class PravusAgent:
         enhanced_context.update(entities)
         
         # Check if this is a follow-up question
-        is_followup = self.memory.is_followup_question(user_input)
+        is_followup = memory.is_followup_question(user_input)
         enhanced_context['is_followup'] = is_followup
         
         if is_followup:
             print(f"🧠 MEMORY_ENHANCE: Detected follow-up question")
-            recent_turns = self.memory.get_recent_turns(3)
+            recent_turns = memory.get_recent_turns(3)
             if recent_turns:
                 # Get context from recent conversation
                 last_turn = recent_turns[-1]
@@ -334,7 +494,7 @@ class PravusAgent:
                 print(f"🧠 MEMORY_ENHANCE: Added previous context: {enhanced_context.get('previous_device')}")
         
         # Find similar questions from memory
-        similar_questions = self.memory.find_similar_questions(user_input)
+        similar_questions = memory.find_similar_questions(user_input)
         if similar_questions:
             enhanced_context['similar_questions'] = similar_questions
             print(f"🧠 MEMORY_ENHANCE: Found {len(similar_questions)} similar questions")
@@ -342,13 +502,13 @@ class PravusAgent:
         # Add device history if current query is about a device
         current_device = monitor_state.get('device_type')
         if current_device:
-            device_history = self.memory.get_device_history(current_device)
+            device_history = memory.get_device_history(current_device)
             if device_history:
                 enhanced_context['device_history'] = device_history
                 print(f"🧠 MEMORY_ENHANCE: Added {len(device_history)} previous {current_device} queries")
         
         # Add conversation summary
-        context_summary = self.memory.get_context_summary()
+        context_summary = memory.get_context_summary()
         enhanced_context['conversation_summary'] = context_summary
         
         # Persist device context across conversation
@@ -406,12 +566,12 @@ class PravusAgent:
         lower_input = user_input.lower()
         return any(keyword in lower_input for keyword in history_keywords)
     
-    def handle_conversation_history_query(self, user_input: str) -> str:
+    def handle_conversation_history_query(self, user_input: str, memory: ConversationMemory) -> str:
         """Handle questions about conversation history using memory"""
         lower_input = user_input.lower()
         
         # Get conversation history
-        all_turns = self.memory.get_all_turns()
+        all_turns = memory.get_all_turns()
         if not all_turns:
             return "We haven't had any previous conversation yet. This is our first interaction!"
         
@@ -440,11 +600,10 @@ class PravusAgent:
                     summary += f"{i}. You asked: \"{turn['user_input']}\"\n"
             
             # Add topics summary
-            memory_stats = self.get_memory_stats()
-            if memory_stats['devices_discussed']:
-                summary += f"\n**Devices we've discussed:** {', '.join(memory_stats['devices_discussed'])}\n"
-            if memory_stats['topics_covered']:
-                summary += f"**Topics covered:** {', '.join(memory_stats['topics_covered'])}\n"
+            if memory.devices:
+                summary += f"\n**Devices we've discussed:** {', '.join(memory.devices)}\n"
+            if memory.topics:
+                summary += f"**Topics covered:** {', '.join(memory.topics)}\n"
             
             return summary
         
@@ -453,7 +612,7 @@ class PravusAgent:
         
         else:
             # General conversation history
-            recent_turns = self.memory.get_recent_turns(3)
+            recent_turns = memory.get_recent_turns(3)
             if recent_turns:
                 response = "Here are your recent questions:\n\n"
                 for i, turn in enumerate(recent_turns, 1):
@@ -719,6 +878,9 @@ class PravusAgent:
     def act(self, user_input: str, context: Dict) -> Dict:
         print(f"\n🚀 ACT: Starting to process user input: '{user_input}'")
         
+        # This chat session's memory; concurrent sessions never share one
+        memory = self.sessions.get(context.get('session_id'))
+        
         # Get source language from context or detect it
         source_language = context.get('source_language', 'en')
         if source_language == 'en':
@@ -767,7 +929,7 @@ class PravusAgent:
         
         # Enhance context with memory and conversation tracking
         print(f"🧠 ACT: Enhancing context with memory...")
-        enhanced_context = self.enhance_context_with_memory(user_input, context, monitor_state)
+        enhanced_context = self.enhance_context_with_memory(user_input, context, monitor_state, memory)
         print(f"🧠 ACT: Enhanced context keys: {list(enhanced_context.keys())}")
         
         # Add language information to context
@@ -775,7 +937,7 @@ class PravusAgent:
         enhanced_context['target_language'] = context.get('target_language', source_language)
         
         # Get latest problem context from memory
-        latest_problem_context = self.memory.get_latest_problem_context()
+        latest_problem_context = memory.get_latest_problem_context()
         # Merge into enhanced_context if missing
         for key, value in latest_problem_context.items():
             if key not in enhanced_context or not enhanced_context[key]:
@@ -798,15 +960,15 @@ class PravusAgent:
             ):
             print("🔄 Detected new device/problem context. Optionally clearing or updating memory/context.")
         # Optionally clear or update context for new problem
-        # self.memory.clear_memory()  # Uncomment if you want to clear all memory for new device
+        # memory.clear_memory()  # Uncomment if you want to clear all memory for new device
         # Or, implement a more granular reset if needed
         # --- END NEW PROBLEM CONTEXT RESET LOGIC ---
         
         # --- WARRANTY END DATE QUERY HANDLING ---
-        if self.memory.warranty_agent.is_end_date_query(user_input):
-         memory_context = self.memory.get_latest_problem_context()
-         response = self.memory.warranty_agent.act(user_input, memory=memory_context)
-         self.memory.add_turn(user_input, response, {'agent': 'warranty', **memory_context})
+        if memory.warranty_agent.is_end_date_query(user_input):
+         memory_context = memory.get_latest_problem_context()
+         response = memory.warranty_agent.act(user_input, memory=memory_context)
+         memory.add_turn(user_input, response, {'agent': 'warranty', **memory_context})
          return {
          'response': response,
          'sources': [],
@@ -818,9 +980,9 @@ class PravusAgent:
          'device_type': monitor_state.get('device_type'),
          'query_category': monitor_state.get('query_category'),
          'conversation': [],
-         'memory_summary': self.memory.get_context_summary(),
+         'memory_summary': memory.get_context_summary(),
          'is_followup': enhanced_context.get('is_followup', False),
-         'conversation_length': len(self.memory.conversations)
+         'conversation_length': len(memory.conversations)
             }
         # --- END WARRANTY END DATE QUERY HANDLING ---
 
@@ -832,13 +994,13 @@ class PravusAgent:
 
         if (
             device_type
-            and not self.memory.has_prompted_for_warranty()
+            and not memory.has_prompted_for_warranty()
             and not (has_bill_number and has_purchase_date)):
             response = (
                 "Before we proceed, could you please provide your bill number and purchase date? "
                 "This will help me check if your product is under warranty and give you the best support."
                 )
-            self.memory.add_turn(
+            memory.add_turn(
             user_input,
             response,
               {
@@ -858,9 +1020,9 @@ class PravusAgent:
             'device_type': device_type,
             'query_category': monitor_state.get('query_category'),
             'conversation': [],
-            'memory_summary': self.memory.get_context_summary(),
+            'memory_summary': memory.get_context_summary(),
             'is_followup': enhanced_context.get('is_followup', False),
-            'conversation_length': len(self.memory.conversations)
+            'conversation_length': len(memory.conversations)
             }
         # --- END WARRANTY PROMPT LOGIC ---
         
@@ -877,6 +1039,33 @@ class PravusAgent:
         response = None
         sources = []
         intermediate = {}
+        tool_failed = False
+
+        # --- ANSWER CACHE LOOKUP ---
+        # A similar question already answered from the same manuals skips retrieval and the LLM.
+        # Answers are shared between sessions, so turns that draw on this session's history
+        # (follow-ups after earlier turns) or personal details never use the cache
+        answer_cache = context.get('answer_cache')
+        generate_step = next((step for step in steps if step['tool'] == 'generate'), None)
+        standalone = (
+            not (memory.conversations and enhanced_context.get('is_followup'))
+            and not enhanced_context.get('conversation')
+            and not (enhanced_context.get('bill_number') or enhanced_context.get('purchase_date'))
+        )
+        cacheable = answer_cache is not None and generate_step is not None and standalone
+        cache_question = generate_step['args']['question'] if generate_step else user_input
+        cache_scope = (enhanced_context.get('brand'), enhanced_context.get('model'), context.get('response_language', 'en'))
+        if cacheable:
+            try:
+                cached = answer_cache.lookup(cache_question, *cache_scope)
+            except Exception as e:
+                print(f"❌ ACT: Answer cache lookup failed: {str(e)}")
+                cached = None
+            if cached:
+                response, sources = cached['response'], cached['sources']
+                steps = []
+                cacheable = False
+        # --- END ANSWER CACHE LOOKUP ---
 
         print(f"🛠️ ACT: Executing {len(steps)} planned steps...")
         try:
@@ -892,7 +1081,7 @@ class PravusAgent:
                     response = self.tools['help'](enhanced_context)
                     print(f"  ✅ Help tool returned: {response[:50]}...")
                 elif tool == 'conversation_history':
-                    response = self.handle_conversation_history_query(args['user_input'])
+                    response = self.handle_conversation_history_query(args['user_input'], memory)
                     print(f"  ✅ Conversation history tool returned: {response[:50]}...")
                 elif tool == 'clarify':
                     response = self.tools['clarify'](enhanced_context)
@@ -917,6 +1106,14 @@ class PravusAgent:
         except Exception as e:
             print(f"❌ ACT: Error executing tool '{tool}': {str(e)}")
             response = "I encountered an error while processing your request. Please try again."
+            tool_failed = True
+
+        # Only grounded answers are cached, never errors, fallbacks or clarifications
+        if cacheable and response and sources and not tool_failed:
+            try:
+                answer_cache.store(cache_question, *cache_scope, response, sources)
+            except Exception as e:
+                print(f"❌ ACT: Answer cache store failed: {str(e)}")
 
         if not response:
             print(f"⚠️ ACT: No response generated, using fallback")
@@ -933,7 +1130,7 @@ class PravusAgent:
          'purchase_date': enhanced_context.get('purchase_date')
         }
         
-        self.memory.add_turn(user_input, response, conversation_metadata)
+        memory.add_turn(user_input, response, conversation_metadata)
 
         # Also maintain backward compatibility with context conversation
         conversation = enhanced_context.get('conversation', [])
@@ -959,9 +1156,9 @@ class PravusAgent:
             'device_type': monitor_state.get('device_type'),
             'query_category': monitor_state.get('query_category'),
             'conversation': conversation[-5:],  # Return recent conversation for backward compatibility
-            'memory_summary': self.memory.get_context_summary(),
+            'memory_summary': memory.get_context_summary(),
             'is_followup': enhanced_context.get('is_followup', False),
-            'conversation_length': len(self.memory.conversations)
+            'conversation_length': len(memory.conversations)
         }
         
         print(f"🎉 ACT: Final response: '{response}'")
@@ -973,22 +1170,26 @@ class PravusAgent:
         
         return final_result
     
-    def get_conversation_history(self, count: int = None) -> List[Dict]:
+    def get_conversation_history(self, count: int = None, session_id: Optional[str] = None) -> List[Dict]:
         """Get conversation history from memory"""
+        memory = self.sessions.get(session_id)
         if count is None:
-            return self.memory.get_all_turns()
-        return self.memory.get_recent_turns(count)
+            return memory.get_all_turns()
+        return memory.get_recent_turns(count)
     
-    def clear_conversation_memory(self):
-        """Clear conversation memory"""
-        self.memory.clear_memory()
+    def clear_conversation_memory(self, session_id: Optional[str] = None):
+        """Clear a session's conversation memory"""
+        self.sessions.clear(session_id)
+        print(f"💾 MEMORY: Cleared conversation history of session {session_id or DEFAULT_SESSION}")
     
-    def get_memory_stats(self) -> Dict:
-        """Get statistics about conversation memory"""
+    def get_memory_stats(self, session_id: Optional[str] = None) -> Dict:
+        """Get statistics about a session's conversation memory"""
+        memory = self.sessions.get(session_id)
         return {
-            'total_turns': len(self.memory.conversations),
-            'devices_discussed': list(self.memory.devices.keys()),
-            'topics_covered': list(self.memory.topics.keys()),
-            'issues_discussed': list(self.memory.issues.keys()),
-            'memory_summary': self.memory.get_context_summary()
-        }
\ No newline at end of file
+            'total_turns': len(memory.conversations),
+            'devices_discussed': list(memory.devices.keys()),
+            'topics_covered': list(memory.topics.keys()),
+            'issues_discussed': list(memory.issues.keys()),
+            'memory_summary': memory.get_context_summary(),
+            'usage': memory.usage()
+        }
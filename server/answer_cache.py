@@ -0,0 +1,159 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class AnswerCache:
+    """
+    Semantic cache of generated chat answers.
+
+    Answers are looked up by cosine similarity of the question embedding among
+    entries with the same scope: brand/model filter and response language. Each
+    entry remembers the manuals it was answered from. Uploading or deleting one
+    of those manuals, or a new manual entering the scope, drops the entry.
+    """
+
+    def __init__(self, doc_processor, threshold: float = 0.95, ttl_seconds: int = 3600, max_entries: int = 1000):
+        self.doc_processor = doc_processor
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _scope(brand: Optional[str], model: Optional[str], response_language: str):
+        return ((brand or '').strip(), (model or '').strip(), response_language or 'en')
+
+    @staticmethod
+    def _scope_admits(scope, brand: str, model: str) -> bool:
+        """Whether a manual with this brand/model would be searched under the scope."""
+        scope_brand, scope_model, _ = scope
+        return (not scope_brand or scope_brand == brand) and (not scope_model or scope_model == model)
+
+    def _matching_file_ids(self, brand: Optional[str], model: Optional[str]) -> List[str]:
+        """Active manuals a retrieval with this brand/model filter searches (as retrieve_tool does)."""
+        return self.doc_processor.catalog.find(brand, model)
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        """Unit-length question embedding, or None if embedding failed."""
+        embedding = self.doc_processor.embeddings.embed_query(question)
+        norm = float(np.linalg.norm(embedding))
+        return embedding / norm if norm else None
+
+    def _expire(self, now: float):
+        """Drop entries older than the TTL (caller holds the lock)."""
+        expired = [entry_id for entry_id, entry in self._entries.items() if now - entry['created'] > self.ttl_seconds]
+        for entry_id in expired:
+            del self._entries[entry_id]
+
+    def lookup(self, question: str, brand: Optional[str], model: Optional[str], response_language: str) -> Optional[Dict]:
+        """
+        Find a cached answer to a sufficiently similar question in the same scope.
+
+        Returns:
+            Dict with 'response', 'sources', 'question' and 'similarity', or None
+        """
+        if not self._matching_file_ids(brand, model):
+            return None
+        embedding = self._embed(question)
+        if embedding is None:
+            return None
+
+        scope = self._scope(brand, model, response_language)
+        with self._lock:
+            self._expire(time.time())
+            candidates = [(entry_id, entry) for entry_id, entry in self._entries.items() if entry['scope'] == scope]
+            if candidates:
+                similarities = np.stack([entry['embedding'] for _, entry in candidates]) @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id, entry = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    print(f"⚡ ANSWER CACHE: hit (similarity {similarities[best]:.3f}) for '{question}' "
+                          f"~ '{entry['question']}'")
+                    return {
+                        'response': entry['response'],
+                        'sources': entry['sources'],
+                        'question': entry['question'],
+                        'similarity': float(similarities[best])
+                    }
+            self.misses += 1
+        return None
+
+    def store(self, question: str, brand: Optional[str], model: Optional[str], response_language: str,
+              response: str, sources: List[Dict]):
+        """Cache a generated answer together with the manuals it depends on."""
+        file_ids = self._matching_file_ids(brand, model)
+        if not file_ids:
+            return
+        embedding = self._embed(question)
+        if embedding is None:
+            return
+
+        # Answers depend on every manual the search could have used plus any cited source
+        file_ids = set(file_ids) | {source.get('file_id') for source in sources if source.get('file_id')}
+        with self._lock:
+            self._entries[self._next_id] = {
+                'scope': self._scope(brand, model, response_language),
+                'question': question,
+                'embedding': embedding.astype(np.float32),
+                'response': response,
+                'sources': [dict(source) for source in sources],
+                'file_ids': file_ids,
+                'created': time.time()
+            }
+            self._next_id += 1
+            self.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def on_manuals_changed(self, event: str, file_id: Optional[str], manual: Optional[Dict]):
+        """DocumentProcessor change listener: drop answers the changed manual could affect."""
+        with self._lock:
+            if event == 'cleared':
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                brand = (manual or {}).get('brand', '')
+                model = (manual or {}).get('model', '')
+                stale = [
+                    entry_id for entry_id, entry in self._entries.items()
+                    if file_id in entry['file_ids'] or self._scope_admits(entry['scope'], brand, model)
+                ]
+                for entry_id in stale:
+                    del self._entries[entry_id]
+                dropped = len(stale)
+            self.invalidations += dropped
+        if dropped:
+            print(f"🧹 ANSWER CACHE: manual {event}, dropped {dropped} cached answers")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'stores': self.stores,
+                'invalidations': self.invalidations
+            }
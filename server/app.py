@@ -13,6 +13,10 @@ from googletrans import Translator
 from document_processor import DocumentProcessor
 from llm_service import LLMService
 from config import UPLOAD_FOLDER, MAX_CONTENT_LENGTH, MANUAL_FIELDS, DEFAULT_LLM_MODEL, VECTOR_DB_PATH, LLM_PROVIDER
+from config import ANSWER_CACHE_ENABLED, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL, ANSWER_CACHE_SIZE, SEARCH_BATCH_MAX
+from config import INGEST_MAX_JOBS, INGEST_MAX_QUEUED, INGEST_JOBS_DB_PATH
+from answer_cache import AnswerCache
+from ingest_jobs import IngestJobs, DUPLICATE, QUEUE_FULL
 
 from tools import retrieve_tool, summarize_tool, translate_tool,greet_tool, help_tool, no_manuals_tool, no_matching_manuals_tool, no_context_tool, generate_tool,clarify_tool
 
@@ -36,6 +40,15 @@ os.makedirs(VECTOR_DB_PATH, exist_ok=True)
 doc_processor = DocumentProcessor()
 llm_service = LLMService()
 
+# Semantic answer cache, invalidated whenever the manuals behind an answer change
+answer_cache = None
+if ANSWER_CACHE_ENABLED:
+    answer_cache = AnswerCache(doc_processor, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL, ANSWER_CACHE_SIZE)
+    doc_processor.add_change_listener(answer_cache.on_manuals_changed)
+
+# Background ingestion of uploaded manuals, polled through /api/jobs/<job_id> on any worker
+ingest_jobs = IngestJobs(INGEST_JOBS_DB_PATH, doc_processor.shared, INGEST_MAX_JOBS, INGEST_MAX_QUEUED)
+
 # Initialize translator
 translator = Translator()
 retriever = doc_processor.get_retriever()
@@ -60,6 +73,14 @@ pravus_agent  = PravusAgent(retriever, llm_service, tools)
 if not doc_processor.documents:
     print("No documents found in the database. The chatbot will operate in general knowledge mode until manuals are uploaded.")
 
+@app.before_request
+def refresh_shared_state():
+    """Pick up manuals other server workers added or deleted (cheap when nothing changed)."""
+    try:
+        doc_processor.refresh()
+    except Exception as e:
+        print(f"⚠️  Could not refresh shared index state: {str(e)}")
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """
@@ -105,22 +126,23 @@ def serve_manual(filename):
         
         # If not found, try to find it by searching through metadata
         print(f"File not found at {file_path}, searching through metadata...")
-        for file_id, metadata in doc_processor.metadata.items():
-            if metadata.get('filename') == actual_filename:
-                print(f"Found file in metadata: {metadata}")
-                # Try different possible paths
-                possible_paths = [
-                    os.path.join(UPLOAD_FOLDER, actual_filename),
-                    os.path.join(UPLOAD_FOLDER, metadata.get('filename', '')),
-                ]
-                
-                for path in possible_paths:
-                    if os.path.exists(path):
-                        print(f"Found PDF at: {path}")
-                        if download:
-                            return send_file(path, as_attachment=True, download_name=actual_filename, mimetype='application/pdf')
-                        else:
-                            return send_file(path, as_attachment=False, mimetype='application/pdf')
+        file_id = doc_processor.catalog.file_id_for(actual_filename)
+        metadata = doc_processor.metadata.get(file_id) if file_id else None
+        if metadata:
+            print(f"Found file in metadata: {metadata}")
+            # Try different possible paths
+            possible_paths = [
+                os.path.join(UPLOAD_FOLDER, actual_filename),
+                os.path.join(UPLOAD_FOLDER, metadata.get('filename', '')),
+            ]
+            
+            for path in possible_paths:
+                if os.path.exists(path):
+                    print(f"Found PDF at: {path}")
+                    if download:
+                        return send_file(path, as_attachment=True, download_name=actual_filename, mimetype='application/pdf')
+                    else:
+                        return send_file(path, as_attachment=False, mimetype='application/pdf')
         
         # If still not found, return 404 with helpful message
         print(f"PDF file not found: {actual_filename}")
@@ -171,24 +193,25 @@ def download_manual(filename):
         
         # If not found, try to find it by searching through metadata
         print(f"File not found at {file_path}, searching through metadata...")
-        for file_id, metadata in doc_processor.metadata.items():
-            if metadata.get('filename') == actual_filename:
-                print(f"Found file in metadata: {metadata}")
-                # Try different possible paths
-                possible_paths = [
-                    os.path.join(UPLOAD_FOLDER, actual_filename),
-                    os.path.join(UPLOAD_FOLDER, metadata.get('filename', '')),
-                ]
-                
-                for path in possible_paths:
-                    if os.path.exists(path):
-                        print(f"Found and downloading PDF at: {path}")
-                        return send_file(
-                            path, 
-                            as_attachment=True, 
-                            download_name=actual_filename, 
-                            mimetype='application/pdf'
-                        )
+        file_id = doc_processor.catalog.file_id_for(actual_filename)
+        metadata = doc_processor.metadata.get(file_id) if file_id else None
+        if metadata:
+            print(f"Found file in metadata: {metadata}")
+            # Try different possible paths
+            possible_paths = [
+                os.path.join(UPLOAD_FOLDER, actual_filename),
+                os.path.join(UPLOAD_FOLDER, metadata.get('filename', '')),
+            ]
+            
+            for path in possible_paths:
+                if os.path.exists(path):
+                    print(f"Found and downloading PDF at: {path}")
+                    return send_file(
+                        path, 
+                        as_attachment=True, 
+                        download_name=actual_filename, 
+                        mimetype='application/pdf'
+                    )
         
         # If still not found, return 404 with helpful message
         print(f"PDF file not found for download: {actual_filename}")
@@ -239,7 +262,9 @@ def chat():
         'source_language': source_language,
         'doc_processor': doc_processor,
         'llm_service': llm_service,
-        'awaiting_clarification': awaiting_clarification
+        'answer_cache': answer_cache,
+        'awaiting_clarification': awaiting_clarification,
+        'session_id': data.get('session_id')
     }
     
     response = pravus_agent.act(user_message, context)
@@ -294,23 +319,25 @@ def upload_file():
         
         # First check for duplicate filename
         filename = secure_filename(file.filename)
-        for existing in existing_manuals:
-            if existing.get('filename') == filename:
-                print(f"File with same name already exists: {filename}")
-                return jsonify({
-                    'success': False,
-                    'error': f'A file with the name "{filename}" already exists in the system. Please rename your file or delete the existing one first.',
-                    'duplicate_info': {
-                        'filename': existing.get('filename'),
-                        'brand': existing.get('brand', 'Unknown'),
-                        'model': existing.get('model', 'Unknown'),
-                        'upload_date': existing.get('timestamp'),
-                        'file_id': existing.get('file_id')
-                    }
-                }), 409  # 409 Conflict status code
+        existing_id = doc_processor.catalog.file_id_for(filename)
+        existing = next((m for m in existing_manuals if m['file_id'] == existing_id), None) if existing_id else None
+        if existing:
+            print(f"File with same name already exists: {filename}")
+            return jsonify({
+                'success': False,
+                'error': f'A file with the name "{filename}" already exists in the system. Please rename your file or delete the existing one first.',
+                'duplicate_info': {
+                    'filename': existing.get('filename'),
+                    'brand': existing.get('brand', 'Unknown'),
+                    'model': existing.get('model', 'Unknown'),
+                    'upload_date': existing.get('timestamp'),
+                    'file_id': existing.get('file_id')
+                }
+            }), 409  # 409 Conflict status code
         
         # Then check for duplicate manual (brand/model/language combination)
-        for existing in existing_manuals:
+        same_model = set(doc_processor.catalog.find(metadata['brand'], metadata['model']))
+        for existing in (m for m in existing_manuals if m['file_id'] in same_model):
             if (existing.get('brand') == metadata['brand'] and 
                 existing.get('model') == metadata['model'] and
                 existing.get('language') == metadata['language']):
@@ -334,18 +361,36 @@ def upload_file():
                     'cached': True
                 })
         
+        # Reserve the job before saving: an upload still being ingested (by any server
+        # process) reads its file, so it must not be overwritten
+        job, refused = ingest_jobs.reserve(filename)
+        if refused == DUPLICATE:
+            print(f"File with same name is already being processed: {filename}")
+            return jsonify({
+                'success': False,
+                'error': f'A file with the name "{filename}" is already being processed. Please wait for it to finish.'
+            }), 409
+        if refused == QUEUE_FULL:
+            print("Error: Ingest queue is full")
+            return jsonify({
+                'success': False,
+                'error': 'Too many manuals are waiting to be processed. Please try again later.'
+            }), 503
+        
         # Save file to uploads directory with secure filename
-        filename = secure_filename(file.filename)
         file_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(file_path)
+        try:
+            file.save(file_path)
+        except Exception as e:
+            ingest_jobs.cancel(job['job_id'], f'Could not save the upload: {str(e)}')
+            raise
         
         print(f"File saved at: {file_path}")
-        print("Starting PDF processing and embedding generation...")
         
-        try:
+        def ingest(progress):
             # Process the PDF and add to vector store with provided metadata
             print("Calling document processor...")
-            file_id = doc_processor.process_pdf(file_path, metadata)
+            file_id = doc_processor.process_pdf(file_path, metadata, progress=progress)
             print(f"PDF processing completed successfully. File ID: {file_id}")
             
             # Get the stored metadata
@@ -354,8 +399,8 @@ def upload_file():
             # Convert timestamp to milliseconds for JavaScript
             timestamp = int(datetime.fromisoformat(file_metadata['timestamp']).timestamp() * 1000)
             
-            # Prepare response with metadata
-            response_data = {
+            # The original PDF is kept for serving via the /manuals/ endpoint
+            return {
                 'success': True,
                 'file_id': file_id,
                 'filename': file_metadata['filename'],
@@ -367,21 +412,18 @@ def upload_file():
                 'year': metadata['year'],
                 'message': f'Successfully uploaded and processed {file_metadata["filename"]}'
             }
-            
-            return jsonify(response_data)
-        except Exception as e:
-            print(f"Error processing file: {str(e)}")
-            print(traceback.format_exc())
-            return jsonify({
-                'success': False,
-                'error': f'Error processing file: {str(e)}'
-            }), 500
-        finally:
-            # Keep the uploaded file for serving via /manuals/ endpoint
-            # The original PDF is now available for viewing
-            print(f"Original PDF kept at: {file_path}")
-            # Note: We no longer delete the file so it can be served later
-            pass
+        
+        # Parsing and embedding run in the background; the client polls the job
+        ingest_jobs.start(job['job_id'], ingest)
+        
+        print(f"Queued PDF processing as job {job['job_id']}")
+        return jsonify({
+            'success': True,
+            'job_id': job['job_id'],
+            'status_url': f"/api/jobs/{job['job_id']}",
+            'filename': filename,
+            'message': f'Upload received, processing {filename}'
+        }), 202
     except Exception as e:
         print(f"Unexpected error in upload_file: {str(e)}")
         print(traceback.format_exc())
@@ -391,6 +433,24 @@ def upload_file():
         }), 500
 
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Report the progress of a background upload: state, stage, pages processed,
+    chunks embedded and an ETA, plus the upload response once it completes
+    """
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify(dict(job, success=True))
+
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """List recent upload jobs, newest first"""
+    return jsonify({'success': True, 'jobs': ingest_jobs.list()})
+
+
 @app.route('/api/files', methods=['GET'])
 def get_files():
     """
@@ -491,8 +551,7 @@ def get_brands():
     """
     Return a list of all unique brands in the system
     """
-    manuals = doc_processor.get_all_manuals()
-    brands = sorted(list(set(manual.get('brand', 'Unknown') for manual in manuals)))
+    brands = doc_processor.catalog.brands()
     
     return jsonify({
         'brands': brands
@@ -504,14 +563,9 @@ def get_models():
     Return a list of all models, optionally filtered by brand
     """
     brand = request.args.get('brand')
-    manuals = doc_processor.get_all_manuals()
     
-    if brand:
-        # Filter by brand
-        filtered_manuals = [m for m in manuals if m.get('brand') == brand]
-        models = sorted(list(set(manual.get('model', 'Unknown') for manual in filtered_manuals)))
-    else:
-        models = sorted(list(set(manual.get('model', 'Unknown') for manual in manuals)))
+    # Optionally filtered by brand; cached until the next upload or delete
+    models = doc_processor.catalog.models(brand)
     
     return jsonify({
         'models': models
@@ -543,6 +597,8 @@ def get_database_stats():
     """
     stats = doc_processor.get_database_stats()
     stats['is_empty'] = doc_processor.is_db_empty()
+    stats['answer_cache'] = answer_cache.get_stats() if answer_cache is not None else None
+    stats['conversation_memory'] = pravus_agent.sessions.get_stats()
     
     return jsonify(stats)
 
@@ -554,9 +610,13 @@ def verify_database():
     stats = doc_processor.get_database_stats()
     is_empty = doc_processor.is_db_empty()
     
-    # Check for consistency
+    # Check for consistency: every chunk has its own index vector unless it is still waiting
+    # for its embedding or shares a duplicate chunk's vector
+    expected_index_size = (
+        stats['total_documents'] - stats['pending_embeddings'] - stats['deduplication']['shared_chunks']
+    )
     consistent = (
-        stats['total_documents'] == stats['index_size'] and
+        expected_index_size == stats['index_size'] and
         len(stats['manuals']) == stats['total_manuals'] and
         (is_empty == (stats['total_documents'] == 0))
     )
@@ -564,9 +624,82 @@ def verify_database():
     return jsonify({
         'is_empty': is_empty,
         'is_consistent': consistent,
+        'expected_index_size': expected_index_size,
         'stats': stats
     })
 
+@app.route('/api/search/batch', methods=['POST'])
+def batch_search():
+    """
+    Run many searches in one request (for offline QA and evaluation jobs).
+    
+    Body: {"queries": [{"query": "...", "brand": "...", "model": "..."}, ...], "k": 4}
+    Plain strings are accepted as unfiltered queries.
+    """
+    try:
+        data = request.json or {}
+        items = data.get('queries', [])
+        k = data.get('k', 4)
+        include_deleted = bool(data.get('include_deleted', False))
+        
+        if not isinstance(items, list):
+            return jsonify({'success': False, 'error': 'queries must be a list'}), 400
+        if isinstance(k, bool) or not isinstance(k, int) or k <= 0:
+            return jsonify({'success': False, 'error': 'k must be a positive integer'}), 400
+        
+        queries = []
+        for i, item in enumerate(items):
+            if isinstance(item, str):
+                item = {'query': item}
+            if not isinstance(item, dict) or not isinstance(item.get('query'), str):
+                return jsonify({'success': False, 'error': f'Query {i} must be a string or an object with a "query" string'}), 400
+            if any(item.get(key) is not None and not isinstance(item[key], str) for key in ('brand', 'model')):
+                return jsonify({'success': False, 'error': f'Query {i}: brand and model must be strings'}), 400
+            queries.append(item)
+        
+        if not queries:
+            return jsonify({'success': False, 'error': 'No queries provided'}), 400
+        if len(queries) > SEARCH_BATCH_MAX:
+            return jsonify({
+                'success': False,
+                'error': f'Too many queries: {len(queries)} (max {SEARCH_BATCH_MAX} per request)'
+            }), 400
+        
+        start_time = time.time()
+        batch_results = doc_processor.similarity_search_batch(queries, k=k, include_deleted=include_deleted)
+        
+        results = []
+        for item, docs in zip(queries, batch_results):
+            results.append({
+                'query': item.get('query', ''),
+                'filters': {'brand': item.get('brand'), 'model': item.get('model')},
+                'count': len(docs),
+                'results': [{
+                    'rank': i + 1,
+                    'file_id': doc.metadata.get('file_id'),
+                    'brand': doc.metadata.get('brand'),
+                    'model': doc.metadata.get('model'),
+                    'page': doc.metadata.get('page'),
+                    'chunk': doc.metadata.get('chunk'),
+                    'content_preview': doc.page_content[:300] + "..." if len(doc.page_content) > 300 else doc.page_content
+                } for i, doc in enumerate(docs)]
+            })
+        
+        return jsonify({
+            'success': True,
+            'count': len(results),
+            'elapsed_ms': (time.time() - start_time) * 1000,
+            'results': results
+        })
+        
+    except Exception as e:
+        print(f"Error in batch_search: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/debug/search', methods=['POST'])
 def debug_search():
     """
@@ -761,9 +894,10 @@ Summary:"""
 
 @app.route('/api/clear-memory', methods=['POST'])
 def clear_memory():
-    """Clear the PravusAgent's conversation memory"""
+    """Clear the conversation memory of the chat session in the request body (session_id)"""
     try:
-        pravus_agent.clear_conversation_memory()
+        data = request.get_json(silent=True) or {}
+        pravus_agent.clear_conversation_memory(data.get('session_id'))
         return jsonify({'success': True, 'message': 'Memory cleared successfully'})
     except Exception as e:
         print(f"❌ Error clearing memory: {str(e)}")
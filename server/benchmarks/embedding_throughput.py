@@ -0,0 +1,103 @@
+"""
+Embedding throughput benchmark against a local mock Azure OpenAI endpoint.
+
+Starts an HTTP server that imitates the Azure embeddings API (fixed latency per
+request, optional 429s with Retry-After) and measures chunks/sec of
+AzureOpenAIEmbeddings.embed_documents for several worker counts.
+
+Usage (from the server directory):
+    python benchmarks/embedding_throughput.py --chunks 600 --latency 0.2 --workers 1 2 4 8
+
+Quota limits are off by default so the numbers show raw concurrency; pass
+--rpm/--tpm to see throughput under a deployment's quota instead.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+class MockEmbeddingHandler(BaseHTTPRequestHandler):
+    latency = 0.2
+    throttle_every = 0
+    requests_seen = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        inputs = body.get('input', [])
+        with MockEmbeddingHandler.lock:
+            MockEmbeddingHandler.requests_seen += 1
+            throttled = self.throttle_every and MockEmbeddingHandler.requests_seen % self.throttle_every == 0
+
+        if throttled:
+            payload = json.dumps({'error': {'code': '429', 'message': 'Rate limit reached. Please retry after 1 second.'}}).encode()
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+        else:
+            time.sleep(self.latency)
+            payload = json.dumps({
+                'object': 'list',
+                'data': [{'object': 'embedding', 'index': i, 'embedding': [0.001 * (i % 7)] * 1536} for i in range(len(inputs))],
+                'usage': {'prompt_tokens': 0, 'total_tokens': 0}
+            }).encode()
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=600)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds per mock request')
+    parser.add_argument('--throttle-every', type=int, default=0, help='answer every Nth request with 429')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--rpm', type=int, default=0, help='requests per minute limit (0 = unlimited)')
+    parser.add_argument('--tpm', type=int, default=0, help='tokens per minute limit (0 = unlimited)')
+    args = parser.parse_args()
+
+    MockEmbeddingHandler.latency = args.latency
+    MockEmbeddingHandler.throttle_every = args.throttle_every
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockEmbeddingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ.update({
+        'AZURE_OPENAI_API_KEY': 'benchmark',
+        'AZURE_OPENAI_ENDPOINT': f'http://127.0.0.1:{server.server_port}',
+        'AZURE_OPENAI_API_VERSION': '2023-05-15',
+        'AZURE_OPENAI_EMBEDDING_DEPLOYMENT': 'benchmark-embeddings',
+        'EMBEDDING_CACHE_ENABLED': 'false',
+        'EMBEDDING_RPM': str(args.rpm),
+        'EMBEDDING_TPM': str(args.tpm)
+    })
+    from document_processor import AzureOpenAIEmbeddings
+
+    texts = [f"chunk {i} " + "washing machine filter cleaning " * 30 for i in range(args.chunks)]
+    embeddings = AzureOpenAIEmbeddings()
+
+    results = []
+    for workers in args.workers:
+        embeddings.executor.workers = workers
+        start = time.time()
+        vectors, failed = embeddings.executor.run(texts)
+        elapsed = time.time() - start
+        results.append((workers, elapsed, len(texts) / elapsed, len(failed)))
+
+    print("\nworkers  seconds  chunks/sec  failed")
+    for workers, elapsed, rate, failed in results:
+        print(f"{workers:>7}  {elapsed:>7.2f}  {rate:>10.1f}  {failed:>6}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Recall@k vs. latency report for the vector index configurations.
+
+Builds every configuration through vector_index.build_index (the same factory
+DocumentProcessor uses) and compares its top-k against exact Flat search.
+Uses the persisted embeddings of the current snapshot when available, otherwise a
+synthetic clustered corpus.
+
+Usage (from the server directory):
+    python benchmarks/index_recall.py --k 10 --queries 200
+    python benchmarks/index_recall.py --synthetic 200000
+    python benchmarks/index_recall.py --storage fp16 int8 pq --rerank 4
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from vector_index import build_index, default_params, apply_search_params, bytes_per_vector, exact_rerank
+
+
+def synthetic_corpus(n: int, dimensions: int, seed: int = 0) -> np.ndarray:
+    """Unit-norm vectors drawn around a few hundred centres, roughly like manual chunks."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(1, n // 500), dimensions)).astype(np.float32)
+    vectors = centres[rng.integers(0, len(centres), n)] + 0.5 * rng.standard_normal((n, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def load_corpus(args) -> np.ndarray:
+    if not args.synthetic:
+        import json
+        from config import VECTOR_DB_PATH
+        # The manifest names the current snapshot directory
+        snapshot = ''
+        manifest_path = os.path.join(VECTOR_DB_PATH, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f).get('snapshot', '')
+        path = os.path.join(VECTOR_DB_PATH, snapshot, "embeddings.npy")
+        if os.path.exists(path):
+            vectors = np.load(path)
+            vectors = vectors[np.any(vectors, axis=1)]
+            if len(vectors):
+                print(f"Using {len(vectors)} persisted embeddings from {path}")
+                return np.ascontiguousarray(vectors, dtype=np.float32)
+        print("No persisted embeddings found, falling back to a synthetic corpus")
+    n = args.synthetic or 50000
+    print(f"Using {n} synthetic vectors")
+    return synthetic_corpus(n, args.dimensions)
+
+
+def evaluate(index, queries: np.ndarray, truth: np.ndarray, k: int, vectors: np.ndarray = None, rerank: int = 0):
+    start = time.perf_counter()
+    _, found = index.search(queries, k * rerank if rerank else k)
+    if rerank:
+        # Same full-precision rerank DocumentProcessor applies to compressed indexes
+        found = np.array([candidates[exact_rerank(vectors, candidates, query)[1][:k]]
+                          for query, candidates in zip(queries, found)])
+    latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(queries))])
+    return recall, latency_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--synthetic', type=int, default=0, help='use N synthetic vectors instead of the stored corpus')
+    parser.add_argument('--dimensions', type=int, default=1536)
+    parser.add_argument('--storage', nargs='*', default=['float32'], help='vector encodings to compare (float32, fp16, int8, pq)')
+    parser.add_argument('--rerank', type=int, default=0, help='rerank factor applied to compressed encodings')
+    args = parser.parse_args()
+
+    vectors = load_corpus(args)
+    ids = np.arange(len(vectors), dtype=np.int64)
+    rng = np.random.default_rng(1)
+    # Perturbed corpus vectors stand in for queries that land near real chunks
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+    flat = build_index(vectors.shape[1], vectors, ids, default_params('flat', len(vectors)))
+    _, truth = flat.search(queries, args.k)
+
+    configurations = []
+    for storage in args.storage:
+        configurations += [('flat', {}, storage)]
+        configurations += [('ivf', {'nprobe': nprobe}, storage) for nprobe in (1, 4, 16, 64)]
+        configurations += [('hnsw', {'efSearch': ef}, storage) for ef in (16, 64, 128, 256)]
+
+    rows = []
+    built = {}
+    for index_type, search_params, storage in configurations:
+        params = default_params(index_type, len(vectors), search_params, storage=storage)
+        if (index_type, storage) not in built:
+            start = time.perf_counter()
+            built[(index_type, storage)] = (build_index(vectors.shape[1], vectors, ids, params), time.perf_counter() - start)
+        index, build_seconds = built[(index_type, storage)]
+        # Search-time parameters can be changed on an already built index
+        apply_search_params(index, params)
+        rerank = args.rerank if storage != 'float32' else 0
+        recall, latency_ms = evaluate(index, queries, truth, args.k, vectors, rerank)
+        tuning = ', '.join(f"{key}={value}" for key, value in params.items() if key not in ('type', 'storage', 'trained_on'))
+        rows.append((index_type, storage, tuning or '-', bytes_per_vector(index, params), recall, latency_ms, build_seconds))
+
+    print(f"\nrecall@{args.k} over {len(queries)} queries, {len(vectors)} vectors" +
+          (f", compressed encodings reranked x{args.rerank}" if args.rerank else ""))
+    print(f"{'index':<6} {'storage':<8} {'parameters':<40} {'B/vec':>6} {'recall':>7} {'ms/query':>9} {'build s':>8}")
+    for index_type, storage, tuning, per_vector, recall, latency_ms, build_seconds in rows:
+        print(f"{index_type:<6} {storage:<8} {tuning:<40} {per_vector:>6.0f} {recall:>7.3f} {latency_ms:>9.3f} {build_seconds:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Pages/sec of PDF extraction, cleaning and chunking for several worker counts.
+
+Runs page_processing.process_pdf_pages (the same path DocumentProcessor.process_pdf
+uses) over the given PDFs and checks that every worker count produces the same
+chunks.
+
+Usage (from the server directory):
+    python benchmarks/page_processing.py ../public/manuals/*/*.pdf --workers 1 2 4 8
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP
+from page_processing import process_pdf_pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pdfs', nargs='+')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    print(f"{len(args.pdfs)} PDFs, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'pages':>6} {'wall s':>8} {'pages/s':>8} {'extract s':>10} {'clean s':>8} {'chunk s':>8}")
+    worker_counts = sorted(set(args.workers))
+    reference = None
+    for workers in worker_counts:
+        totals = {'pages': 0, 'wall': 0.0, 'extract': 0.0, 'clean': 0.0, 'chunk': 0.0}
+        chunks = []
+        for path in args.pdfs:
+            pages, timings = process_pdf_pages(path, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP, workers)
+            totals['pages'] += len(pages)
+            for stage in ('wall', 'extract', 'clean', 'chunk'):
+                totals[stage] += timings[stage]
+            chunks.append([page['chunks'] for page in pages])
+        if reference is None:
+            reference = chunks
+        elif chunks != reference:
+            print(f"!! output with {workers} workers differs from {worker_counts[0]} workers")
+        print(f"{workers:>8} {totals['pages']:>6} {totals['wall']:>8.2f} {totals['pages'] / totals['wall']:>8.1f} "
+              f"{totals['extract']:>10.2f} {totals['clean']:>8.2f} {totals['chunk']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Microbenchmark for the lexical re-scoring stage of similarity_search.
+
+Compares the former per-candidate Python loop (with and without its per-candidate
+logging) against rescoring.rescore over precomputed features, and checks that
+both produce identical scores.
+
+Usage (from the server directory):
+    python benchmarks/rescoring.py --candidates 200 --repeat 200
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rescoring import PROGRAM_KEYWORDS, INSTRUCTIONAL_TERMS, DETAIL_TERMS, compute_lexical_features, rescore
+
+WORDS = (INSTRUCTIONAL_TERMS + DETAIL_TERMS +
+         ['the', 'drum', 'filter', 'door', 'water', 'load', 'clean', 'cotton', 'wool', 'program', 'machine', 'and', 'of'])
+QUERIES = ['how do I clean the filter', 'which program for wool', 'spin cycle temperature settings', 'door will not open']
+
+
+def synthetic_texts(n: int, seed: int = 0):
+    """Manual-like chunks of 50-250 words drawn from a small vocabulary."""
+    rng = np.random.default_rng(seed)
+    return [' '.join(rng.choice(WORDS, size=rng.integers(50, 250))).capitalize() for _ in range(n)]
+
+
+def legacy_rescore(distances, texts, query, verbose=True):
+    """The scoring loop as it used to run inside similarity_search."""
+    scores = []
+    for score, text in zip(distances, texts):
+        if verbose:
+            print(f"  📄 Doc {len(scores)+1}: Score={score:.4f}")
+            print(f"      Content preview: {text[:100]}...")
+        query_lower = query.lower()
+        content_lower = text.lower()
+        if query_lower in content_lower:
+            score = score * 0.7
+        word_matches = sum(1 for word in query_lower.split() if word in content_lower)
+        if word_matches > 1:
+            score = score * (1.0 - (word_matches * 0.05))
+        if any(keyword in query_lower for keyword in PROGRAM_KEYWORDS):
+            if len(text) > 500:
+                score = score * 0.8
+            if sum(1 for term in INSTRUCTIONAL_TERMS if term in content_lower) >= 3:
+                score = score * 0.85
+            if sum(1 for term in DETAIL_TERMS if term in content_lower) >= 2:
+                score = score * 0.9
+        if verbose:
+            print(f"      ✅ Final score: {score:.4f}")
+        scores.append(score)
+    return scores
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--candidates', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    texts = synthetic_texts(args.candidates)
+    features = compute_lexical_features(texts)
+    distances = np.random.default_rng(1).uniform(0.2, 0.6, len(texts)).astype(np.float32)
+
+    print(f"{'query':<34} {'loop+log ms':>12} {'loop ms':>8} {'numpy ms':>9} {'speedup':>8}")
+    for query in QUERIES:
+        expected = legacy_rescore(distances, texts, query, verbose=False)
+        actual = rescore(distances, texts, features, query)
+        assert np.array_equal(np.array(expected, dtype=np.float64), actual), f"score mismatch for {query!r}"
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            logged_ms = timed(lambda: legacy_rescore(distances, texts, query), args.repeat)
+        loop_ms = timed(lambda: legacy_rescore(distances, texts, query, verbose=False), args.repeat)
+        numpy_ms = timed(lambda: rescore(distances, texts, features, query), args.repeat)
+        print(f"{query:<34} {logged_ms:>12.3f} {loop_ms:>8.3f} {numpy_ms:>9.3f} {logged_ms / numpy_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Ingest a directory tree of PDF manuals in one run.
+
+Brand/model metadata comes from a sidecar manifest, CSV or JSON, with one
+entry per PDF: `path` (relative to the directory) plus any of brand, model,
+product_type, year and language. JSON may be a list of such objects or an
+object mapping path -> metadata. By default manifest.csv or manifest.json in
+the directory is used; PDFs missing from it are reported and skipped.
+
+Files are processed in parallel through DocumentProcessor. Nothing is
+journaled per manual: state is written as one snapshot at the end (or every
+--save-every files), after which the files are recorded in the checkpoint so
+a rerun skips them. Work lost to a crash before a save is cheap to redo,
+since embeddings come back from the embedding cache.
+
+Run it while the server is stopped (the server keeps its own copy of the
+index and would overwrite the result on its next save).
+
+Usage (from the server directory):
+    python bulk_ingest.py ../public/manuals/washing-machines --jobs 2
+    python bulk_ingest.py /data/manuals --manifest /data/manuals.csv --save-every 50
+"""
+import os
+import csv
+import sys
+import json
+import time
+import shutil
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from werkzeug.utils import secure_filename
+
+from config import UPLOAD_FOLDER, VECTOR_DB_PATH, MANUAL_FIELDS
+from document_processor import DocumentProcessor
+
+CHECKPOINT_NAME = "bulk_ingest_checkpoint.json"
+
+
+def load_manifest(path: str) -> Dict[str, Dict]:
+    """Metadata per PDF path (as written in the manifest, relative to the ingested directory)."""
+    if path.lower().endswith('.csv'):
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        rows = [dict(meta, path=rel_path) for rel_path, meta in data.items()] if isinstance(data, dict) else data
+
+    manifest = {}
+    for row in rows:
+        rel_path = (row.get('path') or '').strip()
+        if not rel_path:
+            print(f"⚠️  Manifest row without a path: {row}")
+            continue
+        manifest[os.path.normpath(rel_path)] = {field: str(row[field]).strip() for field in MANUAL_FIELDS if row.get(field)}
+    return manifest
+
+
+def find_manifest(directory: str) -> Optional[str]:
+    for name in ("manifest.csv", "manifest.json"):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def find_pdfs(directory: str) -> List[str]:
+    """PDF paths under directory, relative to it, in a stable order."""
+    found = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith('.pdf'):
+                found.append(os.path.relpath(os.path.join(root, name), directory))
+    return sorted(found)
+
+
+def load_checkpoint(path: str) -> Dict[str, Dict]:
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Dict]):
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def file_signature(path: str) -> Dict:
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory')
+    parser.add_argument('--manifest', help="CSV or JSON metadata file (default: manifest.csv/.json in the directory)")
+    parser.add_argument('--jobs', type=int, default=2, help="Manuals processed at once")
+    parser.add_argument('--save-every', type=int, default=0,
+                        help="Snapshot and checkpoint after this many manuals (0 = only at the end)")
+    parser.add_argument('--checkpoint', default=os.path.join(VECTOR_DB_PATH, CHECKPOINT_NAME))
+    args = parser.parse_args()
+
+    directory = os.path.abspath(args.directory)
+    manifest_path = args.manifest or find_manifest(directory)
+    if not manifest_path:
+        print(f"❌ No manifest given and none found in {directory}")
+        sys.exit(1)
+    manifest = load_manifest(manifest_path)
+    print(f"📋 {len(manifest)} manifest entries from {manifest_path}")
+
+    doc_processor = DocumentProcessor()
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+    # A checkpointed file is skipped only if it is unchanged and its manual is still in the database
+    checkpoint = load_checkpoint(args.checkpoint)
+    todo, skipped, unlisted = [], 0, []
+    filenames = set()
+    for rel_path in find_pdfs(directory):
+        path = os.path.join(directory, rel_path)
+        filename = secure_filename(os.path.basename(rel_path))
+        done = checkpoint.get(path)
+        if done and done.get('file_id') in doc_processor.metadata and \
+                {k: done.get(k) for k in ('size', 'mtime')} == file_signature(path):
+            skipped += 1
+        elif rel_path not in manifest:
+            unlisted.append(rel_path)
+        elif doc_processor.catalog.file_id_for(filename):
+            print(f"⏭️  {rel_path}: a manual with this filename is already in the database")
+            skipped += 1
+        elif filename in filenames:
+            # Manuals are stored and served by filename, so the first one wins
+            print(f"⏭️  {rel_path}: another PDF in this run has the same filename")
+            skipped += 1
+        else:
+            filenames.add(filename)
+            todo.append(rel_path)
+    for rel_path in unlisted:
+        print(f"⚠️  {rel_path}: not in the manifest, skipping")
+    print(f"📚 {len(todo)} PDFs to ingest, {skipped} already done, {len(unlisted)} not in the manifest")
+
+    def ingest(rel_path: str) -> str:
+        # Served from the uploads folder like manuals uploaded through /api/upload
+        file_path = os.path.join(UPLOAD_FOLDER, secure_filename(os.path.basename(rel_path)))
+        shutil.copyfile(os.path.join(directory, rel_path), file_path)
+        metadata = dict(manifest[rel_path], source='bulk_ingest', timestamp=datetime.now().isoformat())
+        metadata.setdefault('language', 'en')
+        return doc_processor.process_pdf(file_path, metadata, persist=False)
+
+    def commit(finished: Dict[str, Dict]):
+        # The checkpoint only ever names manuals that are in a saved snapshot
+        doc_processor.save_state()
+        checkpoint.update(finished)
+        save_checkpoint(args.checkpoint, checkpoint)
+        finished.clear()
+
+    started = time.perf_counter()
+    finished, failed = {}, []
+    pages = chunks = ingested = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = {pool.submit(ingest, rel_path): rel_path for rel_path in todo}
+        for future in as_completed(futures):
+            rel_path = futures[future]
+            try:
+                file_id = future.result()
+            except Exception as e:
+                print(f"❌ {rel_path}: {str(e)}")
+                print(traceback.format_exc())
+                failed.append(rel_path)
+                continue
+            manual = doc_processor.metadata[file_id]
+            pages += manual['num_pages']
+            chunks += manual['num_chunks']
+            ingested += 1
+            path = os.path.join(directory, rel_path)
+            finished[path] = dict(file_signature(path), file_id=file_id)
+            print(f"✅ [{ingested + len(failed)}/{len(todo)}] {rel_path}: {manual['num_pages']} pages, {manual['num_chunks']} chunks")
+            if args.save_every and len(finished) >= args.save_every:
+                commit(finished)
+
+    if finished:
+        commit(finished)
+    elapsed = time.perf_counter() - started
+
+    print(f"\n🎉 Ingested {ingested} manuals ({pages} pages, {chunks} chunks) in {elapsed:.1f}s: "
+          f"{pages / max(elapsed, 1e-9):.1f} pages/sec, {chunks / max(elapsed, 1e-9):.1f} chunks/sec")
+    print(f"   {skipped} skipped as already ingested, {len(unlisted)} not in the manifest, {len(failed)} failed")
+    for rel_path in failed:
+        print(f"   ❌ {rel_path}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
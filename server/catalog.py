@@ -0,0 +1,187 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class ManualCatalog:
+    """
+    Lookup tables over manual metadata, maintained on ingest and delete.
+
+    - brand -> model -> file_ids (in upload order)
+    - filename -> file_id
+    - file_id -> (start_idx, end_idx) chunk range, as parallel arrays
+
+    Every change bumps `version`. Derived results (brand lists, filter matches,
+    the manuals listing) are cached against it through cached(), so repeated
+    requests between uploads don't rescan the metadata.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._by_brand: Dict[str, Dict[str, List[str]]] = {}
+        self._by_filename: Dict[str, str] = {}
+        self._info: Dict[str, Dict] = {}
+        self._deleted = set()
+        # Chunk ranges, one row per manual in document order
+        self._file_ids: List[str] = []
+        self._starts = np.zeros(0, dtype=np.int64)
+        self._ends = np.zeros(0, dtype=np.int64)
+        self._cache = {}
+
+    def copy(self) -> 'ManualCatalog':
+        """An independent catalog with the same contents (and cached results)."""
+        catalog = ManualCatalog()
+        with self._lock:
+            catalog.version = self.version
+            catalog._by_brand = {brand: {model: list(file_ids) for model, file_ids in models.items()}
+                                 for brand, models in self._by_brand.items()}
+            catalog._by_filename = dict(self._by_filename)
+            catalog._info = dict(self._info)
+            catalog._deleted = set(self._deleted)
+            catalog._file_ids = list(self._file_ids)
+            catalog._starts = self._starts.copy()
+            catalog._ends = self._ends.copy()
+            catalog._cache = dict(self._cache)
+        return catalog
+
+    def _bump(self):
+        """Invalidate cached results (caller holds the lock)."""
+        self.version += 1
+        self._cache = {}
+
+    @staticmethod
+    def _key(meta: Dict) -> Tuple[str, str]:
+        return meta.get('brand', '').strip(), meta.get('model', '').strip()
+
+    def rebuild(self, metadata: Dict[str, Dict]):
+        """Recreate the catalog from DocumentProcessor.metadata."""
+        with self._lock:
+            self._clear()
+            for file_id, meta in sorted(metadata.items(), key=lambda item: item[1].get('start_idx', 0)):
+                self._insert(file_id, meta)
+            self._bump()
+
+    def add(self, file_id: str, meta: Dict):
+        """Register a manual whose chunks were appended to the end of the store."""
+        with self._lock:
+            self._insert(file_id, meta)
+            self._bump()
+
+    def _insert(self, file_id: str, meta: Dict):
+        brand, model = self._key(meta)
+        self._by_brand.setdefault(brand, {}).setdefault(model, []).append(file_id)
+        if meta.get('filename'):
+            self._by_filename[meta['filename']] = file_id
+        if meta.get('is_deleted', False):
+            self._deleted.add(file_id)
+        self._info[file_id] = {
+            'brand': brand,
+            'model': model,
+            'filename': meta.get('filename'),
+            'num_chunks': meta.get('num_chunks', 0)
+        }
+        self._file_ids.append(file_id)
+        self._starts = np.append(self._starts, meta.get('start_idx', 0))
+        self._ends = np.append(self._ends, meta.get('end_idx', 0))
+
+    def remove(self, file_id: str):
+        """Drop a manual and shift the ranges of the manuals stored after it."""
+        with self._lock:
+            info = self._info.pop(file_id, None)
+            if info is None:
+                return
+            models = self._by_brand[info['brand']]
+            models[info['model']].remove(file_id)
+            if not models[info['model']]:
+                del models[info['model']]
+            if not models:
+                del self._by_brand[info['brand']]
+            if self._by_filename.get(info['filename']) == file_id:
+                del self._by_filename[info['filename']]
+            self._deleted.discard(file_id)
+
+            row = self._file_ids.index(file_id)
+            num_chunks = self._ends[row] - self._starts[row]
+            later = self._starts > self._starts[row]
+            self._starts[later] -= num_chunks
+            self._ends[later] -= num_chunks
+            del self._file_ids[row]
+            self._starts = np.delete(self._starts, row)
+            self._ends = np.delete(self._ends, row)
+            self._bump()
+
+    def cached(self, key, compute):
+        """Result of compute(), memoized until the next catalog change."""
+        cache = self._cache
+        if key not in cache:
+            cache[key] = compute()
+        return cache[key]
+
+    def brands(self) -> List[str]:
+        """Sorted brand names (a new list; the cached one is shared between callers)."""
+        return list(self.cached(('brands',), lambda: sorted(self._by_brand)))
+
+    def models(self, brand: Optional[str] = None) -> List[str]:
+        """Sorted model names, optionally for one brand (a new list, like brands())."""
+        def compute():
+            if brand:
+                return sorted(self._by_brand.get(brand, {}))
+            return sorted({model for models in self._by_brand.values() for model in models})
+        return list(self.cached(('models', brand or ''), compute))
+
+    def find(self, brand: Optional[str] = None, model: Optional[str] = None,
+             include_deleted: bool = False) -> List[str]:
+        """File IDs of the manuals matching a brand/model filter, in document order."""
+        def compute():
+            brands = [brand] if brand else list(self._by_brand)
+            file_ids = []
+            for name in brands:
+                models = self._by_brand.get(name, {})
+                for model_name in ([model] if model else list(models)):
+                    file_ids.extend(models.get(model_name, []))
+            if not include_deleted:
+                file_ids = [file_id for file_id in file_ids if file_id not in self._deleted]
+            if brand and model:
+                return file_ids
+            rows = {file_id: row for row, file_id in enumerate(self._file_ids)}
+            return sorted(file_ids, key=rows.__getitem__)
+        return self.cached(('find', brand or '', model or '', include_deleted), compute)
+
+    def file_id_for(self, filename: str) -> Optional[str]:
+        """File ID of the manual uploaded under this filename."""
+        return self._by_filename.get(filename)
+
+    def is_deleted(self, file_id: Optional[str]) -> bool:
+        return file_id in self._deleted
+
+    def has_deleted(self) -> bool:
+        """Whether any manual is soft-deleted (lets searches skip per-candidate checks)."""
+        return bool(self._deleted)
+
+    def info(self, file_id: str) -> Optional[Dict]:
+        """Normalized brand/model/filename/num_chunks of a manual."""
+        return self._info.get(file_id)
+
+    def range_of(self, file_id: str) -> Optional[Tuple[int, int]]:
+        """(start_idx, end_idx) chunk range of a manual."""
+        ranges = self.cached(('ranges',), lambda: {
+            file_id: (int(start), int(end)) for file_id, start, end in zip(self._file_ids, self._starts, self._ends)
+        })
+        return ranges.get(file_id)
+
+    def __len__(self) -> int:
+        return len(self._file_ids)
+
+    def get_stats(self) -> Dict:
+        return {
+            'version': self.version,
+            'manuals': len(self._file_ids),
+            'brands': len(self._by_brand),
+            'models': sum(len(models) for models in self._by_brand.values()),
+            'cached_results': len(self._cache)
+        }
@@ -0,0 +1,274 @@
+import os
+import json
+import hashlib
+from collections.abc import Sequence
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.schema import Document
+
+# Per-chunk metadata that is stored once per manual rather than on every chunk
+MANUAL_FIELDS = ('file_id', 'filename', 'brand', 'model', 'product_type', 'year', 'language', 'timestamp')
+
+# Fixed-width columns, one .npy file each: (attribute, dtype)
+COLUMNS = (
+    ('offsets', np.int64),       # N+1 byte offsets into text.bin
+    ('chunk_ids', np.int64),
+    ('hashes', 'S16'),           # MD5 of the chunk text, matches embedding_hashes.npy
+    ('manual_idx', np.int32),    # row in manuals.json
+    ('pages', np.int32),
+    ('chunk_numbers', np.int32),
+    ('page_chunks', np.int32)    # chunks on the same page
+)
+PREVIEW_CHARS = 100
+
+
+class ChunkStore(Sequence):
+    """
+    Columnar, memory-mapped storage for document chunks.
+
+    Chunk text lives in one UTF-8 blob (text.bin) addressed by an offset table;
+    page/chunk numbers, chunk IDs and content hashes are fixed-width columns,
+    and manual-level fields (brand, model, filename...) are stored once per
+    manual. Everything is memory-mapped at startup.
+
+    Indexing returns langchain Documents built on demand with the same metadata
+    documents.json used to carry, so callers that only need text or a column
+    never materialize one.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.clear()
+
+    def clear(self):
+        """Drop all chunks (in memory; the next save() writes the empty store)."""
+        self._blob = np.zeros(0, dtype=np.uint8)
+        for name, dtype in COLUMNS:
+            setattr(self, name, np.zeros(1 if name == 'offsets' else 0, dtype=dtype))
+        self.manuals: List[Dict] = []
+        self.dirty = True
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._document(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        return self._document(index)
+
+    def text(self, i: int) -> str:
+        return bytes(self._blob[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def texts(self, positions=None) -> List[str]:
+        """Chunk texts for the given positions (all chunks by default)."""
+        if positions is None:
+            positions = range(len(self))
+        return [self.text(i) for i in positions]
+
+    def file_id(self, i: int) -> Optional[str]:
+        return self.manuals[self.manual_idx[i]]['file_id']
+
+    def count_by(self, field: str, default=None) -> Dict:
+        """Number of chunks per value of a manual-level field (e.g. 'language')."""
+        counts = {}
+        if not len(self):
+            return counts
+        for row, count in enumerate(np.bincount(self.manual_idx, minlength=len(self.manuals)).tolist()):
+            if count:
+                value = self.manuals[row].get(field) or default
+                counts[value] = counts.get(value, 0) + count
+        return counts
+
+    def _document(self, i: int) -> Document:
+        manual = self.manuals[self.manual_idx[i]]
+        chunk, total = int(self.chunk_numbers[i]), int(self.page_chunks[i])
+        metadata = {field: manual[field] for field in MANUAL_FIELDS if manual.get(field) is not None}
+        metadata.update({
+            'page': int(self.pages[i]),
+            'chunk': chunk,
+            'total_chunks_in_page': total,
+            'is_start_of_page': chunk == 1,
+            'is_end_of_page': chunk == total,
+            'chunk_id': int(self.chunk_ids[i])
+        })
+        # Chunks of a page are stored contiguously, so neighbours give the previews
+        if chunk > 1:
+            metadata['prev_chunk_preview'] = self.text(i - 1)[-PREVIEW_CHARS:]
+        if chunk < total:
+            metadata['next_chunk_preview'] = self.text(i + 1)[:PREVIEW_CHARS]
+        return Document(page_content=self.text(i), metadata=metadata)
+
+    def extend(self, documents: List[Document], chunk_ids: Optional[np.ndarray] = None):
+        """Append chunks; chunk IDs default to each document's metadata['chunk_id']."""
+        if not documents:
+            return
+        if chunk_ids is None:
+            chunk_ids = [doc.metadata['chunk_id'] for doc in documents]
+
+        manual_rows = {manual['file_id']: row for row, manual in enumerate(self.manuals)}
+        manual_idx = np.zeros(len(documents), dtype=np.int32)
+        encoded = []
+        for i, doc in enumerate(documents):
+            file_id = doc.metadata.get('file_id')
+            if file_id not in manual_rows:
+                manual_rows[file_id] = len(self.manuals)
+                self.manuals.append({field: doc.metadata.get(field) for field in MANUAL_FIELDS})
+            manual_idx[i] = manual_rows[file_id]
+            encoded.append(doc.page_content.encode('utf-8'))
+
+        self._append(dict(
+            self._text_rows(encoded),
+            chunk_ids=chunk_ids,
+            manual_idx=manual_idx,
+            pages=[doc.metadata.get('page', 0) for doc in documents],
+            chunk_numbers=[doc.metadata.get('chunk', 0) for doc in documents],
+            page_chunks=[doc.metadata.get('total_chunks_in_page', 0) for doc in documents]
+        ))
+
+    def append_manual(self, texts: List[str], chunk_ids: np.ndarray, pages: List[int], chunk_numbers: List[int],
+                      page_chunks: List[int], manual: Dict):
+        """Append the chunks of one manual from plain columns, without building Documents."""
+        if not texts:
+            return
+        rows = self._text_rows([text.encode('utf-8') for text in texts])
+        self.append_rows(dict(rows, chunk_ids=chunk_ids, pages=pages, chunk_numbers=chunk_numbers, page_chunks=page_chunks),
+                         {field: manual.get(field) for field in MANUAL_FIELDS})
+
+    @staticmethod
+    def _text_rows(encoded: List[bytes]) -> Dict[str, np.ndarray]:
+        """Text blob, offsets and digests for UTF-8 encoded chunk texts."""
+        lengths = np.array([len(text) for text in encoded], dtype=np.int64)
+        return {
+            'text': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            'offsets': np.concatenate([[0], np.cumsum(lengths)]),
+            'hashes': np.array([hashlib.md5(text).digest() for text in encoded], dtype='S16')
+        }
+
+    def rows(self, start: int, end: int) -> Dict[str, np.ndarray]:
+        """Columns and text of chunks [start, end), with offsets rebased to 0 (see append_rows)."""
+        rows = {name: np.array(getattr(self, name)[start:end]) for name, _ in COLUMNS[1:] if name != 'manual_idx'}
+        rows['offsets'] = np.array(self.offsets[start:end + 1]) - self.offsets[start]
+        rows['text'] = np.array(self._blob[self.offsets[start]:self.offsets[end]])
+        return rows
+
+    def manual_of(self, i: int) -> Dict:
+        """Manual-level fields stored for chunk i."""
+        return dict(self.manuals[self.manual_idx[i]])
+
+    def append_rows(self, rows: Dict[str, np.ndarray], manual: Dict):
+        """Append chunks exported by rows(), all belonging to one manual."""
+        rows = dict(rows, manual_idx=np.full(len(rows['chunk_ids']), len(self.manuals), dtype=np.int32))
+        self.manuals.append(dict(manual))
+        self._append(rows)
+
+    def _append(self, rows: Dict):
+        self.offsets = np.concatenate([self.offsets, self.offsets[-1] + np.asarray(rows['offsets'][1:], dtype=np.int64)])
+        self._blob = np.concatenate([self._blob, np.asarray(rows['text'], dtype=np.uint8)])
+        for name, dtype in COLUMNS[1:]:
+            setattr(self, name, np.concatenate([getattr(self, name), np.asarray(rows[name], dtype=dtype)]))
+        self.dirty = True
+
+    def delete_range(self, start: int, end: int):
+        """Remove chunks [start, end) and any manual left without chunks."""
+        if end <= start:
+            return
+        removed = self.offsets[end] - self.offsets[start]
+        self._blob = np.concatenate([self._blob[:self.offsets[start]], self._blob[self.offsets[end]:]])
+        self.offsets = np.concatenate([self.offsets[:start], self.offsets[end:] - removed])
+        for name, _ in COLUMNS[1:]:
+            setattr(self, name, np.delete(getattr(self, name), np.s_[start:end]))
+
+        used = np.unique(self.manual_idx)
+        remap = np.zeros(len(self.manuals), dtype=np.int32)
+        remap[used] = np.arange(len(used), dtype=np.int32)
+        self.manual_idx = remap[self.manual_idx]
+        self.manuals = [self.manuals[row] for row in used.tolist()]
+        self.dirty = True
+
+    def copy(self) -> 'ChunkStore':
+        """A store sharing this one's columns and text; changing either leaves the other as it was."""
+        store = ChunkStore.__new__(ChunkStore)
+        store.__dict__.update(self.__dict__)
+        # Columns are only ever replaced, but the manual table is appended to
+        store.manuals = list(self.manuals)
+        return store
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.path, "store.json"))
+
+    def save(self, path: Optional[str] = None):
+        """
+        Write columns, text blob and manual table, then the header as the commit marker.
+
+        With a new path the store is written (and served from) there.
+        """
+        if path is not None and path != self.path:
+            self.path = path
+            self.dirty = True
+        if not self.dirty and self.exists():
+            return
+        os.makedirs(self.path, exist_ok=True)
+        for name, dtype in COLUMNS:
+            path = os.path.join(self.path, f"{name}.npy")
+            # np.save appends .npy to names that lack it, so keep the suffix on the temp file
+            temp_path = path[:-len(".npy")] + ".tmp.npy"
+            np.save(temp_path, np.asarray(getattr(self, name), dtype=dtype))
+            os.replace(temp_path, path)
+
+        text_path = os.path.join(self.path, "text.bin")
+        with open(text_path + ".tmp", 'wb') as f:
+            f.write(self._blob.tobytes())
+        os.replace(text_path + ".tmp", text_path)
+
+        manuals_path = os.path.join(self.path, "manuals.json")
+        with open(manuals_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.manuals, f, ensure_ascii=False)
+        os.replace(manuals_path + ".tmp", manuals_path)
+
+        header_path = os.path.join(self.path, "store.json")
+        with open(header_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({'chunk_count': len(self), 'text_bytes': int(self.offsets[-1])}, f)
+        os.replace(header_path + ".tmp", header_path)
+
+        # Serve from the files just written so chunk text lives in the page cache
+        self.load()
+
+    def load(self) -> bool:
+        """Memory-map a saved store. Returns False if there is none or it is inconsistent."""
+        if not self.exists():
+            return False
+        with open(os.path.join(self.path, "store.json"), 'r', encoding='utf-8') as f:
+            header = json.load(f)
+        with open(os.path.join(self.path, "manuals.json"), 'r', encoding='utf-8') as f:
+            manuals = json.load(f)
+        columns = {name: np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r') for name, _ in COLUMNS}
+
+        count, text_bytes = header['chunk_count'], header['text_bytes']
+        text_path = os.path.join(self.path, "text.bin")
+        if (os.path.getsize(text_path) != text_bytes or len(columns['offsets']) != count + 1 or
+                any(len(columns[name]) != count for name, _ in COLUMNS[1:]) or
+                (count and int(columns['manual_idx'].max()) >= len(manuals))):
+            print("⚠️  Chunk store files are inconsistent")
+            return False
+
+        # np.memmap can't map an empty file
+        self._blob = np.memmap(text_path, dtype=np.uint8, mode='r') if text_bytes else np.zeros(0, dtype=np.uint8)
+        for name, array in columns.items():
+            setattr(self, name, array)
+        self.manuals = manuals
+        self.dirty = False
+        return True
+
+    def get_stats(self) -> Dict:
+        column_bytes = sum(getattr(self, name).nbytes for name, _ in COLUMNS)
+        return {
+            'chunks': len(self),
+            'manuals': len(self.manuals),
+            'text_bytes': int(self.offsets[-1]),
+            'column_bytes': int(column_bytes)
+        }
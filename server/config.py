@@ -17,6 +17,122 @@ AZURE_OPENAI_EMBEDDING_DEPLOYMENT = os.environ.get('AZURE_OPENAI_EMBEDDING_DEPLO
 # Vector DB settings
 VECTOR_DB_PATH = os.environ.get('VECTOR_DB_PATH', './vector_db')
 
+# Persistence: uploads, deletes and retried embeddings are appended to a journal; the journal
+# is folded into a full snapshot once it exceeds JOURNAL_COMPACT_RATIO of the snapshot size
+# (but at least JOURNAL_COMPACT_MIN_MB) or holds JOURNAL_MAX_ENTRIES entries
+JOURNAL_COMPACT_RATIO = float(os.environ.get('JOURNAL_COMPACT_RATIO', 0.5))
+JOURNAL_COMPACT_MIN_MB = int(os.environ.get('JOURNAL_COMPACT_MIN_MB', 64))
+JOURNAL_MAX_ENTRIES = int(os.environ.get('JOURNAL_MAX_ENTRIES', 1000))
+
+# Embedding cache settings (content-addressed, shared by ingest, rebuilds, bulk_ingest.py and every
+# server worker). Run `python embedding_cache.py compact` to reclaim space after evictions
+EMBEDDING_CACHE_ENABLED = os.environ.get('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true'
+EMBEDDING_CACHE_PATH = os.environ.get('EMBEDDING_CACHE_PATH', os.path.join(VECTOR_DB_PATH, 'embedding_cache'))
+EMBEDDING_CACHE_MAX_MB = int(os.environ.get('EMBEDDING_CACHE_MAX_MB', 2048))
+
+# Query embeddings: in-memory LRU size (0 disables it) and whether queries also use the disk cache.
+# query_embedding_cache in /api/database/stats shows the hit rate
+QUERY_CACHE_SIZE = int(os.environ.get('QUERY_CACHE_SIZE', 1024))
+QUERY_CACHE_DISK = os.environ.get('QUERY_CACHE_DISK', 'true').lower() == 'true'
+
+# Worker processes for PDF page extraction, cleaning and chunking (0 = one per CPU core,
+# 1 = in the request thread). Compare with `python benchmarks/page_processing.py <pdfs> --workers 1 2 4`
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', 0))
+# Ingestion streams pages into embedding blocks of EMBEDDING_BATCH_SIZE * EMBEDDING_WORKERS
+# chunks; at most INGEST_QUEUE_DEPTH blocks wait for or undergo embedding while pages are parsed
+INGEST_QUEUE_DEPTH = int(os.environ.get('INGEST_QUEUE_DEPTH', 2))
+# Uploads are ingested in the background: at most INGEST_MAX_JOBS at a time so chat keeps
+# its share of CPU and embedding quota, with up to INGEST_MAX_QUEUED more waiting (further uploads
+# get 503). Job records are kept in INGEST_JOBS_DB_PATH so any server worker can answer
+# GET /api/jobs/<job_id>
+INGEST_MAX_JOBS = int(os.environ.get('INGEST_MAX_JOBS', 1))
+INGEST_MAX_QUEUED = int(os.environ.get('INGEST_MAX_QUEUED', 20))
+INGEST_JOBS_DB_PATH = os.environ.get('INGEST_JOBS_DB_PATH', os.path.join(VECTOR_DB_PATH, 'ingest_jobs.db'))
+
+# Embedding throughput settings (size RPM/TPM to the embedding deployment's quota; 0 disables a limit).
+# Benchmark with `python benchmarks/embedding_throughput.py`
+EMBEDDING_WORKERS = int(os.environ.get('EMBEDDING_WORKERS', 4))
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 75))
+EMBEDDING_RPM = int(os.environ.get('EMBEDDING_RPM', 720))
+EMBEDDING_TPM = int(os.environ.get('EMBEDDING_TPM', 120000))
+
+# Seconds between background attempts to embed chunks whose embedding failed
+PENDING_RETRY_INTERVAL = int(os.environ.get('PENDING_RETRY_INTERVAL', 60))
+
+# Several server processes (gunicorn workers) can serve one VECTOR_DB_PATH: the snapshot is
+# memory-mapped read-only so they share one copy, writers take a file lock, and each change bumps
+# a generation counter that the other workers check at most every GENERATION_CHECK_INTERVAL
+# seconds. A worker copies what a journaled change modifies into private memory; once no change
+# has arrived for SHARED_COMPACT_DELAY seconds the journal is folded into a new snapshot that
+# every worker maps again (0 = only the journal limits above trigger snapshots). Start gunicorn
+# without --preload so each worker opens its own files
+SHARED_INDEX = os.environ.get('SHARED_INDEX', 'true').lower() == 'true'
+GENERATION_CHECK_INTERVAL = float(os.environ.get('GENERATION_CHECK_INTERVAL', 1.0))
+SHARED_COMPACT_DELAY = int(os.environ.get('SHARED_COMPACT_DELAY', 30))
+
+# Vector index settings. VECTOR_INDEX_TYPE is 'flat', 'ivf', 'hnsw' or 'auto'
+# ('auto' uses Flat and promotes to ANN_INDEX_TYPE past ANN_PROMOTION_THRESHOLD vectors).
+# Zero tuning values fall back to size-based defaults; `python benchmarks/index_recall.py` reports
+# recall and latency for tuning IVF_NPROBE/HNSW_EF_SEARCH.
+VECTOR_INDEX_TYPE = os.environ.get('VECTOR_INDEX_TYPE', 'auto').lower()
+ANN_INDEX_TYPE = os.environ.get('ANN_INDEX_TYPE', 'ivf').lower()
+ANN_PROMOTION_THRESHOLD = int(os.environ.get('ANN_PROMOTION_THRESHOLD', 100000))
+IVF_NLIST = int(os.environ.get('IVF_NLIST', 0))
+IVF_NPROBE = int(os.environ.get('IVF_NPROBE', 0))
+HNSW_M = int(os.environ.get('HNSW_M', 0))
+HNSW_EF_CONSTRUCTION = int(os.environ.get('HNSW_EF_CONSTRUCTION', 0))
+HNSW_EF_SEARCH = int(os.environ.get('HNSW_EF_SEARCH', 0))
+
+# Vector encoding inside the index: 'float32', 'fp16', 'int8' or 'pq' (PQ_M sub-quantizers of
+# PQ_NBITS bits). Compressed indexes rerank RERANK_FACTOR*k candidates against the
+# memory-mapped float32 embeddings; 0 disables the rerank. vector_storage in /api/database/stats
+# reports bytes per chunk and measured recall.
+VECTOR_STORAGE = os.environ.get('VECTOR_STORAGE', 'float32').lower()
+PQ_M = int(os.environ.get('PQ_M', 96))
+PQ_NBITS = int(os.environ.get('PQ_NBITS', 8))
+RERANK_FACTOR = int(os.environ.get('RERANK_FACTOR', 4))
+
+# Hybrid retrieval: BM25 over chunk text fused with dense results by reciprocal rank fusion.
+# Each side fetches k * HYBRID_FETCH_FACTOR candidates.
+HYBRID_SEARCH = os.environ.get('HYBRID_SEARCH', 'true').lower() == 'true'
+HYBRID_FETCH_FACTOR = int(os.environ.get('HYBRID_FETCH_FACTOR', 10))
+RRF_K = int(os.environ.get('RRF_K', 60))
+
+# Cross-manual deduplication: chunks whose text matches an indexed chunk exactly share its
+# index vector instead of adding their own. Below 1.0, chunks whose embedding is at least
+# DEDUP_SIMILARITY cosine-similar to an indexed one share it too; unfiltered searches then
+# return one of those chunks' texts for all of them, so near-duplicate sharing is opt-in
+DEDUP_ENABLED = os.environ.get('DEDUP_ENABLED', 'true').lower() == 'true'
+DEDUP_SIMILARITY = float(os.environ.get('DEDUP_SIMILARITY', 1.0))
+
+# Maximum number of queries accepted by /api/search/batch in one request
+SEARCH_BATCH_MAX = int(os.environ.get('SEARCH_BATCH_MAX', 1000))
+
+# Semantic answer cache for /api/chat: answers to questions at least ANSWER_CACHE_THRESHOLD
+# cosine-similar within the same brand/model and response language are reused
+ANSWER_CACHE_ENABLED = os.environ.get('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+ANSWER_CACHE_THRESHOLD = float(os.environ.get('ANSWER_CACHE_THRESHOLD', 0.95))
+ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', 3600))
+ANSWER_CACHE_SIZE = int(os.environ.get('ANSWER_CACHE_SIZE', 1000))
+
+# Conversation memory, one per chat session (session_id sent by the frontend). At most
+# SESSION_MAX_LIVE sessions are kept (least recently used evicted first), sessions idle for
+# SESSION_TTL seconds are dropped, and each keeps MEMORY_MAX_HISTORY turns plus at most
+# MEMORY_MAX_TRACKED topics/devices/issues with MEMORY_MAX_TRACKED_ENTRIES mentions each
+SESSION_MAX_LIVE = int(os.environ.get('SESSION_MAX_LIVE', 1000))
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 3600))
+MEMORY_MAX_HISTORY = int(os.environ.get('MEMORY_MAX_HISTORY', 100))
+MEMORY_MAX_TRACKED = int(os.environ.get('MEMORY_MAX_TRACKED', 20))
+MEMORY_MAX_TRACKED_ENTRIES = int(os.environ.get('MEMORY_MAX_TRACKED_ENTRIES', 20))
+
+# Where conversation turns are kept beyond one process: 'sqlite' (shared by all workers and
+# kept across restarts) or 'memory'. Turns are queued and committed in batches every
+# CONVERSATION_FLUSH_INTERVAL seconds, or once CONVERSATION_FLUSH_BATCH are waiting
+CONVERSATION_STORE = os.environ.get('CONVERSATION_STORE', 'sqlite').lower()
+CONVERSATION_DB_PATH = os.environ.get('CONVERSATION_DB_PATH', os.path.join(VECTOR_DB_PATH, 'conversations.db'))
+CONVERSATION_FLUSH_INTERVAL = float(os.environ.get('CONVERSATION_FLUSH_INTERVAL', 0.2))
+CONVERSATION_FLUSH_BATCH = int(os.environ.get('CONVERSATION_FLUSH_BATCH', 100))
+
 # Upload settings
 UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', './uploads')
 MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # Default 16MB
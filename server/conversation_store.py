@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from config import (
+    CONVERSATION_STORE, CONVERSATION_DB_PATH, CONVERSATION_FLUSH_INTERVAL, CONVERSATION_FLUSH_BATCH,
+    SESSION_TTL, MEMORY_MAX_HISTORY
+)
+
+
+class ConversationStore:
+    """
+    Where ConversationSessions keeps conversation turns beyond this process.
+
+    The base class keeps nothing: sessions live only in the process that
+    served them and are lost on restart.
+    """
+
+    def load(self, session_id: str, limit: int) -> Optional[Dict]:
+        """The session's last `limit` turns, oldest first, as {'turns': [...], 'version': ...}; None if unknown."""
+        return None
+
+    def changed_elsewhere(self, session_id: str, version) -> bool:
+        """Whether another process added turns to the session after `version` (from load())."""
+        return False
+
+    def append(self, session_id: str, turn: Dict):
+        pass
+
+    def clear(self, session_id: str):
+        pass
+
+    def flush(self):
+        pass
+
+    def get_stats(self) -> Dict:
+        return {'backend': 'memory'}
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    Conversation turns in an SQLite database (WAL mode), shared by every server
+    worker and kept across restarts.
+
+    - turns: one row per turn, looked up by (session_id, id) so a session's
+      latest turns are an index range scan
+    - sessions: last use and last writer per session, indexed by last_used so
+      idle sessions are purged without a table scan
+
+    append() only queues the turn; a writer thread commits queued turns in one
+    transaction every flush_interval seconds (or once flush_batch are waiting),
+    so persistence stays off the request path. Each process remembers the
+    latest turn of each session it has loaded or written on top of; a higher
+    last_turn_id means another worker added turns its cached copy lacks.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS turns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            timestamp REAL NOT NULL,
+            user_input TEXT NOT NULL,
+            response TEXT,
+            metadata TEXT
+        );
+        CREATE INDEX IF NOT EXISTS turns_by_session ON turns (session_id, id);
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            last_used REAL NOT NULL,
+            last_turn_id INTEGER NOT NULL DEFAULT 0,
+            last_writer TEXT
+        );
+        CREATE INDEX IF NOT EXISTS sessions_by_last_used ON sessions (last_used);
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.2, flush_batch: int = 100,
+                 ttl_seconds: int = SESSION_TTL, max_history: int = MEMORY_MAX_HISTORY):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_batch = max(1, flush_batch)
+        self.ttl_seconds = ttl_seconds
+        self.max_history = max_history
+        # Identifies this process's writes in sessions.last_writer
+        self.writer_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._queue: List = []
+        self._queue_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._write_lock = threading.Lock()
+        self._readers = threading.local()
+        self._last_purge = 0.0
+        # Latest turn ID per session that this process's copy includes
+        self._seen: Dict[str, int] = {}
+
+        self.appended = 0
+        self.append_seconds = 0.0
+        self.flushed_turns = 0
+        self.batches = 0
+        self.flush_seconds = 0.0
+        self.loads = 0
+        self.errors = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._writer = self._connect()
+        self._writer.executescript(self.SCHEMA)
+
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps committed transactions durable across crashes of the process; an OS
+        # crash may lose the last few, which is acceptable for chat history
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """This thread's read connection (WAL lets reads run alongside the writer)."""
+        conn = getattr(self._readers, 'conn', None)
+        if conn is None:
+            conn = self._readers.conn = self._connect()
+        return conn
+
+    def load(self, session_id: str, limit: int) -> Optional[Dict]:
+        # Turns of this session still in the queue must be visible to the load
+        if any(item[1] == session_id for item in self._queue):
+            self.flush()
+        conn = self._reader()
+        row = conn.execute("SELECT last_turn_id FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        rows = conn.execute(
+            "SELECT timestamp, user_input, response, metadata FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (session_id, limit)
+        ).fetchall()
+        self.loads += 1
+        self._seen[session_id] = row[0]
+        turns = [{
+            'timestamp': timestamp,
+            'user_input': user_input,
+            'response': response,
+            'metadata': json.loads(metadata) if metadata else {}
+        } for timestamp, user_input, response, metadata in reversed(rows)]
+        return {'turns': turns, 'version': row[0]}
+
+    def changed_elsewhere(self, session_id: str, version) -> bool:
+        row = self._reader().execute(
+            "SELECT last_turn_id FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        # Whoever wrote last: turns past the ones this process has seen came from elsewhere
+        return row is not None and row[0] > max(version or 0, self._seen.get(session_id, 0))
+
+    def append(self, session_id: str, turn: Dict):
+        started = time.perf_counter()
+        with self._queue_lock:
+            self._queue.append(('turn', session_id, turn))
+            full = len(self._queue) >= self.flush_batch
+        if full:
+            self._wakeup.set()
+        self.appended += 1
+        self.append_seconds += time.perf_counter() - started
+
+    def clear(self, session_id: str):
+        with self._queue_lock:
+            self._queue.append(('clear', session_id, None))
+        self._wakeup.set()
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                if time.time() - self._last_purge >= min(self.ttl_seconds, 300):
+                    self._purge()
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Error writing conversation turns: {str(e)}")
+
+    def flush(self):
+        """Commit queued turns and clears in one transaction."""
+        with self._write_lock:
+            with self._queue_lock:
+                items, self._queue = self._queue, []
+            if not items:
+                return
+            started = time.perf_counter()
+            conn = self._writer
+            touched = {}
+            # Per session: whether its stored turns were all seen here before this batch
+            in_sync = {}
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for op, session_id, turn in items:
+                    if op == 'clear':
+                        conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+                        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                        touched.pop(session_id, None)
+                        in_sync[session_id] = True
+                        continue
+                    if session_id not in in_sync:
+                        row = conn.execute("SELECT last_turn_id FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+                        in_sync[session_id] = (row[0] if row else 0) == self._seen.get(session_id, 0)
+                    cursor = conn.execute(
+                        "INSERT INTO turns (session_id, timestamp, user_input, response, metadata) VALUES (?, ?, ?, ?, ?)",
+                        (session_id, turn['timestamp'], turn['user_input'], turn['response'],
+                         json.dumps(turn.get('metadata') or {}, default=str))
+                    )
+                    touched[session_id] = (cursor.lastrowid, turn['timestamp'])
+                for session_id, (turn_id, timestamp) in touched.items():
+                    conn.execute(
+                        "INSERT INTO sessions (session_id, last_used, last_turn_id, last_writer) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(session_id) DO UPDATE SET last_used = excluded.last_used, "
+                        "last_turn_id = excluded.last_turn_id, last_writer = excluded.last_writer",
+                        (session_id, timestamp, turn_id, self.writer_id)
+                    )
+                    # Keep the turns a session can load, like ConversationMemory's max_history
+                    conn.execute(
+                        "DELETE FROM turns WHERE session_id = ? AND id <= "
+                        "(SELECT id FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                        (session_id, session_id, self.max_history)
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                # Keep the batch for the next attempt, ahead of anything queued since
+                with self._queue_lock:
+                    self._queue = items + self._queue
+                raise
+            for session_id, synced in in_sync.items():
+                if synced:
+                    # Only this process's turns were added, so its copy is still complete
+                    self._seen[session_id] = touched[session_id][0] if session_id in touched else 0
+            self.batches += 1
+            self.flushed_turns += sum(1 for op, _, _ in items if op == 'turn')
+            self.flush_seconds += time.perf_counter() - started
+
+    def _purge(self):
+        """Delete sessions idle longer than the TTL, as ConversationSessions evicts them."""
+        self._last_purge = time.time()
+        cutoff = self._last_purge - self.ttl_seconds
+        with self._write_lock:
+            conn = self._writer
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM turns WHERE session_id IN (SELECT session_id FROM sessions WHERE last_used < ?)", (cutoff,))
+                purged = conn.execute("DELETE FROM sessions WHERE last_used < ?", (cutoff,)).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if purged:
+            print(f"💾 MEMORY: Purged {purged} idle sessions from the conversation store")
+
+    def get_stats(self) -> Dict:
+        sessions, turns = self._reader().execute(
+            "SELECT (SELECT COUNT(*) FROM sessions), (SELECT COUNT(*) FROM turns)"
+        ).fetchone()
+        size = sum(os.path.getsize(self.path + suffix) for suffix in ('', '-wal') if os.path.exists(self.path + suffix))
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'stored_sessions': sessions,
+            'stored_turns': turns,
+            'db_bytes': size,
+            'queued': len(self._queue),
+            'batches': self.batches,
+            'flushed_turns': self.flushed_turns,
+            'avg_flush_ms': 1000 * self.flush_seconds / self.batches if self.batches else 0.0,
+            'avg_append_us': 1e6 * self.append_seconds / self.appended if self.appended else 0.0,
+            'session_loads': self.loads,
+            'errors': self.errors
+        }
+
+
+def open_conversation_store() -> ConversationStore:
+    """The backend chosen by CONVERSATION_STORE ('sqlite' or 'memory')."""
+    if CONVERSATION_STORE == 'sqlite':
+        try:
+            return SQLiteConversationStore(CONVERSATION_DB_PATH, CONVERSATION_FLUSH_INTERVAL, CONVERSATION_FLUSH_BATCH)
+        except Exception as e:
+            print(f"❌ Could not open conversation store {CONVERSATION_DB_PATH}: {str(e)}; keeping conversations in memory")
+    return ConversationStore()
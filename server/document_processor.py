@@ -1,15 +1,17 @@
 import os
 import hashlib
 import json
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from datetime import datetime
 import langdetect
 import time
-import unicodedata
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 import numpy as np
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.document_loaders import PyPDFLoader
 from langchain.schema import Document
 import faiss
 import openai
@@ -17,13 +19,82 @@ import openai
 from config import (
     UPLOAD_FOLDER,
     VECTOR_DB_PATH,
+    JOURNAL_COMPACT_RATIO,
+    JOURNAL_COMPACT_MIN_MB,
+    JOURNAL_MAX_ENTRIES,
     LLM_PROVIDER,
     DEFAULT_CHUNK_SIZE,
     DEFAULT_CHUNK_OVERLAP,
     AZURE_OPENAI_API_KEY,
     AZURE_OPENAI_ENDPOINT,
     AZURE_OPENAI_API_VERSION,
-    AZURE_OPENAI_EMBEDDING_DEPLOYMENT
+    AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_MB,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_DISK,
+    EMBEDDING_WORKERS,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_RPM,
+    EMBEDDING_TPM,
+    PENDING_RETRY_INTERVAL,
+    SHARED_INDEX,
+    GENERATION_CHECK_INTERVAL,
+    SHARED_COMPACT_DELAY,
+    VECTOR_INDEX_TYPE,
+    ANN_INDEX_TYPE,
+    ANN_PROMOTION_THRESHOLD,
+    IVF_NLIST,
+    IVF_NPROBE,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    VECTOR_STORAGE,
+    PQ_M,
+    PQ_NBITS,
+    RERANK_FACTOR,
+    HYBRID_SEARCH,
+    HYBRID_FETCH_FACTOR,
+    RRF_K,
+    DEDUP_ENABLED,
+    DEDUP_SIMILARITY,
+    PDF_WORKERS,
+    INGEST_QUEUE_DEPTH
+)
+from embedding_cache import EmbeddingCache, QueryEmbeddingLRU
+from embedding_executor import EmbeddingExecutor, retry_after_seconds
+from rescoring import NUM_FEATURES, compute_lexical_features, rescore
+from lexical_index import LexicalIndex
+from catalog import ManualCatalog
+from chunk_store import ChunkStore
+from journal import Journal
+from shared_state import SharedState
+from search_state import SearchState, StateField, StateView, reads_state
+from page_processing import iter_pdf_pages
+from vector_index import (
+    build_index,
+    choose_index_type,
+    choose_storage,
+    default_params,
+    apply_search_params,
+    index_type_of,
+    supports_remove,
+    bytes_per_vector,
+    exact_rerank
+)
+
+# Files and directories that make up one snapshot of the vector store
+SNAPSHOT_FILES = (
+    "manual_index.faiss",
+    "embeddings.npy",
+    "embedding_hashes.npy",
+    "canonical_ids.npy",
+    "lexical_features.npy",
+    "lexical_index",
+    "lexical_index.npz",
+    "metadata.json",
+    "chunks"
 )
 
 class AzureOpenAIEmbeddings:
@@ -39,11 +110,43 @@ class AzureOpenAIEmbeddings:
         openai.api_key = AZURE_OPENAI_API_KEY
         
         self.deployment_name = AZURE_OPENAI_EMBEDDING_DEPLOYMENT
+        self.dimensions = 1536  # Azure OpenAI embeddings are 1536-dimensional
+        
+        # Persistent cache so re-uploads, rebuilds and re-ingests never pay for the same text twice
+        self.cache = None
+        if EMBEDDING_CACHE_ENABLED:
+            try:
+                self.cache = EmbeddingCache(EMBEDDING_CACHE_PATH, self.dimensions, EMBEDDING_CACHE_MAX_MB)
+            except Exception as e:
+                print(f"⚠️  Embedding cache unavailable, continuing without it: {str(e)}")
+        
+        # Repeated questions are answered from memory first, then from the disk cache
+        self.query_cache = QueryEmbeddingLRU(QUERY_CACHE_SIZE)
+        self.query_disk_hits = 0
+        
+        # Concurrent, quota-aware batch embedding
+        self.executor = EmbeddingExecutor(
+            self,
+            workers=EMBEDDING_WORKERS,
+            batch_size=EMBEDDING_BATCH_SIZE,
+            requests_per_minute=EMBEDDING_RPM,
+            tokens_per_minute=EMBEDDING_TPM
+        )
+        
         print(f"Initialized Azure OpenAI embeddings with deployment: {self.deployment_name}")
     
-    def _make_embedding_request(self, texts: List[str], retry_count: int = 3):
-        """Make embedding request with retry logic and rate limiting."""
+    def _make_embedding_request(self, texts: List[str], retry_count: int = 3,
+                                on_rate_limit: Optional[Callable[[float], None]] = None,
+                                acquire: Optional[Callable[[], None]] = None):
+        """
+        Make embedding request with retry logic and rate limiting.
+        
+        acquire, if given, is called before every attempt (retries included) to take
+        the request's share of the rate limit quota.
+        """
         for attempt in range(retry_count):
+            if acquire:
+                acquire()
             try:
                 response = openai.Embedding.create(
                     input=texts,
@@ -52,8 +155,11 @@ class AzureOpenAIEmbeddings:
                 return response
             except openai.error.RateLimitError as e:
                 if attempt < retry_count - 1:
-                    wait_time = (2 ** attempt) + 1  # Exponential backoff with minimum 1 second
+                    # Honour the server's Retry-After, falling back to exponential backoff
+                    wait_time = retry_after_seconds(e) or (2 ** attempt) + 1
                     print(f"      ⏳ Rate limit hit, waiting {wait_time} seconds... (attempt {attempt + 1}/{retry_count})")
+                    if on_rate_limit:
+                        on_rate_limit(wait_time)
                     time.sleep(wait_time)
                 else:
                     print(f"      ❌ Rate limit exceeded after {retry_count} attempts")
@@ -76,84 +182,173 @@ class AzureOpenAIEmbeddings:
                     raise e
     
     def embed_documents(self, texts: List[str]) -> np.ndarray:
-        """Convert documents to Azure OpenAI embeddings with adaptive batch processing."""
+        """Convert documents to Azure OpenAI embeddings, raising if any chunk could not be embedded."""
         if not texts:
-            return np.zeros((1, 1536), dtype=np.float32)  # Azure OpenAI embeddings are 1536-dimensional
+            return np.zeros((1, self.dimensions), dtype=np.float32)
+        
+        embeddings, failed = self.embed_documents_partial(texts)
+        if failed:
+            raise Exception(f"Failed to embed {len(failed)} of {len(texts)} chunks")
+        return embeddings
+    
+    def embed_documents_partial(self, texts: List[str]):
+        """
+        Convert documents to embeddings, serving repeated texts from the cache.
         
-        print(f"🧠 Generating embeddings for {len(texts)} text chunks...")
+        Every successfully embedded batch (or half of a split batch) is written to the
+        cache as soon as it completes, so an interrupted or partly failed ingestion
+        only pays for the texts that are still missing when re-run.
         
-        # Adaptive batch sizing - start large, reduce if errors occur
-        initial_batch_size = 75  # Start with 75 (between 50 and 100)
-        min_batch_size = 25      # Minimum batch size if errors persist
-        current_batch_size = initial_batch_size
-        consecutive_errors = 0
+        Returns:
+            (embeddings, failed): the embedding matrix and the positions of texts that
+            could not be embedded (their rows are zero and must not be indexed)
+        """
+        if self.cache is None:
+            return self._embed_batches(texts)
         
-        all_embeddings = []
-        i = 0
+        embeddings, missing = self.cache.get_many(self.deployment_name, texts)
+        print(f"🗃️  Embedding cache: {len(texts) - len(missing)}/{len(texts)} hits")
+        if not missing:
+            return embeddings, []
         
-        while i < len(texts):
-            batch = texts[i:i + current_batch_size]
-            batch_num = len(all_embeddings) // initial_batch_size + 1
-            total_estimated_batches = (len(texts) + initial_batch_size - 1) // initial_batch_size
-            
-            print(f"   Processing batch {batch_num} with size {current_batch_size} ({len(batch)} chunks)")
-            
-            try:
-                response = self._make_embedding_request(batch)
-                batch_embeddings = [item['embedding'] for item in response['data']]
-                all_embeddings.extend(batch_embeddings)
-                print(f"   ✅ Batch completed successfully")
-                
-                # Success - can try increasing batch size next time
-                consecutive_errors = 0
-                if current_batch_size < initial_batch_size:
-                    current_batch_size = min(current_batch_size + 10, initial_batch_size)
-                    print(f"   📈 Increasing batch size to {current_batch_size}")
-                
-                # Move to next batch
-                i += len(batch)
-                
-                # Small delay between batches to be respectful to API
-                if i < len(texts):
-                    time.sleep(0.05)  # Reduced delay for speed
-                    
-            except Exception as e:
-                print(f"   ❌ Error processing batch: {str(e)}")
-                consecutive_errors += 1
-                
-                # Reduce batch size if getting errors
-                if consecutive_errors >= 2 and current_batch_size > min_batch_size:
-                    current_batch_size = max(current_batch_size // 2, min_batch_size)
-                    print(f"   📉 Reducing batch size to {current_batch_size} due to errors")
-                
-                # Add zero vectors for failed batch and continue
-                batch_embeddings = [np.zeros(1536).tolist() for _ in batch]  # Azure OpenAI embeddings are 1536-dimensional
-                all_embeddings.extend(batch_embeddings)
-                i += len(batch)
+        # Embed each distinct missing text once
+        unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+        
+        def store_batch(offset: int, batch_embeddings: np.ndarray):
+            self.cache.put_many(self.deployment_name, unique_texts[offset:offset + len(batch_embeddings)], batch_embeddings)
         
-        embeddings_array = np.array(all_embeddings, dtype=np.float32)
-        print(f"✅ Generated {len(embeddings_array)} embeddings with shape {embeddings_array.shape}")
-        return embeddings_array
+        new_embeddings, failed_unique = self._embed_batches(unique_texts, on_batch=store_batch)
+        failed_texts = {unique_texts[i] for i in failed_unique}
+        by_text = dict(zip(unique_texts, new_embeddings))
+        failed = []
+        for i in missing:
+            if texts[i] in failed_texts:
+                failed.append(i)
+            else:
+                embeddings[i] = by_text[texts[i]]
+        return embeddings, failed
+    
+    def _embed_batches(self, texts: List[str], on_batch: Optional[Callable[[int, np.ndarray], None]] = None):
+        """
+        Embed texts through the API using the concurrent, rate-limited executor.
+        
+        Returns:
+            (embeddings, failed): the embedding matrix and the positions of texts
+            whose batch failed (left as zero rows)
+        """
+        return self.executor.run(texts, on_batch=on_batch)
     
     def embed_query(self, text: str) -> np.ndarray:
         """Convert query to Azure OpenAI embedding."""
         if not text:
-            return np.zeros(1536, dtype=np.float32)  # Azure OpenAI embeddings are 1536-dimensional
+            return np.zeros(self.dimensions, dtype=np.float32)
+        
+        embedding = self.query_cache.get(self.deployment_name, text)
+        if embedding is not None:
+            return embedding
+        
+        disk_cache = self.cache if QUERY_CACHE_DISK else None
+        if disk_cache is not None:
+            cached, missing = disk_cache.get_many(self.deployment_name, [text])
+            if not missing:
+                self.query_disk_hits += 1
+                self.query_cache.put(self.deployment_name, text, cached[0])
+                return cached[0]
         
         try:
             response = self._make_embedding_request([text])
-            embedding = response['data'][0]['embedding']
-            return np.array(embedding, dtype=np.float32)
+            embedding = np.array(response['data'][0]['embedding'], dtype=np.float32)
+            # Failures return zeros below and are deliberately never cached
+            self.query_cache.put(self.deployment_name, text, embedding)
+            if disk_cache is not None:
+                # Query lookups are frequent; the index is persisted with the next document flush
+                disk_cache.put_many(self.deployment_name, [text], embedding[None, :], flush=False)
+            return embedding
         except Exception as e:
             print(f"Error embedding query: {str(e)}")
-            return np.zeros(1536, dtype=np.float32)  # Azure OpenAI embeddings are 1536-dimensional
+            return np.zeros(self.dimensions, dtype=np.float32)
+    
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed many queries, sending only those missing from the query caches to Azure.
+        
+        Missing queries are deduplicated and embedded in as few requests as the batch
+        size allows. Queries that fail come back as zero vectors, like embed_query.
+        """
+        result = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        missing = []
+        for i, text in enumerate(texts):
+            if not text:
+                continue
+            embedding = self.query_cache.get(self.deployment_name, text)
+            if embedding is None:
+                missing.append(i)
+            else:
+                result[i] = embedding
+        
+        unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+        if not unique_texts:
+            return result
+        
+        disk_cache = self.cache if QUERY_CACHE_DISK else None
+        vectors = np.zeros((len(unique_texts), self.dimensions), dtype=np.float32)
+        to_embed = list(range(len(unique_texts)))
+        if disk_cache is not None:
+            vectors, to_embed = disk_cache.get_many(self.deployment_name, unique_texts)
+            self.query_disk_hits += len(unique_texts) - len(to_embed)
+        
+        failed = set()
+        if to_embed:
+            embedded, failed_positions = self._embed_batches([unique_texts[j] for j in to_embed])
+            failed = {to_embed[j] for j in failed_positions}
+            vectors[to_embed] = embedded
+            succeeded = [j for j in to_embed if j not in failed]
+            if disk_cache is not None and succeeded:
+                disk_cache.put_many(self.deployment_name, [unique_texts[j] for j in succeeded], vectors[succeeded], flush=False)
+        
+        row_by_text = {}
+        for j, text in enumerate(unique_texts):
+            if j not in failed:
+                self.query_cache.put(self.deployment_name, text, vectors[j])
+                row_by_text[text] = j
+        for i in missing:
+            if texts[i] in row_by_text:
+                result[i] = vectors[row_by_text[texts[i]]]
+        return result
+    
+    def get_cache_stats(self) -> Dict:
+        """Embedding cache counters, or None when caching is disabled."""
+        return self.cache.get_stats() if self.cache is not None else None
+    
+    def get_query_cache_stats(self) -> Dict:
+        """In-memory query LRU counters plus how many misses the disk tier absorbed."""
+        stats = self.query_cache.get_stats()
+        stats['disk_hits'] = self.query_disk_hits
+        stats['disk_tier'] = QUERY_CACHE_DISK and self.cache is not None
+        return stats
 
 class DocumentProcessor:
     """Process and manage documents with vector search capabilities."""
     
+    # Searchable data lives on a SearchState: searches read the published one while
+    # a writer builds the next (see _changing)
+    index = StateField()
+    index_params = StateField()
+    documents = StateField()
+    metadata = StateField()
+    catalog = StateField()
+    vectors = StateField()
+    chunk_ids = StateField()
+    canonical_ids = StateField()
+    lexical_features = StateField()
+    lexical_index = StateField()
+    pending_ids = StateField()
+    _dedup_cache = StateField()
+    
     def __init__(self):
         """Initialize the document processor with vector store."""
-        self.documents = []
+        self._state = SearchState()
+        self._local = StateView()
         self.metadata = {}
         self.embeddings = AzureOpenAIEmbeddings()
         self.embedding_dimensions = 1536  # Azure OpenAI embeddings are 1536-dimensional
@@ -161,38 +356,252 @@ class DocumentProcessor:
         # Create vector store directory if it doesn't exist
         os.makedirs(VECTOR_DB_PATH, exist_ok=True)
         
+        # Persisted state is the snapshot directory named by manifest.json plus the
+        # journal of changes made after it
+        self.journal = Journal(os.path.join(VECTOR_DB_PATH, "journal"))
+        self._snapshot_stale = False
+        
+        # Index entries are keyed by stable chunk IDs rather than list positions
+        self.next_chunk_id = 0
+        # Set to the index while it is memory-mapped from the snapshot (see _read_index)
+        self._mapped_index = None
+        self._lock = threading.RLock()
+        
+        # Recall measurement for /api/database/stats, cached until the index changes
+        self._recall_cache = None
+        
+        # Callbacks(event, file_id, manual_metadata) run after manuals are added, updated, deleted or cleared
+        self._change_listeners = []
+        
+        # Brand/model/filename lookups and chunk ranges, kept in step with self.metadata
+        self.catalog = ManualCatalog()
+        
+        # Other processes serving VECTOR_DB_PATH: writer lock and published generation
+        self.shared = SharedState(VECTOR_DB_PATH, enabled=SHARED_INDEX)
+        self._write_depth = 0
+        self._generation_checked = time.monotonic()
+        
+        # Load under the writer lock, so no other worker is halfway through a change
+        with self.shared.lock(exclusive=True), self._changing():
+            self._load_state(self._load_manifest())
+            
+            # A snapshot repaired during loading is rewritten once, with the journal folded in
+            if self._snapshot_stale:
+                try:
+                    self._save_state()
+                    self.shared.bump()
+                except Exception as e:
+                    print(f"❌ Error writing repaired snapshot: {str(e)}")
+            self._generation = self.shared.generation()
+        
+        # Finish interrupted uploads and drain the pending-embeddings queue in the background.
+        # Only uploads interrupted before this start are resumed; later ones are still in flight.
+        self._interrupted_ingests = self._load_pending_ingests()
+        self._retry_thread = threading.Thread(target=self._background_retry_loop, daemon=True)
+        self._retry_thread.start()
+        
+        print(f"DocumentProcessor initialization complete with {len(self.documents)} documents using Azure OpenAI embeddings.")
+    
+    def _load_state(self, manifest: Dict, repair: bool = True) -> List:
+        """
+        Load the snapshot a manifest names, then replay the journal after it.
+        
+        Args:
+            repair: Truncate a torn journal tail (only safe under the writer lock)
+            
+        Returns:
+            Change events of the replayed journal entries
+        """
+        self._snapshot_dir = self._snapshot_path(manifest)
+        self.documents = ChunkStore(os.path.join(self._snapshot_dir, "chunks"))
+        
         # Load existing documents and metadata
         self.documents = self._load_documents()
         self.metadata = self._load_metadata()
         
-        # Initialize FAISS index
-        self.index = faiss.IndexFlatL2(self.embedding_dimensions)
+        # Initialize FAISS index and the embedding matrix aligned with self.documents
+        self._reset_vector_state()
+        self.next_chunk_id = 0
+        self._recall_cache = None
         
-        # If we have documents, rebuild the index
+        # If we have documents, restore the persisted index instead of re-embedding everything
         if self.documents:
             print(f"Loading {len(self.documents)} existing documents into FAISS index...")
-            texts = [doc.page_content for doc in self.documents]
             try:
-                embeddings = self.embeddings.embed_documents(texts)
-                self.index.add(np.array(embeddings).astype('float32'))
+                self._load_vector_state()
                 print("✅ FAISS index loaded successfully")
             except Exception as e:
                 print(f"❌ Error loading FAISS index: {str(e)}")
                 # If loading fails, start with empty index
-                self.index = faiss.IndexFlatL2(self.embedding_dimensions)
-                self.documents = []
+                self._reset_vector_state()
+                self.documents.clear()
                 self.metadata = {}
         
-        print(f"DocumentProcessor initialization complete with {len(self.documents)} documents using Azure OpenAI embeddings.")
+        # Re-apply uploads and deletes journaled since the snapshot
+        events = []
+        try:
+            events = self._replay_journal(manifest.get('journal_seq', 0), repair)
+        except Exception as e:
+            print(f"❌ Error replaying journal: {str(e)}")
+        self.catalog.rebuild(self.metadata)
+        return events
+    
+    def _reset_vector_state(self):
+        """Empty index, embedding matrix and per-chunk arrays."""
+        self.index_params = default_params('flat', 0)
+        self.index = self._new_index()
+        self.vectors = np.zeros((0, self.embedding_dimensions), dtype=np.float32)
+        self.chunk_ids = np.zeros(0, dtype=np.int64)
+        # Chunk ID whose index vector each chunk uses: its own, or that of an earlier
+        # (near-)identical chunk it shares with, so boilerplate is indexed once
+        self.canonical_ids = np.zeros(0, dtype=np.int64)
+        self._dedup_cache = None
+        # Query-independent lexical features per chunk (see rescoring.py), aligned with self.documents
+        self.lexical_features = np.zeros((0, NUM_FEATURES), dtype=np.int32)
+        # BM25 inverted index over chunk text, fused with dense results at query time
+        self.lexical_index = LexicalIndex()
+        # Chunks whose embedding failed: kept out of the index until the retrier embeds them
+        self.pending_ids = set()
+    
+    def _view(self) -> SearchState:
+        """The state this thread works with: the one its read pinned or its write is building, else the published one."""
+        return self._local.state or self._state
+    
+    def snapshot(self) -> SearchState:
+        """The published state, for callers that read several fields (e.g. catalog and metadata) together."""
+        return self._state
+    
+    @contextmanager
+    def _changing(self):
+        """
+        Build the next state on a copy of the published one, then publish it with a
+        single assignment. Searches running meanwhile keep reading the state they
+        started on, so they never see a half-applied change or wait for it.
+        Nothing is published if the change fails. Caller holds self._lock.
+        """
+        if self._local.state is not None and self._local.state is not self._state:
+            # Already building the next state on this thread
+            yield
+            return
+        pinned = self._local.state
+        self._local.state = self._state.copy()
+        try:
+            yield
+            self._state = self._local.state
+        finally:
+            self._local.state = pinned
     
-    def _save_index(self):
+    @contextmanager
+    def _writing(self):
+        """
+        Hold the state for a change: this process's lock and, with SHARED_INDEX, the
+        writer lock of all workers. Changes other workers published are applied
+        first; if this change gets persisted the generation is bumped, so they
+        pick it up in turn. Re-entrant.
+        """
+        with self._lock:
+            if self._write_depth:
+                self._write_depth += 1
+                try:
+                    yield
+                finally:
+                    self._write_depth -= 1
+                return
+            
+            events, before = [], None
+            with self.shared.lock(exclusive=True), self._changing():
+                self._write_depth = 1
+                try:
+                    events = self._catch_up()
+                    before = (self.journal.seq, self._snapshot_dir)
+                    yield
+                finally:
+                    self._write_depth = 0
+                    if before is not None and (self.journal.seq, self._snapshot_dir) != before:
+                        self._generation = self.shared.bump()
+        
+        for event in events:
+            self._notify_change(*event)
+    
+    def refresh(self) -> bool:
+        """
+        Pick up changes other workers published. Cheap enough to call per request:
+        it reads the generation at most every GENERATION_CHECK_INTERVAL seconds
+        and only takes locks when the generation moved.
+        """
+        if not self.shared.enabled or time.monotonic() - self._generation_checked < GENERATION_CHECK_INTERVAL:
+            return False
+        self._generation_checked = time.monotonic()
+        if self.shared.generation() == self._generation:
+            return False
+        
+        with self._lock:
+            if self._write_depth:
+                return False
+            with self.shared.lock(exclusive=False), self._changing():
+                events = self._catch_up()
+        for event in events:
+            self._notify_change(*event)
+        return bool(events)
+    
+    def _catch_up(self) -> List:
+        """
+        Apply what other workers persisted since this process last looked: the
+        journal entries after the ones applied here, or the whole new snapshot
+        if one was written. Caller holds the shared-state lock.
+        
+        Returns:
+            Change events for the listeners
+        """
+        generation = self.shared.generation()
+        if generation == self._generation:
+            return []
+        manifest = self._load_manifest()
+        if self._snapshot_path(manifest) == self._snapshot_dir:
+            events = self._replay_journal(self.journal.seq, repair=False)
+            self.catalog.rebuild(self.metadata)
+        else:
+            print(f"🔄 Generation {generation}: mapping snapshot {manifest.get('snapshot')}")
+            self._load_state(manifest, repair=False)
+            events = [('cleared', None, None)]
+        self._recall_cache = None
+        self._generation = generation
+        return events
+    
+    def _read_index(self, path: str):
+        """
+        Read a persisted FAISS index. With SHARED_INDEX its vectors are memory-mapped
+        read-only, so workers share them through the page cache.
+        """
+        if not SHARED_INDEX:
+            return faiss.read_index(path)
+        index = faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        self._mapped_index = index
+        return index
+    
+    def _own_index(self):
+        """
+        Copy the index before changing it in place: searches may still be using the
+        published one, and faiss aborts on changes to a memory-mapped index.
+        """
+        if self.index is self._state.index or self.index is self._mapped_index:
+            self.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+            apply_search_params(self.index, self.index_params)
+            self._mapped_index = None
+    
+    def _own_lexical_index(self):
+        """Copy the BM25 index's postings table before add() or remove() if searches can still see it."""
+        if self.lexical_index is self._state.lexical_index:
+            self.lexical_index = self.lexical_index.copy()
+    
+    def _save_index(self, directory: str):
         """Save FAISS index to disk with proper error handling."""
         try:
             # Ensure the directory exists
-            os.makedirs(VECTOR_DB_PATH, exist_ok=True)
+            os.makedirs(directory, exist_ok=True)
             
             # Use proper path normalization for Windows
-            index_path = os.path.normpath(os.path.join(VECTOR_DB_PATH, "manual_index.faiss"))
+            index_path = os.path.normpath(os.path.join(directory, "manual_index.faiss"))
             
             # Create a temporary file first to avoid corruption
             temp_path = index_path + ".tmp"
@@ -216,7 +625,7 @@ class DocumentProcessor:
         except Exception as e:
             print(f"❌ Error saving FAISS index: {str(e)}")
             # Clean up temp file if it exists
-            temp_path = os.path.normpath(os.path.join(VECTOR_DB_PATH, "manual_index.faiss.tmp"))
+            temp_path = os.path.normpath(os.path.join(directory, "manual_index.faiss.tmp"))
             if os.path.exists(temp_path):
                 try:
                     os.remove(temp_path)
@@ -224,30 +633,514 @@ class DocumentProcessor:
                     pass
             raise Exception(f"Failed to save FAISS index: {str(e)}")
     
+    def _new_index(self):
+        """Create an empty FAISS index whose entries are addressed by chunk ID."""
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(self.embedding_dimensions))
+    
+    def _index_param_overrides(self) -> Dict:
+        """Index tuning from config; zero values mean 'size-based default'."""
+        return {
+            'nlist': IVF_NLIST,
+            'nprobe': IVF_NPROBE,
+            'M': HNSW_M,
+            'efConstruction': HNSW_EF_CONSTRUCTION,
+            'efSearch': HNSW_EF_SEARCH,
+            'pq_m': PQ_M,
+            'pq_nbits': PQ_NBITS
+        }
+    
+    def _target_index_type(self, num_vectors: int) -> str:
+        """Index type the corpus should use at its current size."""
+        target = choose_index_type(VECTOR_INDEX_TYPE, num_vectors, ANN_PROMOTION_THRESHOLD, ANN_INDEX_TYPE)
+        current = self.index_params.get('type', 'flat')
+        # Only demote an auto-promoted index once the corpus is well below the threshold,
+        # so deletions around the threshold don't cause rebuild churn
+        if (VECTOR_INDEX_TYPE == 'auto' and current != 'flat' and target == 'flat' and
+                num_vectors >= ANN_PROMOTION_THRESHOLD // 2):
+            return current
+        return target
+    
+    def _target_storage(self, num_vectors: int) -> str:
+        """Vector encoding the corpus should use at its current size."""
+        return choose_storage(VECTOR_STORAGE, num_vectors, PQ_NBITS)
+    
+    def _rebuild_index(self):
+        """Rebuild the FAISS index from the stored embedding matrix (no API calls)."""
+        indexed = self._indexed_positions()
+        index_type = self._target_index_type(len(indexed)) if len(indexed) else 'flat'
+        storage = self._target_storage(len(indexed)) if len(indexed) else 'float32'
+        self.index_params = default_params(index_type, len(indexed), self._index_param_overrides(), storage=storage)
+        print(f"🏗️  Building {index_type.upper()}/{storage} index over {len(indexed)} vectors...")
+        self.index = build_index(self.embedding_dimensions, self.vectors[indexed], self.chunk_ids[indexed], self.index_params)
+    
+    def _maybe_reindex(self):
+        """
+        Promote/demote the index type or encoding past their size thresholds, and
+        retrain IVF lists / int8 ranges / PQ codebooks after large growth.
+        """
+        num_vectors = self.index.ntotal
+        current = self.index_params.get('type', 'flat')
+        current_storage = self.index_params.get('storage', 'float32')
+        target = self._target_index_type(num_vectors)
+        target_storage = self._target_storage(num_vectors)
+        trained = target == 'ivf' or target_storage in ('int8', 'pq')
+        retrain = (trained and target == current and target_storage == current_storage and
+                   num_vectors > 4 * self.index_params.get('trained_on', 0))
+        if target != current or target_storage != current_storage or retrain:
+            print(f"🔁 Switching index from {current.upper()}/{current_storage} to "
+                  f"{target.upper()}/{target_storage} at {num_vectors} vectors")
+            self._rebuild_index()
+    
+    def _allocate_chunk_ids(self, count: int) -> np.ndarray:
+        """Reserve a block of stable, never-reused chunk IDs."""
+        ids = np.arange(self.next_chunk_id, self.next_chunk_id + count, dtype=np.int64)
+        self.next_chunk_id += count
+        return ids
+    
+    def _load_chunk_ids(self, manifest: Dict):
+        """Rebuild self.chunk_ids from the chunk store (legacy chunks got IDs on migration)."""
+        self.next_chunk_id = manifest.get('next_chunk_id', 0)
+        self.chunk_ids = np.array(self.documents.chunk_ids, dtype=np.int64)
+        
+        if len(self.chunk_ids):
+            self.next_chunk_id = max(self.next_chunk_id, int(self.chunk_ids.max()) + 1)
+    
+    def _positions_for_ids(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Map chunk IDs returned by the index to positions in self.documents.
+        
+        IDs are allocated in increasing order and deletions preserve order, so
+        self.chunk_ids stays sorted and a binary search is enough. Unknown IDs
+        (including FAISS's -1 padding) map to -1.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.chunk_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        positions = np.searchsorted(self.chunk_ids, ids)
+        positions = np.minimum(positions, len(self.chunk_ids) - 1)
+        return np.where(self.chunk_ids[positions] == ids, positions, -1)
+    
+    def _chunk_hashes(self) -> np.ndarray:
+        """MD5 digests of every chunk in self.documents, in index order (kept by the chunk store)."""
+        return np.asarray(self.documents.hashes, dtype='S16')
+    
+    def _metadata_checksum(self) -> str:
+        """Checksum over the chunk ranges recorded in metadata.json."""
+        ranges = sorted((file_id, meta.get('start_idx'), meta.get('end_idx')) for file_id, meta in self.metadata.items())
+        return hashlib.sha256(json.dumps(ranges).encode('utf-8')).hexdigest()
+    
+    def _validate_metadata_ranges(self) -> bool:
+        """Check that the manual ranges in metadata.json tile documents.json exactly."""
+        covered = 0
+        for file_id, meta in self.metadata.items():
+            start_idx, end_idx = meta.get('start_idx', 0), meta.get('end_idx', 0)
+            if not 0 <= start_idx <= end_idx <= len(self.documents):
+                print(f"⚠️  Manual {file_id} has out-of-range chunks {start_idx}..{end_idx}")
+                return False
+            covered += end_idx - start_idx
+        if covered != len(self.documents):
+            print(f"⚠️  metadata.json covers {covered} chunks but documents.json has {len(self.documents)}")
+            return False
+        return True
+    
+    def _load_manifest(self) -> Dict:
+        """Load the vector store manifest if it exists."""
+        manifest_path = os.path.join(VECTOR_DB_PATH, "manifest.json")
+        
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        
+        return {}
+    
+    def _load_vector_state(self):
+        """
+        Restore the FAISS index and embedding matrix from the current snapshot.
+        
+        Stored embeddings are matched to chunks by content digest, so only chunks
+        that are missing from disk (or whose text changed) are sent to Azure.
+        The saved FAISS index is used as-is when the manifest matches exactly.
+        """
+        manifest = self._load_manifest()
+        self._load_chunk_ids(manifest)
+        self._load_lexical_index()
+        self.pending_ids = set(manifest.get('pending_chunk_ids', [])) & set(self.chunk_ids.tolist())
+        hashes = self._chunk_hashes()
+        checksum = hashlib.sha256(hashes.tobytes()).hexdigest()
+        metadata_ok = self._validate_metadata_ranges()
+        self._load_lexical_features(manifest, checksum)
+        self._load_canonical_ids(manifest, checksum)
+        
+        index_path = os.path.join(self._snapshot_dir, "manual_index.faiss")
+        vectors_path = os.path.join(self._snapshot_dir, "embeddings.npy")
+        hashes_path = os.path.join(self._snapshot_dir, "embedding_hashes.npy")
+        
+        compatible = (
+            manifest.get('embedding_deployment') == self.embeddings.deployment_name and
+            manifest.get('embedding_dimensions') == self.embedding_dimensions and
+            os.path.exists(vectors_path) and
+            os.path.exists(hashes_path)
+        )
+        if manifest and not compatible:
+            print("⚠️  Stored embeddings do not match the current deployment/dimensions, re-embedding all chunks")
+        
+        stored_vectors = None
+        row_by_hash = {}
+        if compatible:
+            # Copy-on-write map: rows are paged in on demand and in-place updates stay private
+            stored_vectors = np.load(vectors_path, mmap_mode='c')
+            stored_hashes = np.load(hashes_path)
+            if stored_vectors.shape != (len(stored_hashes), self.embedding_dimensions):
+                print("⚠️  embeddings.npy is not aligned with embedding_hashes.npy, re-embedding all chunks")
+                stored_vectors = None
+            else:
+                row_by_hash = {h: row for row, h in enumerate(stored_hashes.tolist())}
+        
+        # Reuse the saved FAISS index only if nothing about the chunk set has changed
+        if (stored_vectors is not None and metadata_ok and
+                manifest.get('chunk_count') == len(self.documents) and
+                manifest.get('checksum') == checksum and
+                manifest.get('metadata_checksum') == self._metadata_checksum() and
+                os.path.exists(index_path)):
+            index = self._read_index(index_path)
+            id_mapped = isinstance(index, faiss.IndexIDMap2)
+            if (id_mapped and index.d == self.embedding_dimensions and
+                    np.array_equal(faiss.vector_to_array(index.id_map), self._indexed_ids())):
+                self.index = index
+                self.index_params = manifest.get('index_params') or default_params(index_type_of(index), index.ntotal)
+                apply_search_params(self.index, self.index_params)
+                self.vectors = stored_vectors
+                print(f"📂 Loaded persisted FAISS index with {index.ntotal} vectors (no re-embedding needed)")
+                return
+            print("⚠️  Persisted FAISS index does not match documents.json, rebuilding from stored embeddings")
+        
+        # Assemble the embedding matrix from stored rows; chunks without a usable
+        # stored vector are queued for the background retrier instead of blocking startup
+        vectors = np.zeros((len(self.documents), self.embedding_dimensions), dtype=np.float32)
+        missing = []
+        for i, h in enumerate(hashes.tolist()):
+            row = row_by_hash.get(h)
+            # Zero rows belong to chunks that were never embedded, so treat them as missing
+            if row is not None and np.any(stored_vectors[row]):
+                vectors[i] = stored_vectors[row]
+            else:
+                missing.append(i)
+        
+        self.pending_ids = set(self.chunk_ids[missing].tolist())
+        # A shared vector may be among the missing ones, so every chunk indexes its own again
+        self.canonical_ids = self.chunk_ids.copy()
+        print(f"♻️  Reusing {len(self.documents) - len(missing)} stored embeddings, queued {len(missing)} chunks for embedding")
+        
+        self.vectors = vectors
+        self._rebuild_index()
+        
+        # Persist the repaired index so the next start is a plain disk read
+        self._snapshot_stale = True
+    
+    def _load_lexical_features(self, manifest: Dict, checksum: str):
+        """Load the persisted lexical feature matrix, recomputing it if the chunks changed."""
+        path = os.path.join(self._snapshot_dir, "lexical_features.npy")
+        if manifest.get('checksum') == checksum and os.path.exists(path):
+            features = np.load(path, mmap_mode='c')
+            if features.shape == (len(self.documents), NUM_FEATURES):
+                self.lexical_features = features
+                return
+        print(f"🔤 Computing lexical features for {len(self.documents)} chunks")
+        self.lexical_features = compute_lexical_features(self.documents.texts())
+    
+    def _load_canonical_ids(self, manifest: Dict, checksum: str):
+        """Load which chunks share an index vector; without a matching file every chunk has its own."""
+        path = os.path.join(self._snapshot_dir, "canonical_ids.npy")
+        self.canonical_ids = self.chunk_ids.copy()
+        self._dedup_cache = None
+        if manifest.get('checksum') == checksum and os.path.exists(path):
+            canonical_ids = np.load(path)
+            if canonical_ids.shape == self.chunk_ids.shape and np.all(np.isin(canonical_ids, self.chunk_ids)):
+                self.canonical_ids = canonical_ids
+    
+    def _load_lexical_index(self):
+        """Load the persisted BM25 index, rebuilding it from documents.json if it is missing or stale."""
+        path = os.path.join(self._snapshot_dir, "lexical_index")
+        try:
+            index = LexicalIndex.load(path)
+        except Exception as e:
+            print(f"⚠️  Lexical index unreadable, rebuilding: {str(e)}")
+            index = None
+        if index is not None and np.array_equal(index.doc_ids, self.chunk_ids):
+            self.lexical_index = index
+            return
+        print(f"🔤 Building lexical index over {len(self.documents)} chunks")
+        self.lexical_index = LexicalIndex()
+        self.lexical_index.add(self.chunk_ids, self.documents.texts())
+    
+    def _indexed_positions(self) -> np.ndarray:
+        """Positions of chunks that have their own vector in the index (not pending, not sharing one)."""
+        own = self.canonical_ids == self.chunk_ids
+        if not self.pending_ids:
+            return np.flatnonzero(own)
+        pending = np.fromiter(self.pending_ids, dtype=np.int64, count=len(self.pending_ids))
+        return np.flatnonzero(own & ~np.isin(self.chunk_ids, pending))
+    
+    def _indexed_ids(self) -> np.ndarray:
+        """Chunk IDs that should be present in the FAISS index, in document order."""
+        return self.chunk_ids[self._indexed_positions()]
+    
+    def _load_pending_ingests(self) -> Dict:
+        """Load the record of uploads that started but never reached a saved state."""
+        path = os.path.join(VECTOR_DB_PATH, "pending_ingests.json")
+        
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        
+        return {}
+    
+    def _save_pending_ingests(self, pending: Dict):
+        """Atomically rewrite the pending-ingest record."""
+        path = os.path.normpath(os.path.join(VECTOR_DB_PATH, "pending_ingests.json"))
+        os.makedirs(VECTOR_DB_PATH, exist_ok=True)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(pending, f, ensure_ascii=False, indent=2)
+        os.replace(path + ".tmp", path)
+    
+    def _mark_ingest_started(self, file_id: str, file_path: str, metadata: Dict):
+        # Held while this process ingests, so other workers can tell the upload isn't abandoned
+        self.shared.hold(f"ingest-{file_id}")
+        with self._writing():
+            pending = self._load_pending_ingests()
+            pending[file_id] = {
+                'file_path': file_path,
+                'metadata': metadata,
+                'started': datetime.now().isoformat()
+            }
+            self._save_pending_ingests(pending)
+    
+    def _mark_ingest_finished(self, file_id: str):
+        with self._writing():
+            pending = self._load_pending_ingests()
+            if pending.pop(file_id, None) is not None:
+                self._save_pending_ingests(pending)
+        self.shared.release(f"ingest-{file_id}")
+    
+    def resume_pending_ingests(self, pending: Optional[Dict] = None):
+        """
+        Re-run uploads interrupted by a crash or restart.
+        
+        Completed embedding batches were written to the embedding cache as they
+        finished, so a resumed ingestion only pays for the batches that never completed.
+        
+        Args:
+            pending: Records to resume (default: everything in pending_ingests.json)
+        """
+        if pending is None:
+            pending = self._load_pending_ingests()
+        for file_id, record in pending.items():
+            if file_id in self.metadata:
+                # The upload finished saving; only the bookkeeping was left behind
+                self._mark_ingest_finished(file_id)
+                continue
+            if not os.path.exists(record['file_path']):
+                print(f"⚠️  Cannot resume ingestion of {record['file_path']}: file no longer exists")
+                self._mark_ingest_finished(file_id)
+                continue
+            print(f"🔁 Resuming interrupted ingestion of {os.path.basename(record['file_path'])}")
+            try:
+                self.process_pdf(record['file_path'], record['metadata'], file_id=file_id)
+            except Exception as e:
+                print(f"❌ Resumed ingestion failed: {str(e)}")
+    
+    def retry_pending_embeddings(self) -> int:
+        """
+        Embed queued chunks and add them to the index.
+        
+        Returns:
+            Number of chunks that were embedded and made searchable
+        """
+        with self._lock:
+            if not self.pending_ids:
+                return 0
+            pending_ids = np.array(sorted(self.pending_ids), dtype=np.int64)
+            positions = self._positions_for_ids(pending_ids)
+            texts = self.documents.texts(positions.tolist())
+        
+        print(f"🔁 Retrying embeddings for {len(pending_ids)} pending chunks...")
+        embeddings, failed = self.embeddings.embed_documents_partial(texts)
+        succeeded = np.setdiff1d(np.arange(len(pending_ids)), failed)
+        if not len(succeeded):
+            return 0
+        
+        with self._writing():
+            ids, positions, vectors = self._apply_embeddings(pending_ids[succeeded], embeddings[succeeded])
+            if not len(ids):
+                return 0
+            self._maybe_reindex()
+            self._persist({'op': 'embedded'}, {'chunk_ids': ids, 'vectors': vectors})
+            updated = {self.documents.file_id(pos) for pos in positions.tolist()}
+        
+        # Newly searchable chunks can change answers for their manuals
+        for file_id in updated:
+            self._notify_change('updated', file_id, self.metadata.get(file_id))
+        
+        print(f"✅ {len(ids)} pending chunks are now searchable ({len(self.pending_ids)} still pending)")
+        return len(ids)
+    
+    def _apply_embeddings(self, ids: np.ndarray, vectors: np.ndarray):
+        """
+        Make pending chunks searchable with their new vectors.
+        
+        Chunks deleted or embedded in the meantime are skipped; returns the
+        (ids, positions, vectors) that were applied.
+        """
+        positions = self._positions_for_ids(ids)
+        live = (positions >= 0) & np.isin(ids, list(self.pending_ids))
+        ids, positions, vectors = ids[live], positions[live], vectors[live]
+        if len(ids):
+            self._own_index()
+            self.index.add_with_ids(vectors, ids)
+            # Written in place even while searches share the matrix: pending rows are
+            # skipped by every search of the states that still list them as pending
+            self.vectors[positions] = vectors
+            self.pending_ids.difference_update(ids.tolist())
+            self._dedup_cache = None
+        return ids, positions, vectors
+    
+    def _background_retry_loop(self):
+        """
+        Resume interrupted uploads, then periodically drain the pending-embeddings queue.
+        
+        With SHARED_INDEX only one worker does this upkeep (another takes over if it
+        exits). That worker also writes a snapshot once the journal has been quiet
+        for SHARED_COMPACT_DELAY seconds, so every worker can drop the private copies
+        changes made and map the new files instead.
+        """
+        while not self.shared.try_maintenance():
+            time.sleep(PENDING_RETRY_INTERVAL)
+        
+        if self.shared.enabled:
+            # Uploads still locked by their worker are in flight, not interrupted
+            pending = self._load_pending_ingests()
+            self._interrupted_ingests = {file_id: record for file_id, record in pending.items()
+                                         if not self.shared.is_held(f"ingest-{file_id}")}
+        try:
+            self.resume_pending_ingests(self._interrupted_ingests)
+        except Exception as e:
+            print(f"❌ Error resuming pending ingestions: {str(e)}")
+        
+        while True:
+            try:
+                self.retry_pending_embeddings()
+            except Exception as e:
+                print(f"❌ Error retrying pending embeddings: {str(e)}")
+            try:
+                self._compact_if_quiet()
+            except Exception as e:
+                print(f"❌ Error compacting journal: {str(e)}")
+            time.sleep(PENDING_RETRY_INTERVAL)
+    
+    def _compact_if_quiet(self):
+        """Fold the journal into a new snapshot once no worker has changed anything for a while."""
+        if not self.shared.enabled:
+            return
+        changed_at = self.shared.changed_at()
+        if changed_at is None or time.time() - changed_at < SHARED_COMPACT_DELAY:
+            return
+        with self._writing():
+            if self.journal.seq > self._load_manifest().get('journal_seq', 0):
+                print("🗜️  Journal is quiet, writing a snapshot for all workers to map")
+                self._save_state()
+    
+    def _save_vectors(self, directory: str):
+        """Save the embedding matrix, chunk digests and lexical features with error handling."""
+        try:
+            os.makedirs(directory, exist_ok=True)
+            
+            targets = [
+                ("embeddings.npy", np.ascontiguousarray(self.vectors, dtype=np.float32)),
+                ("embedding_hashes.npy", self._chunk_hashes()),
+                ("canonical_ids.npy", self.canonical_ids),
+                ("lexical_features.npy", self.lexical_features)
+            ]
+            for filename, array in targets:
+                path = os.path.normpath(os.path.join(directory, filename))
+                # np.save appends .npy to names that lack it, so keep the suffix on the temp file
+                temp_path = path[:-len(".npy")] + ".tmp.npy"
+                np.save(temp_path, array)
+                os.replace(temp_path, path)
+            
+            # Serve the matrix from the file just written, so full-precision vectors
+            # live in the page cache rather than on the heap
+            self.vectors = np.load(os.path.normpath(os.path.join(directory, "embeddings.npy")), mmap_mode='c')
+            self.lexical_features = np.load(os.path.normpath(os.path.join(directory, "lexical_features.npy")), mmap_mode='c')
+            
+        except Exception as e:
+            raise Exception(f"Failed to save embeddings: {str(e)}")
+    
+    def _save_manifest(self, snapshot: str):
+        """Point manifest.json at a completely written snapshot (the snapshot's commit point)."""
+        hashes = self._chunk_hashes()
+        manifest = {
+            'snapshot': snapshot,
+            'journal_seq': self.journal.seq,
+            'chunk_count': len(self.documents),
+            'embedding_deployment': self.embeddings.deployment_name,
+            'embedding_dimensions': self.embedding_dimensions,
+            'next_chunk_id': self.next_chunk_id,
+            'pending_chunk_ids': sorted(self.pending_ids),
+            'index_params': self.index_params,
+            'checksum': hashlib.sha256(hashes.tobytes()).hexdigest(),
+            'metadata_checksum': self._metadata_checksum(),
+            'timestamp': datetime.now().isoformat()
+        }
+        manifest_path = os.path.normpath(os.path.join(VECTOR_DB_PATH, "manifest.json"))
+        with open(manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(manifest_path + ".tmp", manifest_path)
+    
+    def add_change_listener(self, callback: Callable[[str, Optional[str], Optional[Dict]], None]):
+        """Register a callback(event, file_id, manual_metadata) for 'added', 'updated', 'deleted' and 'cleared'."""
+        self._change_listeners.append(callback)
+    
+    def _notify_change(self, event: str, file_id: Optional[str], manual: Optional[Dict]):
+        for callback in self._change_listeners:
+            try:
+                callback(event, file_id, manual)
+            except Exception as e:
+                print(f"⚠️  Change listener failed for {event} {file_id}: {str(e)}")
+    
     def get_retriever(self):
         return self  # or return a specific retriever object if you have one 
 
-    def _load_documents(self) -> List[Document]:
-        """Load document chunks if they exist."""
-        doc_path = os.path.join(VECTOR_DB_PATH, "documents.json")
+    def _load_documents(self) -> ChunkStore:
+        """Memory-map the chunk store, migrating a legacy documents.json into it first."""
+        store = self.documents
+        if store.load():
+            return store
         
+        doc_path = os.path.join(self._snapshot_dir, "documents.json")
+        store.clear()
         if os.path.exists(doc_path):
             with open(doc_path, 'r', encoding='utf-8') as f:
                 docs_data = json.load(f)
-                
-            return [
-                Document(
-                    page_content=doc['page_content'],
-                    metadata=doc['metadata']
-                )
-                for doc in docs_data
-            ]
+            print(f"📦 Migrating {len(docs_data)} chunks from documents.json to the chunk store")
+            
+            docs = [Document(page_content=doc['page_content'], metadata=doc['metadata']) for doc in docs_data]
+            if all('chunk_id' in doc.metadata for doc in docs):
+                store.extend(docs)
+            else:
+                # Chunks saved before stable IDs existed: number them in document order
+                print("🔢 Assigning stable chunk IDs to existing documents")
+                store.extend(docs, chunk_ids=np.arange(len(docs), dtype=np.int64))
+            store.save()
+            # Keep the original for rollback; the chunk store takes precedence from now on
+            os.replace(doc_path, doc_path + ".migrated")
         
-        return []
+        return store
     
     def _load_metadata(self) -> Dict:
         """Load manual metadata if it exists."""
-        meta_path = os.path.join(VECTOR_DB_PATH, "metadata.json")
+        meta_path = os.path.join(self._snapshot_dir, "metadata.json")
         
         if os.path.exists(meta_path):
             with open(meta_path, 'r', encoding='utf-8') as f:
@@ -255,35 +1148,26 @@ class DocumentProcessor:
         
         return {}
     
-    def _save_documents(self):
+    def _save_documents(self, directory: str):
         """Save document chunks to disk with error handling."""
         try:
-            doc_path = os.path.normpath(os.path.join(VECTOR_DB_PATH, "documents.json"))
-            
-            docs_data = [
-                {
-                    'page_content': doc.page_content,
-                    'metadata': doc.metadata
-                }
-                for doc in self.documents
-            ]
-            
             # Ensure directory exists
-            os.makedirs(VECTOR_DB_PATH, exist_ok=True)
+            os.makedirs(directory, exist_ok=True)
+            
+            self.documents.save(os.path.join(directory, "chunks"))
             
-            with open(doc_path, 'w', encoding='utf-8') as f:
-                json.dump(docs_data, f, ensure_ascii=False, indent=2)
+            self.lexical_index.save(os.path.normpath(os.path.join(directory, "lexical_index")))
                 
         except Exception as e:
             raise Exception(f"Failed to save documents: {str(e)}")
     
-    def _save_metadata(self):
+    def _save_metadata(self, directory: str):
         """Save manual metadata to disk with error handling."""
         try:
-            meta_path = os.path.normpath(os.path.join(VECTOR_DB_PATH, "metadata.json"))
+            meta_path = os.path.normpath(os.path.join(directory, "metadata.json"))
             
             # Ensure directory exists
-            os.makedirs(VECTOR_DB_PATH, exist_ok=True)
+            os.makedirs(directory, exist_ok=True)
             
             with open(meta_path, 'w', encoding='utf-8') as f:
                 json.dump(self.metadata, f, ensure_ascii=False, indent=2)
@@ -292,51 +1176,254 @@ class DocumentProcessor:
             raise Exception(f"Failed to save metadata: {str(e)}")
     
     def _save_state(self):
-        """Save all state to disk: index, documents, and metadata with error handling."""
-        print("💾 Saving all state to disk...")
+        """
+        Write a full snapshot (index, documents, metadata, embeddings) and switch to it.
         
-        errors = []
-        success_count = 0
+        The snapshot goes into a new directory and manifest.json is repointed at it
+        last, so a crash leaves either the previous snapshot or the new one, never a
+        mix. Journal entries the snapshot includes are dropped afterwards.
+        """
+        print("💾 Saving all state to disk...")
         
-        # Save FAISS index
+        snapshot = os.path.join("snapshots", f"{self.journal.seq:010d}-{datetime.now():%Y%m%d%H%M%S%f}")
+        directory = os.path.normpath(os.path.join(VECTOR_DB_PATH, snapshot))
         try:
-            self._save_index()
-            success_count += 1
+            self._save_index(directory)
+            self._save_documents(directory)
+            print("✅ Documents saved successfully")
+            self._save_metadata(directory)
+            print("✅ Metadata saved successfully")
+            self._save_vectors(directory)
+            print("✅ Embeddings saved successfully")
+            self._save_manifest(snapshot)
         except Exception as e:
-            error_msg = f"Failed to save FAISS index: {str(e)}"
-            print(f"❌ {error_msg}")
-            errors.append(error_msg)
+            print(f"❌ Snapshot failed, keeping the previous one: {str(e)}")
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
         
-        # Save documents
+        previous, self._snapshot_dir = self._snapshot_dir, directory
+        self._snapshot_stale = False
+        if SHARED_INDEX:
+            # Serve from the snapshot like the other workers, so this one holds no private copy either
+            self.index = self._read_index(os.path.join(directory, "manual_index.faiss"))
+            apply_search_params(self.index, self.index_params)
+            self.lexical_index = LexicalIndex.load(os.path.join(directory, "lexical_index"))
         try:
-            self._save_documents()
-            print("✅ Documents saved successfully")
-            success_count += 1
+            self.journal.reset()
+            self._remove_snapshot(previous)
         except Exception as e:
-            error_msg = f"Failed to save documents: {str(e)}"
-            print(f"❌ {error_msg}")
-            errors.append(error_msg)
+            # Harmless: replay skips journaled entries the manifest says are included
+            print(f"⚠️  Could not clean up after snapshot: {str(e)}")
+        print(f"✅ All state saved successfully ({snapshot})")
+    
+    def save_state(self):
+        """Write a full snapshot now, e.g. after manuals were processed with persist=False."""
+        with self._writing():
+            self._save_state()
+    
+    @staticmethod
+    def _snapshot_path(manifest: Dict) -> str:
+        """Directory of the snapshot a manifest describes (older layouts kept it in VECTOR_DB_PATH)."""
+        if manifest.get('snapshot'):
+            return os.path.normpath(os.path.join(VECTOR_DB_PATH, manifest['snapshot']))
+        return os.path.normpath(VECTOR_DB_PATH)
+    
+    def _remove_snapshot(self, directory: str):
+        """Delete a superseded snapshot."""
+        if os.path.normpath(directory) != os.path.normpath(VECTOR_DB_PATH):
+            shutil.rmtree(directory, ignore_errors=True)
+            return
+        # State files written directly into VECTOR_DB_PATH by older versions
+        for name in SNAPSHOT_FILES:
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+    
+    def _snapshot_bytes(self) -> int:
+        """On-disk size of the current snapshot."""
+        total = 0
+        for name in SNAPSHOT_FILES:
+            path = os.path.join(self._snapshot_dir, name)
+            if os.path.isdir(path):
+                total += sum(os.path.getsize(os.path.join(path, child)) for child in os.listdir(path))
+            elif os.path.exists(path):
+                total += os.path.getsize(path)
+        return total
+    
+    def _add_rows(self, ids: np.ndarray, vectors: np.ndarray, pending_ids: np.ndarray,
+                  lexical_features: np.ndarray, texts: List[str], canonical_ids: np.ndarray):
+        """
+        Append chunk rows to the index, embedding matrix and lexical indexes.
+        Pending chunks and chunks sharing another chunk's vector stay out of FAISS.
+        """
+        indexed = ~np.isin(ids, pending_ids) & (canonical_ids == ids)
+        self._own_index()
+        self.index.add_with_ids(vectors[indexed], ids[indexed])
+        self.pending_ids.update(np.asarray(pending_ids).tolist())
+        self.vectors = np.vstack([self.vectors, vectors])
+        self.chunk_ids = np.concatenate([self.chunk_ids, ids])
+        self.canonical_ids = np.concatenate([self.canonical_ids, canonical_ids])
+        if self._dedup_cache is not None:
+            by_hash, sharers = self._dedup_cache
+            if self._dedup_cache is self._state._dedup_cache:
+                by_hash, sharers = dict(by_hash), {canonical_id: list(positions) for canonical_id, positions in sharers.items()}
+                self._dedup_cache = (by_hash, sharers)
+            start = len(self.chunk_ids) - len(ids)
+            for offset, (chunk_id, canonical_id) in enumerate(zip(ids.tolist(), canonical_ids.tolist())):
+                if chunk_id != canonical_id:
+                    sharers.setdefault(canonical_id, []).append(start + offset)
+                elif indexed[offset]:
+                    by_hash.setdefault(hashlib.md5(texts[offset].encode('utf-8')).digest(), chunk_id)
+        self.lexical_features = np.vstack([self.lexical_features, lexical_features])
+        self._own_lexical_index()
+        self.lexical_index.add(ids, texts)
+    
+    def _dedup_tables(self):
+        """
+        (hash -> chunk ID with its own index vector, canonical ID -> positions of
+        the chunks sharing its vector), built on first use after a load or delete.
+        """
+        if self._dedup_cache is None:
+            indexed = np.zeros(len(self.chunk_ids), dtype=bool)
+            indexed[self._indexed_positions()] = True
+            by_hash, sharers = {}, {}
+            for pos, (h, chunk_id, canonical_id) in enumerate(zip(self._chunk_hashes().tolist(), self.chunk_ids.tolist(),
+                                                                   self.canonical_ids.tolist())):
+                if chunk_id != canonical_id:
+                    sharers.setdefault(canonical_id, []).append(pos)
+                elif indexed[pos]:
+                    by_hash.setdefault(h, chunk_id)
+            self._dedup_cache = (by_hash, sharers)
+        return self._dedup_cache
+    
+    def _find_shared_vectors(self, ids: np.ndarray, texts: List[str], vectors: np.ndarray, failed: List[int]):
+        """
+        Canonical chunk ID for each new chunk: the ID of an indexed chunk with the
+        same text, or with an embedding at least DEDUP_SIMILARITY cosine-similar
+        (embeddings are unit length, so that is a squared L2 bound), else its own.
+        
+        Returns:
+            (canonical_ids, exact, near): canonical IDs and the duplicate counts
+        """
+        canonical_ids = ids.copy()
+        if not DEDUP_ENABLED or not len(ids):
+            return canonical_ids, 0, 0
+        by_hash, _ = self._dedup_tables()
+        embedded = np.setdiff1d(np.arange(len(ids)), failed)
         
-        # Save metadata
+        nearest = {}
+        if DEDUP_SIMILARITY < 1.0 and self.index.ntotal and len(embedded):
+            D, I = self._search_index(vectors[embedded], 1)
+            max_distance = 2.0 * (1.0 - DEDUP_SIMILARITY)
+            nearest = {row: int(I[i, 0]) for i, row in enumerate(embedded.tolist())
+                       if I[i, 0] >= 0 and D[i, 0] <= max_distance}
+        
+        # Duplicates inside the new manual share its first copy
+        batch_hashes = {}
+        exact = near = 0
+        for row in embedded.tolist():
+            h = hashlib.md5(texts[row].encode('utf-8')).digest()
+            match = by_hash.get(h, batch_hashes.get(h))
+            if match is not None:
+                canonical_ids[row] = match
+                exact += 1
+            elif row in nearest:
+                canonical_ids[row] = nearest[row]
+                near += 1
+            else:
+                batch_hashes[h] = int(ids[row])
+        return canonical_ids, exact, near
+    
+    def _journal_add(self, file_id: str):
+        """Persist a newly ingested manual as one journal entry holding just its rows."""
+        manual = self.metadata[file_id]
+        start, end = manual['start_idx'], manual['end_idx']
+        ids = self.chunk_ids[start:end]
+        arrays = self.documents.rows(start, end)
+        arrays['vectors'] = np.ascontiguousarray(self.vectors[start:end], dtype=np.float32)
+        arrays['lexical_features'] = np.asarray(self.lexical_features[start:end])
+        arrays['canonical_ids'] = self.canonical_ids[start:end]
+        self._persist({
+            'op': 'add',
+            'file_id': file_id,
+            'manual': manual,
+            'chunk_manual': self.documents.manual_of(start) if end > start else {},
+            'pending_chunk_ids': sorted(self.pending_ids.intersection(ids.tolist())),
+            'next_chunk_id': self.next_chunk_id
+        }, arrays)
+    
+    def _persist(self, entry: Dict, arrays: Optional[Dict[str, np.ndarray]] = None):
+        """
+        Make a change durable by appending it to the journal, so the cost of a
+        save is proportional to the change rather than the corpus. Falls back to a
+        full snapshot if the journal can't be written.
+        """
         try:
-            self._save_metadata()
-            print("✅ Metadata saved successfully")
-            success_count += 1
+            self.journal.append(entry, arrays)
         except Exception as e:
-            error_msg = f"Failed to save metadata: {str(e)}"
-            print(f"❌ {error_msg}")
-            errors.append(error_msg)
-        
-        # Report results
-        if errors:
-            print(f"⚠️  Partial save completed: {success_count}/3 operations successful")
-            for error in errors:
-                print(f"   - {error}")
-            # Still raise an exception if critical components failed
-            if success_count == 0:
-                raise Exception("All save operations failed: " + "; ".join(errors))
-        else:
-            print("✅ All state saved successfully")
+            print(f"❌ Journal append failed ({str(e)}), writing a full snapshot instead")
+            self._save_state()
+            return
+        self._maybe_compact()
+    
+    def _maybe_compact(self):
+        """Fold the journal into a new snapshot once it is large relative to the snapshot."""
+        journal_bytes = self.journal.size_bytes()
+        threshold = max(JOURNAL_COMPACT_MIN_MB * 1024 * 1024, JOURNAL_COMPACT_RATIO * self._snapshot_bytes())
+        if journal_bytes < threshold and self.journal.num_entries < JOURNAL_MAX_ENTRIES:
+            return
+        print(f"🗜️  Compacting journal ({self.journal.num_entries} entries, {journal_bytes / 1e6:.1f} MB)")
+        try:
+            self._save_state()
+        except Exception as e:
+            # The entries are still in the journal, so nothing is lost
+            print(f"❌ Journal compaction failed: {str(e)}")
+    
+    def _replay_journal(self, after_seq: int, repair: bool = True) -> List:
+        """
+        Re-apply the changes journaled after after_seq, in order.
+        
+        Returns:
+            (event, file_id, manual) change events for the replayed entries
+        """
+        entries = self.journal.recover(after_seq, repair)
+        if not entries:
+            return []
+        print(f"📜 Replaying {len(entries)} journal entries")
+        
+        events = []
+        for entry in entries:
+            op, file_id = entry['op'], entry.get('file_id')
+            if op == 'add':
+                # Skip manuals already present (the entry was applied before a crash)
+                if file_id in self.metadata:
+                    continue
+                arrays = self.journal.load_arrays(entry)
+                start = len(self.documents)
+                if len(arrays['chunk_ids']):
+                    self.documents.append_rows(arrays, entry['chunk_manual'])
+                    self._add_rows(arrays['chunk_ids'], arrays['vectors'],
+                                   np.array(entry['pending_chunk_ids'], dtype=np.int64),
+                                   arrays['lexical_features'], self.documents.texts(range(start, len(self.documents))),
+                                   arrays.get('canonical_ids', arrays['chunk_ids']))
+                self.metadata[file_id] = dict(entry['manual'], start_idx=start, end_idx=len(self.documents))
+                self.next_chunk_id = max(self.next_chunk_id, entry['next_chunk_id'])
+                events.append(('added', file_id, self.metadata[file_id]))
+            elif op == 'delete':
+                if file_id in self.metadata:
+                    events.append(('deleted', file_id, self.metadata[file_id]))
+                    self._remove_manual(file_id)
+            elif op == 'embedded':
+                arrays = self.journal.load_arrays(entry)
+                _, positions, _ = self._apply_embeddings(arrays['chunk_ids'], arrays['vectors'])
+                for updated in {self.documents.file_id(pos) for pos in positions.tolist()}:
+                    events.append(('updated', updated, self.metadata.get(updated)))
+        
+        self._maybe_reindex()
+        print(f"✅ Journal replayed ({len(self.documents)} chunks, {len(self.metadata)} manuals)")
+        return events
     
     def _detect_language(self, text: str) -> str:
         """Detect the language of the text."""
@@ -345,210 +1432,200 @@ class DocumentProcessor:
         except:
             return 'en'  # Default to English if detection fails
     
-    def _fix_shifted_text(self, text: str) -> str:
-        """Fix text that has been shifted by 1 in the ASCII table."""
-        result = ""
-        for char in text:
-            # Skip non-ASCII characters and spaces
-            if ord(char) < 32 or ord(char) > 126:
-                result += char
-                continue
-            
-            # Shift ASCII characters back by 1
-            if char.isalpha():
-                ascii_val = ord(char)
-                if char.isupper():
-                    # Handle uppercase wraparound (A->Z)
-                    if ascii_val == ord('A'):
-                        ascii_val = ord('Z')
-                    else:
-                        ascii_val -= 1
-                else:
-                    # Handle lowercase wraparound (a->z)
-                    if ascii_val == ord('a'):
-                        ascii_val = ord('z')
-                    else:
-                        ascii_val -= 1
-                result += chr(ascii_val)
-            else:
-                # For non-alphabetic characters, just shift back by 1 if in ASCII range
-                ascii_val = ord(char)
-                if 33 <= ascii_val <= 126:  # Printable ASCII range
-                    result += chr(ascii_val - 1)
-                else:
-                    result += char
-        return result
-
-    def process_pdf(self, file_path: str, metadata: Dict) -> str:
-        """Process a PDF file and add it to the vector store."""
+    def process_pdf(self, file_path: str, metadata: Dict, file_id: Optional[str] = None,
+                    progress: Optional[Callable[..., None]] = None, persist: bool = True) -> str:
+        """
+        Process a PDF file and add it to the vector store.
+        
+        Args:
+            file_path: Path of the PDF to ingest
+            metadata: User-provided manual metadata (brand, model, ...)
+            file_id: Existing ID when resuming an interrupted ingestion
+            progress: Called as progress(stage, **counts) while the manual is
+                parsed, embedded and indexed (see _stream_pdf)
+            persist: Journal the manual (and track it for resumption) right away.
+                Bulk loads pass False and call save_state() once at the end.
+        """
         try:
             print(f"🔄 Starting PDF processing for: {os.path.basename(file_path)}")
             
             # Generate a unique file ID
-            file_id = self._generate_file_id(file_path)
+            if file_id is None:
+                file_id = self._generate_file_id(file_path)
             print(f"📝 Generated file ID: {file_id}")
             
-            # Load and process the PDF
-            print("📖 Loading PDF pages...")
-            loader = PyPDFLoader(file_path)
-            pages = loader.load()
-            print(f"📄 Loaded {len(pages)} pages from PDF")
+            # Record the upload so it can be resumed if we crash before saving
+            if persist:
+                self._mark_ingest_started(file_id, file_path, metadata)
             
-            if not pages:
+            # Stream pages through extract/clean/chunk and embedding; only each chunk's
+            # text, page position and vector are kept until the manual is indexed
+            staged = self._stream_pdf(file_path, progress)
+            texts = staged['texts']
+            num_pages = len(staged['chunks_per_page'])
+            print(f"📄 Loaded {num_pages} pages from PDF")
+            
+            if not num_pages:
                 raise ValueError("No content found in PDF")
             
             # Detect document language if not provided
             doc_language = metadata.get('language', 'en')
+            print(f"📊 Created {len(texts)} chunks total")
+            
+            lexical_features = compute_lexical_features(texts)
+            embeddings, failed = staged['embeddings'], staged['failed']
             
-            # Enhanced text splitting with better chunking strategy
-            print("✂️ Starting text chunking...")
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=DEFAULT_CHUNK_SIZE,
-                chunk_overlap=DEFAULT_CHUNK_OVERLAP,
-                length_function=len,
-                separators=["\n\n", "\n", ".", "!", "?", ";", ":", " ", ""],  # Order matters
-                keep_separator=True
-            )
-            
-            # Process each page and maintain metadata
-            all_chunks = []
-            print("📝 Processing pages and creating chunks...")
-            for i, page in enumerate(pages):
-                if i % 5 == 0:  # Log progress every 5 pages
-                    print(f"   Processing page {i+1}/{len(pages)}")
+            if progress:
+                progress('indexing')
+            with self._writing():
+                # Add to FAISS index under freshly allocated chunk IDs
+                print("💾 Adding embeddings to FAISS index...")
+                new_ids = self._allocate_chunk_ids(len(texts))
                 
-                # Extract and clean the text
-                page_text = page.page_content
+                # Boilerplate already in the index (safety, warranty, disposal pages) shares its vector
+                canonical_ids, exact, near = self._find_shared_vectors(new_ids, texts, embeddings, failed)
+                if exact or near:
+                    print(f"♻️  {exact + near} chunks share an existing vector ({exact} exact, {near} near-duplicate)")
                 
-                # Fix encoding issues
-                try:
-                    # First try to fix shifted text
-                    if any(c.isalpha() for c in page_text):  # Only try if there are letters
-                        sample = page_text[:100]  # Take a sample to check if it needs fixing
-                        fixed_sample = self._fix_shifted_text(sample)
-                        # If the fixed sample looks more like English, apply the fix
-                        if self._looks_like_english(fixed_sample) > self._looks_like_english(sample):
-                            print(f"   Applying character shift correction for page {i+1}")
-                            page_text = self._fix_shifted_text(page_text)
-                    
-                    # Normalize Unicode characters
-                    page_text = unicodedata.normalize('NFKC', page_text)
-                    
-                    # Remove non-printable characters
-                    page_text = ''.join(char for char in page_text if unicodedata.category(char)[0] != 'C')
-                    
-                    # Handle common encoding issues
-                    page_text = page_text.encode('utf-8', errors='ignore').decode('utf-8')
-                    
-                    # Replace common problematic characters
-                    replacements = {
-                        '\x00': '',  # null byte
-                        '\ufffd': '',  # Unicode replacement character
-                        '': '',  # Unicode replacement character
-                        '\u0013': '',  # DC3 control character
-                        '\u0001': ' ',  # Start of Heading control character - replace with space
-                        '\u000e': '',  # Shift Out
-                        '\u000f': '',  # Shift In
-                        '\u0014': '',  # DC4
-                        '\u0015': '',  # NAK
-                        '\u0006': '',  # ACK
-                        '\r': '\n',    # Convert carriage returns to newlines
-                    }
-                    for old, new in replacements.items():
-                        page_text = page_text.replace(old, new)
-                    
-                    # Clean up multiple spaces
-                    page_text = ' '.join(page_text.split())
-                    
-                except Exception as e:
-                    print(f"Warning: Error during text encoding cleanup: {str(e)}")
-                
-                # Preserve important formatting
-                page_text = page_text.replace('\n\n', '[PARA]')  # Mark paragraphs
-                page_text = page_text.replace('\n', ' ')  # Replace single newlines
-                page_text = page_text.replace('[PARA]', '\n\n')  # Restore paragraphs
+                # Chunks whose batch failed stay out of the index until the retrier embeds them
+                self._add_rows(new_ids, embeddings, new_ids[failed], lexical_features, texts, canonical_ids)
+                if failed:
+                    print(f"⚠️  {len(failed)} chunks queued for embedding retry")
+                self._maybe_reindex()
+                print("✅ FAISS index updated")
                 
-                # Create the page document with cleaned text
-                page_doc = Document(
-                    page_content=page_text,
-                    metadata=page.metadata
-                )
+                # Store metadata
+                start_idx = len(self.documents)
+                self.metadata[file_id] = {
+                    'filename': os.path.basename(file_path),
+                    'brand': metadata.get('brand', 'Unknown'),
+                    'model': metadata.get('model', 'Unknown'),
+                    'product_type': metadata.get('product_type', 'Unknown'),
+                    'year': metadata.get('year', str(datetime.now().year)),
+                    'timestamp': datetime.now().isoformat(),
+                    'num_pages': num_pages,
+                    'num_chunks': len(texts),
+                    'start_idx': start_idx,
+                    'end_idx': start_idx + len(texts),
+                    'chunks_per_page': staged['chunks_per_page'],
+                    'total_tokens': sum(len(text.split()) for text in texts),
+                    'shared_chunks': exact + near,
+                    'language': doc_language
+                }
                 
-                # Split into chunks
-                chunks = text_splitter.split_documents([page_doc])
+                # Update documents
+                self.documents.append_manual(texts, new_ids, staged['pages'], staged['chunk_numbers'], staged['page_chunks'],
+                                             dict(self.metadata[file_id], file_id=file_id))
+                self.catalog.add(file_id, self.metadata[file_id])
                 
-                for j, chunk in enumerate(chunks):
-                    # Preserve user-provided metadata and add chunk-specific metadata
-                    chunk.metadata.update({
-                        'file_id': file_id,
-                        'page': i + 1,
-                        'chunk': j + 1,
-                        'total_chunks_in_page': len(chunks),
-                        'filename': os.path.basename(file_path),
-                        'brand': metadata.get('brand', 'Unknown'),
-                        'model': metadata.get('model', 'Unknown'),
-                        'product_type': metadata.get('product_type', 'Unknown'),
-                        'year': metadata.get('year', str(datetime.now().year)),
-                        'language': doc_language,
-                        'timestamp': datetime.now().isoformat(),
-                        'is_start_of_page': j == 0,
-                        'is_end_of_page': j == len(chunks) - 1
-                    })
-                    
-                    # Add context from adjacent chunks if available
-                    if j > 0:
-                        chunk.metadata['prev_chunk_preview'] = chunks[j-1].page_content[-100:]
-                    if j < len(chunks) - 1:
-                        chunk.metadata['next_chunk_preview'] = chunks[j+1].page_content[:100]
-                    
-                    all_chunks.append(chunk)
-            
-            print(f"📊 Created {len(all_chunks)} chunks total")
-            
-            # Get embeddings for all chunks at once
-            print("🧠 Generating embeddings using OpenAI API...")
-            print(f"   Processing {len(all_chunks)} chunks for embedding generation")
-            texts = [chunk.page_content for chunk in all_chunks]
-            embeddings = self.embeddings.embed_documents(texts)
-            print("✅ Embedding generation completed")
-            
-            # Add to FAISS index
-            print("💾 Adding embeddings to FAISS index...")
-            self.index.add(np.array(embeddings).astype('float32'))
-            print("✅ FAISS index updated")
-            
-            # Update documents and metadata
-            start_idx = len(self.documents)
-            self.documents.extend(all_chunks)
-            
-            # Store metadata
-            self.metadata[file_id] = {
-                'filename': os.path.basename(file_path),
-                'brand': metadata.get('brand', 'Unknown'),
-                'model': metadata.get('model', 'Unknown'),
-                'product_type': metadata.get('product_type', 'Unknown'),
-                'year': metadata.get('year', str(datetime.now().year)),
-                'timestamp': datetime.now().isoformat(),
-                'num_pages': len(pages),
-                'num_chunks': len(all_chunks),
-                'start_idx': start_idx,
-                'end_idx': start_idx + len(all_chunks),
-                'chunks_per_page': [len(text_splitter.split_documents([page])) for page in pages],
-                'total_tokens': sum(len(chunk.page_content.split()) for chunk in all_chunks),
-                'language': doc_language
-            }
+                # Save state: only this manual's rows are written
+                if persist:
+                    print("💾 Saving database state...")
+                    self._journal_add(file_id)
             
-            # Save state
-            print("💾 Saving database state...")
-            self._save_state()
+            if persist:
+                self._mark_ingest_finished(file_id)
+            self._notify_change('added', file_id, self.metadata.get(file_id))
             print(f"🎉 PDF processing completed successfully! File ID: {file_id}")
             
             return file_id
             
         except Exception as e:
             print(f"Error processing PDF: {str(e)}")
+            # A handled failure is final; only crashes should be resumed on restart
+            if file_id is not None and persist:
+                self._mark_ingest_finished(file_id)
             raise
     
+    def _stream_pdf(self, file_path: str, progress: Optional[Callable[..., None]] = None) -> Dict:
+        """
+        Run a PDF through the ingestion pipeline:
+        extract -> clean -> chunk (worker processes) -> embed (embedding threads).
+        
+        Chunks are grouped into blocks of EMBEDDING_BATCH_SIZE * EMBEDDING_WORKERS
+        and each block is embedded as soon as it fills, while later pages are still
+        being parsed. Both hand-offs are bounded: at most INGEST_QUEUE_DEPTH blocks
+        are queued for embedding, and page extraction only runs a few ranges ahead
+        of chunking, so a slow stage throttles the others.
+        
+        progress, if given, is called as each page is parsed and each block
+        embedded: progress('parsing', pages_total=, pages_processed=,
+        chunks_parsed=, chunks_embedded=), then progress('embedding',
+        chunks_total=) once the last page is parsed.
+        
+        Returns:
+            Dict of 'texts', 'pages', 'chunk_numbers', 'page_chunks' (per chunk),
+            'chunks_per_page' (per page), 'embeddings', 'failed' and 'timings'
+        """
+        started = time.perf_counter()
+        staged = {'texts': [], 'pages': [], 'chunk_numbers': [], 'page_chunks': [], 'chunks_per_page': []}
+        texts = staged['texts']
+        timings = {'embed': 0.0}
+        block_size = EMBEDDING_BATCH_SIZE * EMBEDDING_WORKERS
+        parts, failed = [], []
+        in_flight = deque()
+        block_start = 0
+        first_block = None
+        parsing = True
+        
+        def embed_block(block: List[str]):
+            block_started = time.perf_counter()
+            result = self.embeddings.embed_documents_partial(block)
+            return result, time.perf_counter() - block_started
+        
+        def collect(limit: int):
+            # Wait for the oldest blocks until at most `limit` are in flight
+            while len(in_flight) > limit:
+                offset, future = in_flight.popleft()
+                (vectors, block_failed), seconds = future.result()
+                parts.append(np.asarray(vectors, dtype=np.float32))
+                failed.extend(offset + i for i in block_failed)
+                timings['embed'] += seconds
+                if progress:
+                    progress('parsing' if parsing else 'embedding', chunks_embedded=sum(len(part) for part in parts))
+        
+        print(f"📖 Streaming PDF pages ({PDF_WORKERS or os.cpu_count()} extraction workers, "
+              f"embedding blocks of {block_size} chunks)...")
+        with ThreadPoolExecutor(max_workers=1) as embed_stage:
+            pages = iter_pdf_pages(file_path, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP, PDF_WORKERS, timings)
+            for page_number, page in enumerate(pages, 1):
+                chunks = page['chunks']
+                texts.extend(chunks)
+                staged['pages'].extend([page_number] * len(chunks))
+                staged['chunk_numbers'].extend(range(1, len(chunks) + 1))
+                staged['page_chunks'].extend([len(chunks)] * len(chunks))
+                staged['chunks_per_page'].append(page['raw_chunks'])
+                if progress:
+                    progress('parsing', pages_total=timings['pages'], pages_processed=page_number, chunks_parsed=len(texts))
+                
+                if len(texts) - block_start >= block_size:
+                    if first_block is None:
+                        first_block = (page_number, time.perf_counter() - started)
+                    in_flight.append((block_start, embed_stage.submit(embed_block, texts[block_start:])))
+                    block_start = len(texts)
+                    collect(INGEST_QUEUE_DEPTH)
+            
+            parsing = False
+            if progress:
+                progress('embedding', chunks_total=len(texts))
+            if block_start < len(texts):
+                in_flight.append((block_start, embed_stage.submit(embed_block, texts[block_start:])))
+            collect(0)
+        
+        staged['embeddings'] = np.vstack(parts) if parts else np.zeros((0, self.embedding_dimensions), dtype=np.float32)
+        staged['failed'] = failed
+        timings['wall'] = time.perf_counter() - started
+        staged['timings'] = timings
+        
+        num_pages = len(staged['chunks_per_page'])
+        first = (f"first embedding block after page {first_block[0]} ({first_block[1]:.2f}s)" if first_block
+                 else "embedded in one block after the last page")
+        print(f"⏱️  Ingested {num_pages} pages / {len(texts)} chunks in {timings['wall']:.2f}s "
+              f"({num_pages / max(timings['wall'], 1e-9):.1f} pages/sec) on {timings['workers']} workers; {first}; "
+              f"worker time: extract {timings['extract']:.2f}s, clean {timings['clean']:.2f}s, "
+              f"chunk {timings['chunk']:.2f}s; embedding {timings['embed']:.2f}s")
+        return staged
+    
     def delete_document(self, file_id: str) -> bool:
         """
         Completely delete a document and its associated data from the system.
@@ -559,51 +1636,101 @@ class DocumentProcessor:
         Returns:
             success: Whether the deletion was successful
         """
+        with self._writing():
+            manual = self.metadata.get(file_id)
+            deleted = self._delete_document(file_id)
+        if deleted:
+            self._notify_change('deleted', file_id, manual)
+        return deleted
+    
+    def _delete_document(self, file_id: str) -> bool:
         if file_id not in self.metadata:
             return False
         
         try:
-            # Get document indices for this file
-            start_idx = self.metadata[file_id]['start_idx']
-            end_idx = self.metadata[file_id]['end_idx']
-            num_chunks = end_idx - start_idx
-            
-            # Remove documents from the list
-            self.documents = self.documents[:start_idx] + self.documents[end_idx:]
-            
-            # Update metadata indices for all files that come after this one
-            for meta in self.metadata.values():
-                if meta['start_idx'] > start_idx:
-                    meta['start_idx'] -= num_chunks
-                    meta['end_idx'] -= num_chunks
-            
-            # Remove from metadata
-            del self.metadata[file_id]
-            
-            # Rebuild the index with remaining documents
-            print("Rebuilding index after document deletion...")
-            self.index = faiss.IndexFlatL2(self.embedding_dimensions)
-            
-            if self.documents:  # Only rebuild if we have documents
-                # Get embeddings for all remaining documents
-                texts = [doc.page_content for doc in self.documents]
-                try:
-                    embeddings = self.embeddings.embed_documents(texts)
-                    self.index.add(np.array(embeddings).astype('float32'))
-                except Exception as e:
-                    print(f"Error rebuilding embeddings: {str(e)}")
-                    raise
+            num_chunks = self._remove_manual(file_id)
             
             # Save updated state
-            self._save_state()
+            self._persist({'op': 'delete', 'file_id': file_id})
             
-            print(f"Successfully deleted document {file_id} and rebuilt index")
+            print(f"Successfully deleted document {file_id} ({num_chunks} chunks)")
             return True
             
         except Exception as e:
             print(f"Error deleting document: {str(e)}")
             return False
     
+    def _remove_manual(self, file_id: str) -> int:
+        """Drop a manual's chunks from every in-memory structure; returns the chunk count."""
+        # Get document indices for this file
+        start_idx = self.metadata[file_id]['start_idx']
+        end_idx = self.metadata[file_id]['end_idx']
+        num_chunks = end_idx - start_idx
+        
+        # Drop this manual's vectors from the index by chunk ID; the rest stay untouched
+        removed_ids = self.chunk_ids[start_idx:end_idx]
+        promoted = self._promote_sharers(start_idx, end_idx)
+        can_remove = supports_remove(self.index_params.get('type', 'flat'))
+        if can_remove:
+            self._own_index()
+            removed = self.index.remove_ids(faiss.IDSelectorBatch(removed_ids))
+            print(f"Removed {removed} vectors from FAISS index")
+            if len(promoted):
+                self.index.add_with_ids(np.asarray(self.vectors[promoted], dtype=np.float32), self.chunk_ids[promoted])
+                print(f"♻️  {len(promoted)} shared vectors moved to copies in other manuals")
+        
+        self._own_lexical_index()
+        self.lexical_index.remove(removed_ids, self.documents.texts(range(start_idx, end_idx)))
+        
+        # Remove documents and their aligned rows
+        self.documents.delete_range(start_idx, end_idx)
+        self.vectors = np.delete(self.vectors, np.s_[start_idx:end_idx], axis=0)
+        self.chunk_ids = np.delete(self.chunk_ids, np.s_[start_idx:end_idx])
+        self.canonical_ids = np.delete(self.canonical_ids, np.s_[start_idx:end_idx])
+        self._dedup_cache = None
+        self.lexical_features = np.delete(self.lexical_features, np.s_[start_idx:end_idx], axis=0)
+        self.pending_ids.difference_update(removed_ids.tolist())
+        
+        # Update metadata indices for all files that come after this one
+        for meta in self.metadata.values():
+            if meta['start_idx'] > start_idx:
+                meta['start_idx'] -= num_chunks
+                meta['end_idx'] -= num_chunks
+        
+        # Remove from metadata
+        del self.metadata[file_id]
+        self.catalog.remove(file_id)
+        
+        # Graph indexes can't drop entries, so rebuild them from the stored vectors
+        if can_remove:
+            self._maybe_reindex()
+        else:
+            self._rebuild_index()
+        
+        return num_chunks
+    
+    def _promote_sharers(self, start: int, end: int) -> np.ndarray:
+        """
+        Before chunks [start, end) are removed, hand each index vector they own to
+        the first chunk outside the range that shares it.
+        
+        Returns:
+            Positions of the promoted chunks (their vectors are not in the index yet)
+        """
+        _, sharers = self._dedup_tables()
+        promoted = []
+        for chunk_id, canonical_id in zip(self.chunk_ids[start:end].tolist(), self.canonical_ids[start:end].tolist()):
+            if chunk_id != canonical_id:
+                continue
+            remaining = [p for p in sharers.get(chunk_id, []) if not start <= p < end]
+            if remaining:
+                if self.canonical_ids is self._state.canonical_ids:
+                    self.canonical_ids = self.canonical_ids.copy()
+                self.canonical_ids[remaining] = self.chunk_ids[remaining[0]]
+                promoted.append(remaining[0])
+        return np.array(promoted, dtype=np.int64)
+    
+    @reads_state
     def get_all_manuals(self) -> List[Dict]:
         """Get metadata for all manuals in the system."""
         try:
@@ -612,7 +1739,8 @@ class DocumentProcessor:
                 print("Warning: metadata not initialized, returning empty list")
                 return []
             
-            return [
+            # Built once per catalog version; callers get their own list
+            return list(self.catalog.cached(('manuals',), lambda: tuple(
                 {
                     'file_id': file_id,
                     'filename': data['filename'],
@@ -621,11 +1749,12 @@ class DocumentProcessor:
                     'timestamp': data['timestamp']
                 }
                 for file_id, data in self.metadata.items()
-            ]
+            )))
         except Exception as e:
             print(f"Error in get_all_manuals: {str(e)}")
             return []  # Return empty list instead of failing
     
+    @reads_state
     def similarity_search(
         self, 
         query: str, 
@@ -662,28 +1791,7 @@ class DocumentProcessor:
             print(f"🔒 STRICT FILTERING: Only searching within {brand or 'any'} {model or 'any'} documents")
             
             # Find matching manual(s) by metadata
-            matching_manuals = []
-            for file_id, manual_meta in self.metadata.items():
-                # Skip deleted manuals
-                if not include_deleted and manual_meta.get('is_deleted', False):
-                    continue
-                    
-                # Check brand/model match
-                manual_brand = manual_meta.get('brand', '').strip()
-                manual_model = manual_meta.get('model', '').strip()
-                
-                brand_match = not brand or manual_brand == brand
-                model_match = not model or manual_model == model
-                
-                if brand_match and model_match:
-                    matching_manuals.append({
-                        'file_id': file_id,
-                        'brand': manual_brand,
-                        'model': manual_model,
-                        'start_idx': manual_meta['start_idx'],
-                        'end_idx': manual_meta['end_idx'],
-                        'num_chunks': manual_meta['num_chunks']
-                    })
+            matching_manuals = self._find_matching_manuals(brand, model, include_deleted)
             
             print(f"📋 Found {len(matching_manuals)} matching manual(s):")
             for manual in matching_manuals:
@@ -693,123 +1801,196 @@ class DocumentProcessor:
                 print(f"❌ No manuals found for {brand or 'any'} {model or 'any'}")
                 return []
             
-            # Use existing index and filter results instead of recreating embeddings
+            # Exact search over only the selected manuals' vectors; cost depends on
+            # the size of those manuals, not on the total corpus
             query_embedding = self.embeddings.embed_query(query)
-            search_k = min(k * 10, len(self.documents))  # Search more to get better results
-            D, I = self.index.search(
-                np.array([query_embedding], dtype=np.float32), 
-                k=search_k
-            )
-            
-            print(f"🔎 Index search returned {len(I[0])} results")
-            
-            # Filter results to only include documents from matching manuals
-            docs_with_scores = []
-            for i, doc_idx in enumerate(I[0]):
-                if doc_idx < len(self.documents):
-                    doc = self.documents[doc_idx]
-                    score = D[0][i]
-                    
-                    # Check if this document belongs to one of the matching manuals
-                    doc_file_id = doc.metadata.get('file_id')
-                    if any(manual['file_id'] == doc_file_id for manual in matching_manuals):
-                        
-                        print(f"  📄 Doc {len(docs_with_scores)+1}: Score={score:.4f}, Brand={doc.metadata.get('brand')}, Model={doc.metadata.get('model')}")
-                        print(f"      Content preview: {doc.page_content[:100]}...")
-                        
-                        # Apply content-based scoring improvements
-                        query_lower = query.lower()
-                        content_lower = doc.page_content.lower()
-                        
-                        # Boost for exact phrase matches
-                        if query_lower in content_lower:
-                            score = score * 0.7
-                            print(f"      🎯 EXACT PHRASE MATCH BOOST")
-                        
-                        # Boost for multiple word matches
-                        query_words = query_lower.split()
-                        word_matches = sum(1 for word in query_words if word in content_lower)
-                        if word_matches > 1:
-                            boost_factor = 1.0 - (word_matches * 0.05)
-                            score = score * boost_factor
-                            print(f"      🎯 WORD MATCH BOOST: {word_matches} words")
-                        
-                        # Special boosting for program/cycle queries
-                        program_keywords = ['program', 'cycle', 'course', 'setting', 'mode', 'function']
-                        if any(keyword in query_lower for keyword in program_keywords):
-                            content_length = len(doc.page_content)
-                            if content_length > 500:
-                                score = score * 0.8
-                                print(f"      🎯 DETAILED CONTENT BOOST: {content_length} chars")
-                            
-                            instructional_terms = ['press', 'select', 'button', 'follow', 'step', 'wash', 'rinse', 'spin', 'temperature', 'time', 'recommended', 'use']
-                            instruction_matches = sum(1 for term in instructional_terms if term in content_lower)
-                            if instruction_matches >= 3:
-                                score = score * 0.85
-                                print(f"      🎯 INSTRUCTIONAL CONTENT BOOST: {instruction_matches} terms")
-                            
-                            detail_terms = ['gentle', 'protect', 'temperature', 'detergent', 'fabric', 'care', 'approved', 'woolmark', 'neutral', 'horizontal', 'cradling', 'soaking']
-                            detail_matches = sum(1 for term in detail_terms if term in content_lower)
-                            if detail_matches >= 2:
-                                score = score * 0.9
-                                print(f"      🎯 DETAILED EXPLANATION BOOST: {detail_matches} terms")
-                        
-                        print(f"      ✅ Final score: {score:.4f}")
-                        docs_with_scores.append((doc, score))
+            ranges = [(manual['start_idx'], manual['end_idx']) for manual in matching_manuals]
+            search_k = k * 10  # Search more to get better results
+            D, P = self._search_ranges(query_embedding, ranges, search_k)
+            
+            print(f"🔎 Exact search over {sum(end - start for start, end in ranges)} chunks returned {len(P)} results")
+            
+            candidates = self._score_filtered(query, D, P, ranges, search_k, include_deleted)
         
         else:
             # No brand/model filter - search all documents (original behavior)
             print("🌐 Searching across ALL documents (no brand/model filter)")
             
             query_embedding = self.embeddings.embed_query(query)
-            search_k = min(k * 50, len(self.documents), 200)
-            D, I = self.index.search(
-                np.array([query_embedding], dtype=np.float32), 
-                k=search_k
-            )
+            search_k = self._global_search_k(k)
+            D, I = self._search_index(np.array([query_embedding], dtype=np.float32), search_k)
         
             print(f"🔎 Global search returned {len(I[0])} results")
             
-            docs_with_scores = []
-            for i, doc_idx in enumerate(I[0]):
-                if doc_idx < len(self.documents):
-                    doc = self.documents[doc_idx]
-                    score = D[0][i]
-                    
-                    # Skip deleted documents
-                    file_id = doc.metadata.get('file_id')
-                    if not include_deleted and file_id and self.metadata.get(file_id, {}).get('is_deleted', False):
-                        continue
-                    
-                    # Apply same scoring improvements as above
-                    query_lower = query.lower()
-                    content_lower = doc.page_content.lower()
-                    
-                    if query_lower in content_lower:
-                        score = score * 0.7
-                    
-                    query_words = query_lower.split()
-                    word_matches = sum(1 for word in query_words if word in content_lower)
-                    if word_matches > 1:
-                        score = score * (1.0 - (word_matches * 0.05))
-                    
-                    docs_with_scores.append((doc, score))
-        
-        print(f"📊 Total candidates after filtering: {len(docs_with_scores)}")
+            candidates = self._score_global(query, D[0], I[0], search_k, include_deleted)
+        
+        print(f"📊 Total candidates after filtering: {len(candidates)}")
+        
+        result_docs = self._select_results(candidates, k)
+        
+        print(f"🎯 Final results: {len(result_docs)} documents")
+        for i, doc in enumerate(result_docs):
+            print(f"  {i+1}. {doc.metadata.get('brand')} {doc.metadata.get('model')} - Page {doc.metadata.get('page')}")
+            print(f"      Content: {doc.page_content[:150]}...")
+        
+        return result_docs
+    
+    @reads_state
+    def similarity_search_batch(self, queries: List[Dict], k: int = 4, include_deleted: bool = False) -> List[List[Document]]:
+        """
+        Search many queries at once.
+        
+        All queries are embedded together, unfiltered queries share one multi-row
+        index search, and queries with the same brand/model filter share one exact
+        scan of their manuals. Scoring is the same as similarity_search.
+        
+        Args:
+            queries: Dicts with 'query' and optional 'brand' / 'model'
+            k: Number of results per query
+            include_deleted: Whether to include documents marked as deleted
+            
+        Returns:
+            One list of Documents per query, in input order
+        """
+        results = [[] for _ in queries]
+        if not self.documents or not queries or k <= 0:
+            return results
+        
+        start_time = time.time()
+        texts = [item.get('query', '') for item in queries]
+        embeddings = self.embeddings.embed_queries(texts)
         
+        # Group queries by filter: (None, None) is the global index search
+        groups = {}
+        for i, item in enumerate(queries):
+            groups.setdefault((item.get('brand') or None, item.get('model') or None), []).append(i)
+        
+        for (brand, model), rows in groups.items():
+            if brand or model:
+                matching_manuals = self._find_matching_manuals(brand, model, include_deleted)
+                if not matching_manuals:
+                    continue
+                ranges = [(manual['start_idx'], manual['end_idx']) for manual in matching_manuals]
+                search_k = k * 10
+                D, P = self._search_ranges_batch(embeddings[rows], ranges, search_k)
+                for row, i in enumerate(rows):
+                    candidates = self._score_filtered(texts[i], D[row], P[row], ranges, search_k, include_deleted)
+                    results[i] = self._select_results(candidates, k)
+            else:
+                search_k = self._global_search_k(k)
+                D, I = self._search_index(embeddings[rows], search_k)
+                for row, i in enumerate(rows):
+                    candidates = self._score_global(texts[i], D[row], I[row], search_k, include_deleted)
+                    results[i] = self._select_results(candidates, k)
+        
+        elapsed = time.time() - start_time
+        print(f"🔍 Batch search: {len(queries)} queries in {len(groups)} filter groups, {elapsed:.2f}s "
+              f"({len(queries) / elapsed if elapsed > 0 else 0.0:.1f} queries/sec)")
+        return results
+    
+    def _find_matching_manuals(self, brand: Optional[str], model: Optional[str], include_deleted: bool) -> List[Dict]:
+        """Manuals whose brand/model match the filter exactly."""
+        matching_manuals = []
+        for file_id in self.catalog.find(brand, model, include_deleted):
+            info = self.catalog.info(file_id)
+            start_idx, end_idx = self.catalog.range_of(file_id)
+            matching_manuals.append({
+                'file_id': file_id,
+                'brand': info['brand'],
+                'model': info['model'],
+                'start_idx': start_idx,
+                'end_idx': end_idx,
+                'num_chunks': info['num_chunks']
+            })
+        return matching_manuals
+    
+    def _global_search_k(self, k: int) -> int:
+        """Dense candidates to fetch for an unfiltered search."""
+        # BM25 catches exact tokens (error codes, model numbers), so the dense side
+        # doesn't need the large over-fetch it uses on its own
+        if HYBRID_SEARCH:
+            return min(k * HYBRID_FETCH_FACTOR, len(self.documents))
+        return min(k * 50, len(self.documents), 200)
+    
+    def _score_filtered(self, query: str, D: np.ndarray, P: np.ndarray, ranges: List, search_k: int,
+                        include_deleted: bool) -> List:
+        """Boost (and fuse) candidates from an exact search over the selected manuals."""
+        # Lexical boosts are applied to all candidates at once from the
+        # precomputed per-chunk features
+        scores = rescore(D, self.documents.texts(P.tolist()), self.lexical_features[P], query)
+        print(f"🎯 Lexical boosts applied to {int(np.sum(scores < D))} of {len(P)} candidates")
+        candidates = list(zip(P.tolist(), scores.tolist()))
+        
+        if HYBRID_SEARCH:
+            allowed_ids = np.sort(np.concatenate([self.chunk_ids[start:end] for start, end in ranges]))
+            candidates = self._fuse_with_lexical(query, candidates, search_k, allowed_ids, include_deleted)
+        return candidates
+    
+    def _score_global(self, query: str, distances: np.ndarray, ids: np.ndarray, search_k: int,
+                      include_deleted: bool) -> List:
+        """Drop deleted manuals, then boost (and fuse) candidates from the global index search."""
+        positions = self._positions_for_ids(ids)
+        keep = np.flatnonzero(positions >= 0)
+        positions, rows = self._representatives(positions[keep], include_deleted)
+        
+        # Apply same scoring improvements as above (without the program/cycle boosts)
+        scores = rescore(distances[keep[rows]], self.documents.texts(positions.tolist()), self.lexical_features[positions],
+                         query, detailed_boosts=False)
+        candidates = list(zip(positions.tolist(), scores.tolist()))
+        
+        if HYBRID_SEARCH:
+            candidates = self._fuse_with_lexical(query, candidates, search_k, None, include_deleted)
+        return candidates
+    
+    def _representatives(self, positions: np.ndarray, include_deleted: bool):
+        """
+        Collapse unfiltered hits to one chunk per index vector: the chunk that owns
+        it, or the first chunk sharing it outside soft-deleted manuals.
+        
+        Returns:
+            (positions, rows): representative positions, in order and without
+            repeats, and the index of the input hit each one came from
+        """
+        positions = self._positions_for_ids(self.canonical_ids[np.asarray(positions, dtype=np.int64)])
+        skip_deleted = not include_deleted and self.catalog.has_deleted()
+        result, rows, seen = [], [], set()
+        for row, pos in enumerate(positions.tolist()):
+            if pos < 0 or pos in seen:
+                continue
+            seen.add(pos)
+            if skip_deleted and self.catalog.is_deleted(self.documents.file_id(pos)):
+                _, sharers = self._dedup_tables()
+                live = [p for p in sharers.get(int(self.chunk_ids[pos]), [])
+                        if not self.catalog.is_deleted(self.documents.file_id(p))]
+                if not live:
+                    continue
+                pos = live[0]
+            result.append(pos)
+            rows.append(row)
+        return np.array(result, dtype=np.int64), np.array(rows, dtype=np.int64)
+    
+    def _select_results(self, candidates: List, k: int) -> List[Document]:
+        """
+        Best k (position, score) candidates (lowest score first), skipping
+        near-duplicate content. Only the returned hits become Documents.
+        """
         # Sort by similarity score (lower is better for L2 distance)
-        docs_with_scores.sort(key=lambda x: x[1])
+        candidates.sort(key=lambda x: x[1])
         
         # Take the best results, avoiding duplicates
         result_docs = []
         seen_content = set()
+        seen_vectors = set()
         
-        for doc, score in docs_with_scores[:k*3]:
-            # Avoid near-duplicate content
-            content_hash = hash(doc.page_content[:200])
-            if content_hash in seen_content:
+        for doc_idx, score in candidates[:k*3]:
+            # Avoid near-duplicate content, including copies that share an index vector
+            content_hash = hash(self.documents.text(doc_idx)[:200])
+            canonical_id = int(self.canonical_ids[doc_idx])
+            if content_hash in seen_content or canonical_id in seen_vectors:
                 continue
             seen_content.add(content_hash)
+            seen_vectors.add(canonical_id)
+            doc = self.documents[doc_idx]
             
             # Add context from surrounding chunks if available
             if doc.metadata.get('prev_chunk_preview'):
@@ -822,13 +2003,203 @@ class DocumentProcessor:
             if len(result_docs) >= k:
                 break
         
-        print(f"🎯 Final results: {len(result_docs)} documents")
-        for i, doc in enumerate(result_docs):
-            print(f"  {i+1}. {doc.metadata.get('brand')} {doc.metadata.get('model')} - Page {doc.metadata.get('page')}")
-            print(f"      Content: {doc.page_content[:150]}...")
-        
         return result_docs
     
+    def _fuse_with_lexical(self, query: str, candidates: List, lexical_k: int,
+                           allowed_ids: Optional[np.ndarray], include_deleted: bool) -> List:
+        """
+        Merge the boosted dense ranking with a BM25 ranking by reciprocal rank fusion.
+        
+        Returns (position, -rrf_score) pairs, so the usual ascending sort puts the
+        best fused candidates first.
+        """
+        lexical_ids, _ = self.lexical_index.search(query, lexical_k, allowed_ids)
+        lexical_positions = self._positions_for_ids(lexical_ids)
+        lexical_positions = lexical_positions[lexical_positions >= 0]
+        if allowed_ids is None:
+            # Unfiltered: copies of shared boilerplate count once, like in the dense results
+            lexical_positions = self._representatives(lexical_positions, include_deleted)[0].tolist()
+        else:
+            lexical_positions = lexical_positions.tolist()
+            if not include_deleted and self.catalog.has_deleted():
+                lexical_positions = [pos for pos in lexical_positions if not self.catalog.is_deleted(self.documents.file_id(pos))]
+        
+        fused = {}
+        dense_positions = [pos for pos, _ in sorted(candidates, key=lambda x: x[1])]
+        for ranking in (dense_positions, lexical_positions):
+            for rank, pos in enumerate(ranking):
+                fused[pos] = fused.get(pos, 0.0) + 1.0 / (RRF_K + rank + 1)
+        
+        dense_set = set(dense_positions)
+        lexical_only = sum(1 for pos in lexical_positions if pos not in dense_set)
+        print(f"🔤 Lexical search matched {len(lexical_positions)} chunks ({lexical_only} not found by dense search)")
+        return [(pos, -score) for pos, score in fused.items()]
+    
+    def _search_ranges(self, query_embedding: np.ndarray, ranges: List, k: int):
+        """
+        Exact L2 search restricted to contiguous document ranges.
+        
+        Returns:
+            (distances, positions): squared L2 distances (as IndexFlatL2 reports them)
+            and document positions of the k nearest chunks, nearest first
+        """
+        D, P = self._search_ranges_batch(np.asarray(query_embedding, dtype=np.float32)[None, :], ranges, k)
+        return D[0], P[0]
+    
+    def _search_ranges_batch(self, queries: np.ndarray, ranges: List, k: int):
+        """
+        Exact L2 search of several queries restricted to the same document ranges.
+        
+        Scans each [start_idx, end_idx) slice of the embedding matrix once for all
+        queries with NumPy, skipping chunks that are still waiting for an embedding.
+        
+        Returns:
+            (distances, positions): per-query lists of squared L2 distances and
+            document positions of the k nearest chunks, nearest first
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        query_norms = np.einsum('ij,ij->i', queries, queries)
+        pending_positions = self._positions_for_ids(np.fromiter(self.pending_ids, dtype=np.int64, count=len(self.pending_ids)))
+        
+        all_distances, all_positions = [], []
+        for start_idx, end_idx in ranges:
+            if end_idx <= start_idx:
+                continue
+            block = self.vectors[start_idx:end_idx]
+            distances = np.einsum('ij,ij->i', block, block)[None, :] - 2.0 * (queries @ block.T) + query_norms[:, None]
+            positions = np.arange(start_idx, end_idx)
+            keep = ~np.isin(positions, pending_positions)
+            all_distances.append(distances[:, keep])
+            all_positions.append(positions[keep])
+        
+        if not all_distances:
+            return ([np.zeros(0, dtype=np.float32) for _ in queries],
+                    [np.zeros(0, dtype=np.int64) for _ in queries])
+        
+        distances = np.concatenate(all_distances, axis=1)
+        positions = np.broadcast_to(np.concatenate(all_positions), distances.shape)
+        if distances.shape[1] > k:
+            top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            distances = np.take_along_axis(distances, top, axis=1)
+            positions = np.take_along_axis(positions, top, axis=1)
+        order = np.argsort(distances, axis=1, kind='stable')
+        distances = np.maximum(np.take_along_axis(distances, order, axis=1), 0).astype(np.float32)
+        positions = np.take_along_axis(positions, order, axis=1)
+        return list(distances), list(positions)
+    
+    def _search_index(self, queries: np.ndarray, k: int):
+        """
+        Search the FAISS index, reranking compressed results at full precision.
+        
+        With fp16/int8/PQ storage, RERANK_FACTOR*k candidates are fetched and their
+        exact distances recomputed from the float32 embedding matrix.
+        
+        Returns:
+            (D, I) like faiss: squared L2 distances and chunk IDs, -1 padded
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        if self.index_params.get('storage', 'float32') == 'float32' or RERANK_FACTOR <= 0:
+            return self.index.search(queries, k)
+        
+        _, candidates = self.index.search(queries, k * RERANK_FACTOR)
+        D = np.full((len(queries), k), np.finfo(np.float32).max, dtype=np.float32)
+        I = np.full((len(queries), k), -1, dtype=np.int64)
+        for row, query in enumerate(queries):
+            ids = candidates[row][candidates[row] >= 0]
+            positions = self._positions_for_ids(ids)
+            ids, positions = ids[positions >= 0], positions[positions >= 0]
+            distances, order = exact_rerank(self.vectors, positions, query)
+            order = order[:k]
+            D[row, :len(order)] = distances[order]
+            I[row, :len(order)] = ids[order]
+        return D, I
+    
+    def _exact_neighbors(self, queries: np.ndarray, positions: np.ndarray, k: int) -> np.ndarray:
+        """Brute-force k nearest chunk IDs over the given positions, scanned in blocks."""
+        best_d = np.full((len(queries), 0), 0, dtype=np.float32)
+        best_p = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(positions), 16384):
+            block_positions = positions[start:start + 16384]
+            block = np.asarray(self.vectors[block_positions], dtype=np.float32)
+            distances = np.einsum('ij,ij->i', block, block)[None, :] - 2.0 * (queries @ block.T)
+            best_d = np.hstack([best_d, distances])
+            best_p = np.hstack([best_p, np.broadcast_to(block_positions, distances.shape)])
+            if best_d.shape[1] > k:
+                top = np.argpartition(best_d, k - 1, axis=1)[:, :k]
+                best_d = np.take_along_axis(best_d, top, axis=1)
+                best_p = np.take_along_axis(best_p, top, axis=1)
+        return self.chunk_ids[best_p]
+    
+    @reads_state
+    def _measure_recall(self, k: int = 10, sample: int = 50) -> Dict:
+        """
+        Recall@k of the index against exact search, using sampled chunk vectors as queries.
+        
+        Cached until the index changes, since the exact pass scans every vector. Runs on
+        the published state without self._lock, so uploads and deletes never wait for it.
+        """
+        key = (self.index.ntotal, self.next_chunk_id, len(self.pending_ids), json.dumps(self.index_params, sort_keys=True))
+        if self._recall_cache and self._recall_cache[0] == key:
+            return self._recall_cache[1]
+        
+        indexed = self._indexed_positions()
+        if len(indexed) <= k:
+            return None
+        rng = np.random.default_rng(0)
+        queries = np.asarray(self.vectors[np.sort(rng.choice(indexed, size=min(sample, len(indexed)), replace=False))], dtype=np.float32)
+        truth = self._exact_neighbors(queries, indexed, k)
+        _, raw = self.index.search(queries, k)
+        _, reranked = self._search_index(queries, k)
+        
+        def recall(found):
+            return float(np.mean([len(set(t.tolist()) & set(f.tolist())) / k for t, f in zip(truth, found)]))
+        
+        result = {
+            'k': k,
+            'sample_queries': len(queries),
+            'recall': recall(raw),
+            'recall_reranked': recall(reranked)
+        }
+        self._recall_cache = (key, result)
+        return result
+    
+    def _vector_storage_stats(self) -> Dict:
+        """Memory per chunk and recall loss of the current index encoding."""
+        storage = self.index_params.get('storage', 'float32')
+        per_chunk = bytes_per_vector(self.index, self.index_params)
+        float32_per_chunk = bytes_per_vector(faiss.IndexIDMap2(faiss.IndexFlatL2(self.embedding_dimensions)), {})
+        rerank = storage != 'float32' and RERANK_FACTOR > 0
+        stats = {
+            'storage': storage,
+            'configured_storage': VECTOR_STORAGE,
+            'bytes_per_chunk': per_chunk,
+            'float32_bytes_per_chunk': float32_per_chunk,
+            'compression_ratio': float32_per_chunk / per_chunk,
+            'index_memory_mb': self.index.ntotal * per_chunk / (1024 * 1024),
+            'rerank_factor': RERANK_FACTOR if rerank else 0,
+            'recall': None,
+            'recall_loss': None
+        }
+        try:
+            recall = self._measure_recall()
+            if recall:
+                stats['recall'] = recall
+                stats['recall_loss'] = 1.0 - (recall['recall_reranked'] if rerank else recall['recall'])
+        except Exception as e:
+            print(f"⚠️  Could not measure index recall: {str(e)}")
+        return stats
+    
+    def _dedup_stats(self) -> Dict:
+        """How many chunks share another chunk's index vector, and the index memory that saves."""
+        shared = int(np.count_nonzero(self.canonical_ids != self.chunk_ids))
+        return {
+            'enabled': DEDUP_ENABLED,
+            'similarity_threshold': DEDUP_SIMILARITY,
+            'shared_chunks': shared,
+            'index_reduction': shared / len(self.chunk_ids) if len(self.chunk_ids) else 0.0,
+            'index_memory_saved_mb': shared * bytes_per_vector(self.index, self.index_params) / (1024 * 1024)
+        }
+    
     def _generate_file_id(self, file_path: str) -> str:
         """Generate a unique ID for a file based on content and timestamp."""
         # Read the first 8KB of the file for the hash
@@ -839,6 +2210,7 @@ class DocumentProcessor:
         time_component = str(datetime.now().timestamp()).encode()
         return hashlib.md5(content + time_component).hexdigest()
     
+    @reads_state
     def is_db_empty(self) -> bool:
         """Check if the vector database is completely empty."""
         return (
@@ -854,32 +2226,43 @@ class DocumentProcessor:
         Returns:
             success: Whether the clearing operation was successful
         """
+        with self._writing():
+            cleared = self._clear_database()
+        if cleared:
+            self._notify_change('cleared', None, None)
+        return cleared
+    
+    def _clear_database(self) -> bool:
         try:
             print("Clearing vector database...")
             
             # Clear in-memory data
-            self.documents = []
+            self.documents.clear()
             self.metadata = {}
+            self.catalog.rebuild(self.metadata)
             
             # Reset index
-            self.index = faiss.IndexFlatL2(self.embedding_dimensions)
+            self.index_params = default_params('flat', 0)
+            self.index = self._new_index()
+            self.vectors = np.zeros((0, self.embedding_dimensions), dtype=np.float32)
+            self.chunk_ids = np.zeros(0, dtype=np.int64)
+            self.canonical_ids = np.zeros(0, dtype=np.int64)
+            self._dedup_cache = None
+            self.lexical_features = np.zeros((0, NUM_FEATURES), dtype=np.int32)
+            self.lexical_index = LexicalIndex()
+            self.pending_ids = set()
             
-            # Clear files from disk
-            vector_db_files = [
-                "documents.json",
-                "metadata.json",
-                "manual_index.faiss"
-            ]
+            # Commit an empty snapshot first: it supersedes the previous snapshot and
+            # the journal in one step, so a crash can't bring back part of the data
+            self._save_state()
             
-            for filename in vector_db_files:
+            # Leftovers that aren't part of a snapshot
+            for filename in ["documents.json", "documents.json.migrated", "pending_ingests.json"]:
                 file_path = os.path.join(VECTOR_DB_PATH, filename)
                 if os.path.exists(file_path):
                     os.remove(file_path)
                     print(f"Deleted {filename}")
             
-            # Save empty state
-            self._save_state()
-            
             print("Database cleared successfully")
             return True
             
@@ -887,6 +2270,7 @@ class DocumentProcessor:
             print(f"Error clearing database: {str(e)}")
             return False
     
+    @reads_state
     def get_database_stats(self) -> Dict:
         """
         Get current statistics about the database.
@@ -895,18 +2279,36 @@ class DocumentProcessor:
             Dict containing database statistics
         """
         # Count documents by language
-        language_counts = {}
-        for doc in self.documents:
-            lang = doc.metadata.get('language', 'en')
-            language_counts[lang] = language_counts.get(lang, 0) + 1
+        language_counts = self.documents.count_by('language', 'en')
         
         return {
             'total_documents': len(self.documents),
             'total_manuals': len(self.metadata),
             'index_size': self.index.ntotal,
+            'pending_embeddings': len(self.pending_ids),
+            'index_type': self.index_params.get('type', 'flat'),
+            'index_params': self.index_params,
+            'vector_storage': self._vector_storage_stats(),
+            'deduplication': self._dedup_stats(),
             'documents_by_language': language_counts,
             'embedding_model': AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
             'embedding_dimensions': self.embedding_dimensions,
+            'embedding_cache': self.embeddings.get_cache_stats(),
+            'query_embedding_cache': self.embeddings.get_query_cache_stats(),
+            'catalog': self.catalog.get_stats(),
+            'chunk_store': self.documents.get_stats(),
+            'journal': {
+                'entries': self.journal.num_entries,
+                'bytes': self.journal.size_bytes(),
+                'snapshot': os.path.relpath(self._snapshot_dir, VECTOR_DB_PATH)
+            },
+            'shared': {
+                'enabled': self.shared.enabled,
+                'pid': os.getpid(),
+                'generation': self._generation,
+                'index_mapped': self.index is self._mapped_index,
+                'maintenance': self.shared.maintaining
+            },
             'manuals': [{
                 'file_id': file_id,
                 'filename': data['filename'],
@@ -918,6 +2320,7 @@ class DocumentProcessor:
             } for file_id, data in self.metadata.items()]
         }
     
+    @reads_state
     def debug_database_contents(self, query: str = None) -> Dict:
         """
         Debug method to inspect database contents and search behavior.
@@ -976,30 +2379,3 @@ class DocumentProcessor:
             }
         
         return debug_info
-    
-    def _looks_like_english(self, text: str) -> float:
-        """
-        Returns a score indicating how likely the text is to be proper English.
-        Higher score means more likely to be English.
-        """
-        # Common English words that should appear in proper text
-        common_words = {'the', 'be', 'to', 'of', 'and', 'a', 'in', 'that', 'have', 'i', 'it', 'for', 'not', 'on', 'with', 'he', 'as', 'you', 'do', 'at'}
-        
-        # Convert to lowercase and split into words
-        words = text.lower().split()
-        
-        if not words:
-            return 0.0
-        
-        # Count common English words
-        common_word_count = sum(1 for word in words if word in common_words)
-        
-        # Count words that look like proper words (at least 2 chars, mostly letters)
-        proper_word_count = sum(1 for word in words if len(word) >= 2 and sum(c.isalpha() for c in word) / len(word) > 0.7)
-        
-        # Calculate scores
-        common_word_score = common_word_count / len(words)
-        proper_word_score = proper_word_count / len(words)
-        
-        # Combine scores (weighted average)
-        return (common_word_score * 0.6) + (proper_word_score * 0.4) 
\ No newline at end of file
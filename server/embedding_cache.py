@@ -0,0 +1,447 @@
+import os
+import sys
+import atexit
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from shared_state import SharedState
+
+
+class EmbeddingCache:
+    """
+    Content-addressed, disk-backed cache of embedding vectors.
+
+    Vectors live in a single memory-mapped float32 file (vectors.f32) and are
+    addressed through a compact hash index (index.npy) mapping a 16-byte key
+    to a row. The key covers the embedding deployment and the normalized text,
+    so the same chunk is never paid for twice for the same model.
+
+    Several processes (server workers, bulk_ingest) can share one cache
+    directory. Rows are handed out and vectors written under an exclusive file
+    lock (SharedState.lock on the cache directory), and every entry added or
+    evicted is appended to index.log. Before reading or allocating, a process
+    replays the log records it hasn't seen. flush() folds the log into
+    index.npy and bumps the directory's generation, which makes the other
+    processes reload it.
+    """
+
+    INDEX_DTYPE = np.dtype([('key', 'S16'), ('row', '<i8'), ('last_used', '<i8')])
+    # index.log records beyond this are folded into index.npy
+    LOG_CHECKPOINT_RECORDS = 4096
+
+    def __init__(self, cache_dir: str, dimensions: int = 1536, max_size_mb: int = 1024):
+        self.cache_dir = cache_dir
+        self.dimensions = dimensions
+        self.row_bytes = dimensions * 4
+        self.max_entries = max(1, (max_size_mb * 1024 * 1024) // self.row_bytes)
+
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.index_path = os.path.join(cache_dir, "index.npy")
+        self.log_path = os.path.join(cache_dir, "index.log")
+
+        self._lock = threading.RLock()
+        self.shared = SharedState(cache_dir)
+        self._rows: Dict[bytes, int] = {}
+        self._keys: Dict[int, bytes] = {}
+        self._last_used = np.zeros(0, dtype=np.int64)
+        self._free = set()
+        self._dirty = False
+        self._vectors = None
+        self._generation = None
+        self._log_offset = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._lock, self.shared.lock():
+            self._load()
+        if self._rows:
+            print(f"🗃️  Embedding cache loaded: {len(self._rows)} vectors from {self.cache_dir}")
+        # Query embeddings are stored without an immediate flush; persist them on shutdown
+        atexit.register(self.flush)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize text so cosmetic whitespace/Unicode differences share a cache entry."""
+        return ' '.join(unicodedata.normalize('NFKC', text).split())
+
+    @classmethod
+    def make_key(cls, deployment: str, text: str) -> bytes:
+        """Cache key for a (deployment, normalized text) pair."""
+        payload = f"{deployment}\x00{cls.normalize(text)}".encode('utf-8')
+        return hashlib.blake2b(payload, digest_size=16).digest()
+
+    @staticmethod
+    def _now() -> int:
+        """LRU timestamp (milliseconds), comparable between processes."""
+        return int(time.time() * 1000)
+
+    def _file_rows(self) -> int:
+        if not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // self.row_bytes
+
+    def _load(self):
+        """Load the hash index, map the vector file and replay the log (caller holds the file lock)."""
+        self._generation = self.shared.generation()
+        capacity = self._file_rows()
+
+        entries = np.zeros(0, dtype=self.INDEX_DTYPE)
+        if os.path.exists(self.index_path) and capacity:
+            try:
+                entries = np.load(self.index_path)
+            except Exception as e:
+                print(f"⚠️  Embedding cache index unreadable, starting empty: {str(e)}")
+
+        self._vectors = None
+        self._last_used = np.zeros(0, dtype=np.int64)
+        self._free = set()
+        self._map(capacity)
+        # Rows beyond the mapped file can't be trusted (e.g. crash mid-grow)
+        entries = entries[entries['row'] < capacity]
+        self._rows = dict(zip(self._key_bytes(entries), entries['row'].tolist()))
+        self._keys = {row: key for key, row in self._rows.items()}
+        self._last_used[entries['row']] = entries['last_used']
+        self._free.difference_update(self._keys)
+        self._log_offset = 0
+        self._replay()
+
+    @staticmethod
+    def _key_bytes(entries: np.ndarray) -> List[bytes]:
+        """Keys of index entries; read as raw bytes because 'S16' drops a digest's trailing NULs."""
+        return entries['key'].view('V16').tolist()
+
+    def _sync(self):
+        """Catch up with entries other processes added or evicted (caller holds the file lock)."""
+        if self.shared.generation() != self._generation:
+            self._load()
+            return
+        capacity = self._file_rows()
+        if capacity > self._capacity():
+            self._map(capacity)
+        self._replay()
+
+    def _replay(self):
+        """Apply index.log records past this process's offset."""
+        if not os.path.exists(self.log_path):
+            return
+        count = (os.path.getsize(self.log_path) - self._log_offset) // self.INDEX_DTYPE.itemsize
+        if count <= 0:
+            return
+        records = np.fromfile(self.log_path, dtype=self.INDEX_DTYPE, count=count, offset=self._log_offset)
+        capacity = self._capacity()
+        for key, row, last_used in zip(self._key_bytes(records), records['row'].tolist(), records['last_used'].tolist()):
+            self._drop(key)
+            if 0 <= row < capacity:
+                self._drop(self._keys.get(row))
+                self._rows[key] = row
+                self._keys[row] = key
+                self._free.discard(row)
+                self._last_used[row] = max(int(self._last_used[row]), last_used)
+        self._log_offset += count * self.INDEX_DTYPE.itemsize
+
+    def _drop(self, key: Optional[bytes]):
+        """Forget an entry and free its row."""
+        row = self._rows.pop(key, None) if key is not None else None
+        if row is not None:
+            del self._keys[row]
+            self._free.add(row)
+
+    def _append_log(self, records: List[Tuple[bytes, int, int]]):
+        """Publish added (row >= 0) and evicted (row -1) entries to the other processes."""
+        if not records:
+            return
+        data = np.array(records, dtype=self.INDEX_DTYPE).tobytes()
+        with open(self.log_path, 'ab') as f:
+            end = os.fstat(f.fileno()).st_size
+            # Drop a record torn by a crash so the log stays aligned
+            whole = end - end % self.INDEX_DTYPE.itemsize
+            if whole != end:
+                f.truncate(whole)
+            f.write(data)
+        self._log_offset = whole + len(data)
+
+    def _map(self, capacity: int):
+        """(Re)map the vector file with at least the given row capacity (the file never shrinks here)."""
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+
+        with open(self.vectors_path, 'ab') as f:
+            if os.fstat(f.fileno()).st_size < capacity * self.row_bytes:
+                f.truncate(capacity * self.row_bytes)
+        capacity = self._file_rows()
+
+        if capacity:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(capacity, self.dimensions))
+
+        old_capacity = len(self._last_used)
+        last_used = np.zeros(capacity, dtype=np.int64)
+        n = min(capacity, old_capacity)
+        last_used[:n] = self._last_used[:n]
+        self._last_used = last_used
+        self._free.update(range(old_capacity, capacity))
+
+    def _capacity(self) -> int:
+        return len(self._last_used)
+
+    def _allocate_rows(self, count: int, records: List) -> List[int]:
+        """Take free rows, evicting (recorded in records) or growing the file as needed."""
+        overflow = len(self._rows) + count - self.max_entries
+        if overflow > 0:
+            self._evict(overflow, records)
+
+        if len(self._free) < count:
+            old_capacity = self._capacity()
+            new_capacity = max(old_capacity * 2, old_capacity + count - len(self._free), 1024)
+            new_capacity = min(new_capacity, max(self.max_entries, old_capacity + count))
+            self._map(new_capacity)
+
+        return sorted(self._free)[:count]
+
+    def _evict(self, count: int, records: List):
+        """Drop the least recently used entries."""
+        if not self._rows or count <= 0:
+            return
+        keys = list(self._rows.keys())
+        rows = np.fromiter(self._rows.values(), dtype=np.int64, count=len(keys))
+        victims = np.argsort(self._last_used[rows], kind='stable')[:count]
+        for i in victims.tolist():
+            self._drop(keys[i])
+            records.append((keys[i], -1, 0))
+        self.evictions += len(victims)
+        self._dirty = True
+
+    def get_many(self, deployment: str, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Look up embeddings for texts.
+
+        Returns:
+            (vectors, missing): a (len(texts), dimensions) array with cached rows
+            filled in, and the positions of texts that were not cached
+        """
+        result = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        missing = []
+        # Shared lock: no other process can hand a row over to another text while it's copied
+        with self._lock, self.shared.lock(exclusive=False):
+            self._sync()
+            now = self._now()
+            for i, text in enumerate(texts):
+                row = self._rows.get(self.make_key(deployment, text))
+                if row is None:
+                    missing.append(i)
+                    continue
+                result[i] = self._vectors[row]
+                self._last_used[row] = now
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            if len(missing) < len(texts):
+                self._dirty = True
+        return result, missing
+
+    def put_many(self, deployment: str, texts: List[str], vectors: np.ndarray, flush: bool = True):
+        """Store embeddings for texts, overwriting existing entries."""
+        if not texts:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, self.shared.lock():
+            self._sync()
+            now = self._now()
+            records = []
+            keys = [self.make_key(deployment, text) for text in texts]
+            new_keys = list(dict.fromkeys(key for key in keys if key not in self._rows))
+            for key, row in zip(new_keys, self._allocate_rows(len(new_keys), records)):
+                self._rows[key] = row
+                self._keys[row] = key
+                self._free.discard(row)
+            for key, vector in zip(keys, vectors):
+                row = self._rows.get(key)
+                # The entry may have been evicted to make room for a later key in this same batch
+                if row is None:
+                    continue
+                self._vectors[row] = vector
+                self._last_used[row] = now
+            # Vectors are in the shared mapping before the log makes their keys visible
+            records.extend((key, self._rows[key], now) for key in new_keys if key in self._rows)
+            self._append_log(records)
+            self._dirty = True
+            if flush or self._log_offset >= self.LOG_CHECKPOINT_RECORDS * self.INDEX_DTYPE.itemsize:
+                self._checkpoint()
+
+    def flush(self):
+        """Persist the vector file and fold the log into the hash index."""
+        with self._lock, self.shared.lock():
+            self._sync()
+            self._checkpoint()
+
+    def _checkpoint(self):
+        """Write index.npy from this process's (caught up) view and empty the log (caller holds the file lock)."""
+        if not self._dirty and not self._log_offset:
+            return
+        if self._vectors is not None:
+            self._vectors.flush()
+        entries = np.zeros(len(self._rows), dtype=self.INDEX_DTYPE)
+        entries['key'] = list(self._rows.keys())
+        entries['row'] = list(self._rows.values())
+        entries['last_used'] = self._last_used[entries['row']]
+        temp_path = self.index_path[:-len(".npy")] + ".tmp.npy"
+        np.save(temp_path, entries)
+        os.replace(temp_path, self.index_path)
+        with open(self.log_path, 'wb'):
+            pass
+        self._log_offset = 0
+        self._generation = self.shared.bump()
+        self._dirty = False
+
+    def compact(self) -> Dict:
+        """
+        Rewrite the vector file so it holds only live entries, most recently used first.
+
+        Returns:
+            Dict with the number of entries kept and bytes reclaimed
+        """
+        with self._lock, self.shared.lock():
+            self._sync()
+            before = self._capacity() * self.row_bytes
+            keys = list(self._rows.keys())
+            rows = np.fromiter(self._rows.values(), dtype=np.int64, count=len(keys))
+            order = np.argsort(-self._last_used[rows], kind='stable')
+
+            temp_path = self.vectors_path + ".tmp"
+            with open(temp_path, 'wb') as f:
+                # Copy in slices so compaction never holds the whole cache in RAM
+                for start in range(0, len(order), 4096):
+                    f.write(np.ascontiguousarray(self._vectors[rows[order[start:start + 4096]]]).tobytes())
+            last_used = self._last_used[rows[order]]
+
+            self._vectors = None
+            os.replace(temp_path, self.vectors_path)
+            self._rows = {keys[i]: new_row for new_row, i in enumerate(order.tolist())}
+            self._keys = {row: key for key, row in self._rows.items()}
+            self._last_used = np.zeros(0, dtype=np.int64)
+            self._map(len(keys))
+            self._last_used = last_used
+            self._free = set()
+            self._dirty = True
+            self._checkpoint()
+
+            after = self._capacity() * self.row_bytes
+            print(f"🗜️  Embedding cache compacted: {len(keys)} entries kept, {before - after} bytes reclaimed")
+            return {'entries': len(keys), 'bytes_reclaimed': before - after}
+
+    def clear(self):
+        """Remove every cached embedding."""
+        with self._lock, self.shared.lock():
+            self._vectors = None
+            with open(self.vectors_path, 'wb'):
+                pass
+            self._rows = {}
+            self._keys = {}
+            self._free = set()
+            self._last_used = np.zeros(0, dtype=np.int64)
+            self._map(0)
+            self._dirty = True
+            self._checkpoint()
+
+    def get_stats(self) -> Dict:
+        """Hit/miss counters and size information."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._rows),
+                'max_entries': self.max_entries,
+                'capacity': self._capacity(),
+                'size_bytes': self._capacity() * self.row_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+
+
+class QueryEmbeddingLRU:
+    """
+    Bounded in-memory LRU of query embeddings, keyed by (deployment, normalized text).
+
+    Sits in front of the disk cache so repeated questions skip both the Azure
+    round trip and the disk lookup.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(0, max_entries)
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, deployment: str, text: str) -> Optional[np.ndarray]:
+        """Return the cached embedding and mark it most recently used, or None."""
+        key = (deployment, EmbeddingCache.normalize(text))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, deployment: str, text: str, vector: np.ndarray):
+        """Store an embedding, evicting the least recently used entries past the bound."""
+        if not self.max_entries:
+            return
+        vector = np.array(vector, dtype=np.float32)
+        # Shared between requests, so make sure no caller can modify it in place
+        vector.setflags(write=False)
+        key = (deployment, EmbeddingCache.normalize(text))
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        """Hit/miss counters and occupancy, for sizing QUERY_CACHE_SIZE."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+
+if __name__ == '__main__':
+    # Maintenance commands; run while the server is stopped:
+    #   python embedding_cache.py stats
+    #   python embedding_cache.py compact
+    from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_MB
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    cache = EmbeddingCache(EMBEDDING_CACHE_PATH, max_size_mb=EMBEDDING_CACHE_MAX_MB)
+    if command == 'compact':
+        print(json.dumps(cache.compact(), indent=2))
+    elif command == 'stats':
+        print(json.dumps(cache.get_stats(), indent=2))
+    else:
+        print(f"Unknown command: {command}. Use 'stats' or 'compact'.")
+        sys.exit(1)
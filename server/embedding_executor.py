@@ -0,0 +1,176 @@
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for quota accounting (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Extract the server-requested back-off from a rate limit error, if any."""
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000.0
+        if headers.get('Retry-After') or headers.get('retry-after'):
+            return float(headers.get('Retry-After') or headers.get('retry-after'))
+    except (TypeError, ValueError):
+        pass
+
+    # Azure also states the delay in the message: "Please retry after 7 seconds."
+    match = re.search(r'retry after (\d+(?:\.\d+)?) second', str(error), re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        self.rate = per_minute / 60.0
+        # Azure enforces quotas over short windows, so only allow a few seconds of burst
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0):
+        """Block until `amount` tokens are available, then take them."""
+        if self.rate <= 0:
+            return
+        # Requests larger than the bucket wait for a full bucket and go into debt
+        needed = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self.tokens >= needed:
+                    self.tokens -= amount
+                    return
+                wait = max(self._paused_until - now, (needed - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (e.g. after a 429 with Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class EmbeddingExecutor:
+    """
+    Embed texts with a pool of workers under the deployment's RPM/TPM quota.
+
+    Batches are dispatched concurrently, every request (and every retry of it)
+    first takes one token from the request bucket and its estimated size from the
+    token bucket, and results are reassembled in input order.
+    """
+
+    def __init__(self, embeddings, workers: int = 4, batch_size: int = 75,
+                 requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.embeddings = embeddings
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+
+    def pause(self, seconds: float):
+        """Back off every worker, not just the one that was throttled."""
+        print(f"      ⏸️  Pausing embedding requests for {seconds:.1f}s")
+        self.request_bucket.pause(seconds)
+        self.token_bucket.pause(seconds)
+
+    def _request(self, texts: List[str]) -> List[List[float]]:
+        """Send one rate-limited embedding request; every retry pays for its quota again."""
+        tokens = sum(estimate_tokens(text) for text in texts)
+
+        def acquire():
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(tokens)
+
+        response = self.embeddings._make_embedding_request(texts, on_rate_limit=self.pause, acquire=acquire)
+        # The API may return items out of order; 'index' restores the input order
+        data = sorted(response['data'], key=lambda item: item.get('index', 0))
+        return [item['embedding'] for item in data]
+
+    def _embed_batch(self, batch: List[str]) -> Tuple[List[List[float]], List[int]]:
+        """Embed one batch, splitting it once in half if the whole batch fails."""
+        try:
+            return self._request(batch), []
+        except Exception as e:
+            if len(batch) == 1:
+                print(f"   ❌ Error processing batch: {str(e)}")
+                return [None], [0]
+            print(f"   📉 Batch of {len(batch)} failed ({str(e)}), retrying as two halves")
+
+        embeddings, failed = [], []
+        half = len(batch) // 2
+        for offset, part in ((0, batch[:half]), (half, batch[half:])):
+            try:
+                embeddings.extend(self._request(part))
+            except Exception as e:
+                print(f"   ❌ Error processing batch: {str(e)}")
+                embeddings.extend([None] * len(part))
+                failed.extend(range(offset, offset + len(part)))
+        return embeddings, failed
+
+    @staticmethod
+    def _succeeded_runs(size: int, failed: set) -> List[Tuple[int, int]]:
+        """[start, end) ranges of a batch's positions that are not in failed."""
+        runs, start = [], None
+        for j in range(size + 1):
+            if j < size and j not in failed:
+                if start is None:
+                    start = j
+            elif start is not None:
+                runs.append((start, j))
+                start = None
+        return runs
+
+    def run(self, texts: List[str], on_batch: Optional[Callable[[int, np.ndarray], None]] = None) -> Tuple[np.ndarray, List[int]]:
+        """
+        Embed texts concurrently.
+
+        Args:
+            texts: Texts to embed
+            on_batch: Called with (offset, embeddings) for every run of successfully
+                embedded texts, in input order, as soon as its batch is reassembled
+
+        Returns:
+            (embeddings, failed): the embedding matrix in input order and the
+            positions of texts that could not be embedded (left as zero rows)
+        """
+        dimensions = self.embeddings.dimensions
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        print(f"🧠 Generating embeddings for {len(texts)} text chunks "
+              f"({len(batches)} batches, {min(self.workers, len(batches))} workers)...")
+
+        start_time = time.time()
+        embeddings = np.zeros((len(texts), dimensions), dtype=np.float32)
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # map() yields in submission order, so results land back in input order
+            for batch_num, (batch_embeddings, batch_failed) in enumerate(pool.map(self._embed_batch, batches)):
+                offset = batch_num * self.batch_size
+                failed_set = set(batch_failed)
+                for j, vector in enumerate(batch_embeddings):
+                    if j not in failed_set:
+                        embeddings[offset + j] = vector
+                failed.extend(offset + j for j in batch_failed)
+                if on_batch:
+                    # A split batch may have one good half; hand over every run of successes
+                    for start, end in self._succeeded_runs(len(batch_embeddings), failed_set):
+                        on_batch(offset + start, embeddings[offset + start:offset + end])
+
+        elapsed = time.time() - start_time
+        rate = len(texts) / elapsed if elapsed > 0 else 0.0
+        print(f"✅ Generated {len(texts) - len(failed)} embeddings in {elapsed:.2f}s ({rate:.1f} chunks/sec)")
+        if failed:
+            print(f"⚠️  {len(failed)} chunks could not be embedded")
+        return embeddings, failed
@@ -0,0 +1,304 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from shared_state import SharedState
+
+# Job states; a job's 'stage' further says where a running ingestion is
+QUEUED, RUNNING, COMPLETED, FAILED = 'queued', 'running', 'completed', 'failed'
+ACTIVE = (QUEUED, RUNNING)
+
+# Why reserve() turned an upload away
+DUPLICATE, QUEUE_FULL = 'duplicate', 'queue_full'
+
+# Progress reports arrive per page; write them to the database at most this often
+PROGRESS_WRITE_INTERVAL = 0.5
+
+
+class IngestJobs:
+    """
+    Runs manual ingestions on a small background thread pool and tracks their progress.
+
+    An upload reserves a job with reserve() (which also rejects a file another
+    upload is still processing), saves the file and hands the work to start();
+    the HTTP request doesn't wait for parsing and embedding. At most
+    max_concurrent ingestions run at a time in each server process (the rest
+    wait in the queue, up to max_queued), so uploads can't take every CPU and
+    embedding request away from chat traffic.
+
+    Job records live in an SQLite database shared by every server worker, so a
+    poll can land on any of them. The process running a job holds a lock on it
+    (SharedState.hold); a queued or running job whose process died is reported
+    as failed. Finished jobs are kept (the newest `history` of them) so pollers
+    can read the outcome.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            state TEXT NOT NULL,
+            owner TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            record TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_by_filename ON jobs (filename, state);
+        CREATE INDEX IF NOT EXISTS jobs_by_created ON jobs (created_at);
+    """
+
+    def __init__(self, path: str, shared: Optional[SharedState] = None, max_concurrent: int = 1,
+                 max_queued: int = 20, history: int = 100):
+        self.path = path
+        self.shared = shared or SharedState(os.path.dirname(os.path.abspath(path)), enabled=False)
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max_queued
+        self.history = history
+        # Identifies this process's jobs in the database
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix='ingest')
+        # This process's unfinished jobs, with progress not yet written to the database
+        self._jobs: Dict[str, Dict] = {}
+        self._written: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._connections = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection (WAL lets polls read while a job writes)."""
+        conn = getattr(self._connections, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._connections.conn = conn
+        return conn
+
+    @staticmethod
+    def _lock_name(job_id: str) -> str:
+        return f"job-{job_id}"
+
+    def reserve(self, filename: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        Record a queued job for an upload before its file is saved.
+
+        Returns:
+            (job, None), or (None, DUPLICATE) when a live job in any server process
+            is still processing a file of that name, or (None, QUEUE_FULL) when
+            this process already has max_queued jobs waiting
+        """
+        with self._lock:
+            if sum(1 for job in self._jobs.values() if job['state'] == QUEUED) >= self.max_queued:
+                return None, QUEUE_FULL
+
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'filename': filename,
+            'state': QUEUED,
+            'stage': QUEUED,
+            'pages_total': None,
+            'pages_processed': 0,
+            'chunks_parsed': 0,
+            'chunks_total': None,
+            'chunks_embedded': 0,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
+        # Live before the row is visible, so no process (this one included) takes it for a dead job
+        self.shared.hold(self._lock_name(job['job_id']))
+        with self._lock:
+            self._jobs[job['job_id']] = job
+        conn = self._connection()
+        reserved = False
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                active = conn.execute(
+                    "SELECT job_id, owner, record FROM jobs WHERE filename = ? AND state IN (?, ?)",
+                    (filename, *ACTIVE)
+                ).fetchall()
+                if any(self._is_live(job_id, owner) for job_id, owner, _ in active):
+                    conn.execute("ROLLBACK")
+                    return None, DUPLICATE
+                for _, _, record in active:
+                    self._write_interrupted(conn, json.loads(record))
+                conn.execute(
+                    "INSERT INTO jobs (job_id, filename, state, owner, created_at, record) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job['job_id'], filename, QUEUED, self.owner, job['created_at'], json.dumps(job))
+                )
+                self._prune(conn)
+                conn.execute("COMMIT")
+                reserved = True
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            if not reserved:
+                with self._lock:
+                    self._jobs.pop(job['job_id'], None)
+                self.shared.release(self._lock_name(job['job_id']))
+        return self.get(job['job_id']), None
+
+    def start(self, job_id: str, run: Callable[[Callable], Dict]):
+        """
+        Run a reserved job in the background. `run(progress)` does the work,
+        reporting through progress(stage, **counts), and returns the job's result.
+        """
+        self._executor.submit(self._run, job_id, run)
+
+    def cancel(self, job_id: str, error: str):
+        """Fail a reserved job that could not be started (e.g. its file could not be saved)."""
+        self._finish(job_id, state=FAILED, error=error, finished_at=time.time())
+
+    def _run(self, job_id: str, run: Callable[[Callable], Dict]):
+        self._update(job_id, state=RUNNING, stage='starting', started_at=time.time())
+        try:
+            result = run(lambda stage, **counts: self._update(job_id, stage=stage, **counts))
+            self._finish(job_id, state=COMPLETED, stage='done', result=result, finished_at=time.time())
+        except Exception as e:
+            print(f"❌ Ingest job {job_id} failed: {str(e)}")
+            print(traceback.format_exc())
+            self._finish(job_id, state=FAILED, error=str(e), finished_at=time.time())
+
+    def _update(self, job_id: str, **fields):
+        """Update one of this process's jobs; progress is written to the database at most every PROGRESS_WRITE_INTERVAL."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            changed_stage = fields.get('state', job['state']) != job['state'] or fields.get('stage', job['stage']) != job['stage']
+            job.update(fields)
+            now = time.time()
+            if not changed_stage and now - self._written.get(job_id, 0.0) < PROGRESS_WRITE_INTERVAL:
+                return
+            self._written[job_id] = now
+            job = dict(job)
+        self._write(job)
+
+    def _finish(self, job_id: str, **fields):
+        """Write a job's final state and let go of it."""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            self._written.pop(job_id, None)
+        if job is None:
+            return
+        job.update(fields)
+        try:
+            self._write(job)
+        finally:
+            self.shared.release(self._lock_name(job_id))
+
+    def _write(self, job: Dict):
+        try:
+            self._connection().execute(
+                "UPDATE jobs SET state = ?, record = ? WHERE job_id = ?",
+                (job['state'], json.dumps(job, default=str), job['job_id'])
+            )
+        except Exception as e:
+            print(f"⚠️  Could not record progress of ingest job {job['job_id']}: {str(e)}")
+
+    def _write_interrupted(self, conn: sqlite3.Connection, job: Dict) -> Dict:
+        """Mark a job whose process died as failed (caller holds the write transaction)."""
+        job.update(state=FAILED, finished_at=time.time(),
+                   error='Processing was interrupted because the server process stopped; '
+                         'the upload is resumed in the background if it was already being ingested')
+        conn.execute("UPDATE jobs SET state = ?, record = ? WHERE job_id = ?",
+                     (FAILED, json.dumps(job, default=str), job['job_id']))
+        return job
+
+    def _is_live(self, job_id: str, owner: str) -> bool:
+        """Whether the process that reserved an unfinished job is still working on it."""
+        if owner == self.owner:
+            with self._lock:
+                return job_id in self._jobs
+        return self.shared.is_held(self._lock_name(job_id))
+
+    def _prune(self, conn: sqlite3.Connection):
+        """Forget the oldest finished jobs beyond the history limit (caller holds the write transaction)."""
+        conn.execute(
+            "DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs WHERE state IN (?, ?) "
+            "ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (COMPLETED, FAILED, self.history)
+        )
+
+    def _current(self, job_id: str, owner: str, record: str) -> Dict:
+        """A job as it stands: this process's live copy, or the stored record checked for a dead owner."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        job = json.loads(record)
+        if job['state'] not in ACTIVE or self._is_live(job_id, owner):
+            return job
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # The owner writes its final state before letting go of the job, so read it again
+            job = json.loads(conn.execute("SELECT record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()[0])
+            if job['state'] in ACTIVE:
+                job = self._write_interrupted(conn, job)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Snapshot of a job with its queue position or progress estimate."""
+        conn = self._connection()
+        row = conn.execute("SELECT owner, record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        owner, record = row
+        job = self._current(job_id, owner, record)
+        if job['state'] == QUEUED:
+            # Each process works through its own queue
+            ahead = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE owner = ? AND state = ? AND created_at < ?",
+                (owner, QUEUED, job['created_at'])
+            ).fetchone()[0]
+            job['queue_position'] = ahead + 1
+        job.update(self._estimate(job))
+        return job
+
+    def list(self) -> List[Dict]:
+        """Recent jobs of every server process, newest first."""
+        rows = self._connection().execute(
+            "SELECT job_id FROM jobs ORDER BY created_at DESC LIMIT ?", (self.history,)
+        ).fetchall()
+        return [job for job in (self.get(job_id) for job_id, in rows) if job is not None]
+
+    @staticmethod
+    def _estimate(job: Dict) -> Dict:
+        """
+        Fraction done and seconds remaining for a running job.
+
+        Embedding dominates, so progress is chunks embedded out of the expected
+        total; until every page is parsed the total is
+        extrapolated from the chunks per page parsed so far.
+        """
+        if job['state'] == COMPLETED:
+            return {'progress': 1.0, 'eta_seconds': 0}
+        if job['state'] != RUNNING or not job['pages_total'] or not job['pages_processed']:
+            return {'progress': 0.0, 'eta_seconds': None}
+
+        pages_fraction = min(job['pages_processed'] / job['pages_total'], 1.0)
+        chunks_total = job['chunks_total']
+        if chunks_total is None:
+            chunks_total = job['chunks_parsed'] / pages_fraction
+        fraction = min(job['chunks_embedded'] / chunks_total, 1.0) if chunks_total else pages_fraction
+        if job['stage'] == 'indexing':
+            fraction = 1.0
+        elapsed = time.time() - job['started_at']
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0 else None
+        return {'progress': round(fraction, 3), 'eta_seconds': round(eta, 1) if eta is not None else None}
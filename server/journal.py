@@ -0,0 +1,107 @@
+import os
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+LOG_NAME = "journal.log"
+
+
+class Journal:
+    """
+    Append-only log of the changes made since the last snapshot.
+
+    Each entry is one JSON line in journal.log, numbered by a sequence that
+    keeps increasing across snapshots. Array payloads (vectors, chunk columns)
+    go to a segment file that is written and fsynced before the line, so the
+    line is the commit point: a crash mid-append leaves at most a torn last
+    line or an unreferenced segment, and recover() discards both.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.log_path = os.path.join(path, LOG_NAME)
+        self.seq = 0
+        self.num_entries = 0
+
+    def recover(self, after_seq: int, repair: bool = True) -> List[Dict]:
+        """
+        Read the committed entries and return those newer than after_seq (the
+        last sequence the snapshot includes), oldest first.
+
+        With repair=False (another process may be writing) a torn tail and
+        unreferenced segments are left alone rather than removed.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        entries = []
+        if os.path.exists(self.log_path):
+            valid_bytes = 0
+            with open(self.log_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        break
+                    valid_bytes += len(line)
+            if repair and valid_bytes < os.path.getsize(self.log_path):
+                print("⚠️  Journal ends with a torn entry, truncating it")
+                with open(self.log_path, 'r+b') as f:
+                    f.truncate(valid_bytes)
+
+        # Segments whose line was never written belong to appends that did not commit
+        referenced = {entry['segment'] for entry in entries if entry.get('segment')}
+        for name in os.listdir(self.path) if repair else []:
+            if name != LOG_NAME and name not in referenced:
+                os.remove(os.path.join(self.path, name))
+
+        self.seq = max([after_seq] + [entry['seq'] for entry in entries])
+        self.num_entries = len(entries)
+        return [entry for entry in entries if entry['seq'] > after_seq]
+
+    def append(self, entry: Dict, arrays: Optional[Dict[str, np.ndarray]] = None) -> int:
+        """Durably record an entry (and its arrays); returns its sequence number."""
+        os.makedirs(self.path, exist_ok=True)
+        seq = self.seq + 1
+        entry = dict(entry, seq=seq)
+        if arrays:
+            segment = f"{seq:010d}.npz"
+            path = os.path.join(self.path, segment)
+            with open(path + ".tmp", 'wb') as f:
+                np.savez(f, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            entry['segment'] = segment
+
+        with open(self.log_path, 'ab') as f:
+            f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        self.seq = seq
+        self.num_entries += 1
+        return seq
+
+    def load_arrays(self, entry: Dict) -> Dict[str, np.ndarray]:
+        """Array payload of an entry (empty if it has none)."""
+        if not entry.get('segment'):
+            return {}
+        with np.load(os.path.join(self.path, entry['segment'])) as data:
+            return {name: data[name] for name in data.files}
+
+    def size_bytes(self) -> int:
+        if not os.path.isdir(self.path):
+            return 0
+        return sum(os.path.getsize(os.path.join(self.path, name)) for name in os.listdir(self.path))
+
+    def reset(self):
+        """Drop every entry once a snapshot includes them; sequence numbers keep counting."""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.log_path + ".tmp", 'wb'):
+            pass
+        os.replace(self.log_path + ".tmp", self.log_path)
+        for name in os.listdir(self.path):
+            if name != LOG_NAME:
+                os.remove(os.path.join(self.path, name))
+        self.num_entries = 0
@@ -0,0 +1,194 @@
+import os
+import re
+import math
+from collections import Counter, defaultdict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Letters and digits, so error codes ("dE", "4C") and model numbers ("WA91V3") stay whole tokens
+TOKEN_PATTERN = re.compile(r'[^\W_]+', re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric tokens of a text."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk text, keyed by stable chunk ID.
+
+    Postings per term are parallel (chunk_ids, term_frequencies) arrays kept in
+    chunk ID order. Chunk IDs are allocated in increasing order, so new chunks
+    are appended and removals preserve order, like DocumentProcessor.chunk_ids.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}
+        self.doc_ids = np.zeros(0, dtype=np.int64)
+        self.doc_lengths = np.zeros(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def copy(self) -> 'LexicalIndex':
+        """An index sharing this one's postings; add() and remove() on either leave the other as it was."""
+        index = LexicalIndex(self.k1, self.b)
+        index._postings = dict(self._postings)
+        index.doc_ids, index.doc_lengths = self.doc_ids, self.doc_lengths
+        return index
+
+    def add(self, chunk_ids: np.ndarray, texts: List[str]):
+        """Index new chunks (IDs must be larger than any already indexed)."""
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        new_postings = defaultdict(lambda: ([], []))
+        lengths = np.zeros(len(texts), dtype=np.int32)
+        for i, (chunk_id, text) in enumerate(zip(chunk_ids.tolist(), texts)):
+            tokens = tokenize(text)
+            lengths[i] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                ids, tfs = new_postings[term]
+                ids.append(chunk_id)
+                tfs.append(tf)
+
+        for term, (ids, tfs) in new_postings.items():
+            ids, tfs = np.array(ids, dtype=np.int64), np.array(tfs, dtype=np.int32)
+            if term in self._postings:
+                old_ids, old_tfs = self._postings[term]
+                ids, tfs = np.concatenate([old_ids, ids]), np.concatenate([old_tfs, tfs])
+            self._postings[term] = (ids, tfs)
+
+        self.doc_ids = np.concatenate([self.doc_ids, chunk_ids])
+        self.doc_lengths = np.concatenate([self.doc_lengths, lengths])
+
+    def remove(self, chunk_ids: np.ndarray, texts: List[str]):
+        """Drop chunks; their texts identify which postings need touching."""
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        terms = set()
+        for text in texts:
+            terms.update(tokenize(text))
+        for term in terms:
+            if term not in self._postings:
+                continue
+            ids, tfs = self._postings[term]
+            keep = ~np.isin(ids, chunk_ids)
+            if keep.any():
+                self._postings[term] = (ids[keep], tfs[keep])
+            else:
+                del self._postings[term]
+
+        keep = ~np.isin(self.doc_ids, chunk_ids)
+        self.doc_ids, self.doc_lengths = self.doc_ids[keep], self.doc_lengths[keep]
+
+    def search(self, query: str, k: int, allowed_ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 top-k for a query.
+
+        Args:
+            query: Query text
+            k: Number of chunks to return
+            allowed_ids: Optional sorted chunk IDs to restrict the search to
+
+        Returns:
+            (chunk_ids, scores): best matches first
+        """
+        num_docs = len(self.doc_ids)
+        if not num_docs or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        avg_length = max(float(self.doc_lengths.mean()), 1.0)
+
+        all_ids, all_scores = [], []
+        for term in set(tokenize(query)):
+            if term not in self._postings:
+                continue
+            ids, tfs = self._postings[term]
+            # IDF uses the term's global document frequency, even when the search is filtered
+            idf = math.log(1.0 + (num_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            if allowed_ids is not None:
+                mask = np.isin(ids, allowed_ids)
+                ids, tfs = ids[mask], tfs[mask]
+            if not len(ids):
+                continue
+            lengths = self.doc_lengths[np.searchsorted(self.doc_ids, ids)]
+            norm = self.k1 * (1.0 - self.b + self.b * lengths / avg_length)
+            all_ids.append(ids)
+            all_scores.append(idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+
+        if not all_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+        ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        if len(ids) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return ids[order], scores[order]
+
+    def save(self, path: str):
+        """Write the index as flat arrays (CSR layout), one .npy file each, into a directory."""
+        terms = sorted(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self._postings[term][0]) for term in terms])
+        ids = np.concatenate([self._postings[term][0] for term in terms]) if terms else np.zeros(0, dtype=np.int64)
+        tfs = np.concatenate([self._postings[term][1] for term in terms]) if terms else np.zeros(0, dtype=np.int32)
+
+        # Terms go into one UTF-8 buffer with offsets, like the chunk store's text: a fixed-width
+        # string array would pad every term to the longest one (a base64 blob, a long part number)
+        encoded = [term.encode('utf-8') for term in terms]
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        term_offsets[1:] = np.cumsum([len(term) for term in encoded])
+        term_bytes = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+        arrays = {'terms': term_bytes, 'term_offsets': term_offsets, 'offsets': offsets, 'ids': ids, 'tfs': tfs,
+                  'doc_ids': self.doc_ids, 'doc_lengths': self.doc_lengths, 'params': np.array([self.k1, self.b])}
+        os.makedirs(path, exist_ok=True)
+        for name, array in arrays.items():
+            # np.save appends .npy to names that lack it, so keep the suffix on the temp file
+            temp_path = os.path.join(path, f"{name}.tmp.npy")
+            np.save(temp_path, array)
+            os.replace(temp_path, os.path.join(path, f"{name}.npy"))
+
+    @classmethod
+    def load(cls, path: str) -> Optional['LexicalIndex']:
+        """
+        Read an index written by save(), or None if there is none.
+
+        Postings are memory-mapped: they are only ever replaced, never modified
+        in place, so processes loading the same files share them. An index saved
+        by older versions as path + '.npz' is read into memory instead.
+        """
+        if os.path.isdir(path):
+            names = ['terms', 'offsets', 'ids', 'tfs', 'doc_ids', 'doc_lengths', 'params']
+            # Indexes saved before terms were stored as UTF-8 have no term_offsets
+            if os.path.exists(os.path.join(path, "term_offsets.npy")):
+                names.append('term_offsets')
+            data = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in names}
+            return cls._from_arrays(data)
+        if os.path.exists(path + ".npz"):
+            with np.load(path + ".npz") as data:
+                return cls._from_arrays(data)
+        return None
+
+    @classmethod
+    def _from_arrays(cls, data) -> 'LexicalIndex':
+        k1, b = data['params'].tolist()
+        index = cls(k1, b)
+        offsets, ids, tfs = data['offsets'], data['ids'], data['tfs']
+        for i, term in enumerate(cls._terms(data)):
+            index._postings[term] = (ids[offsets[i]:offsets[i + 1]], tfs[offsets[i]:offsets[i + 1]])
+        index.doc_ids = data['doc_ids']
+        index.doc_lengths = data['doc_lengths']
+        return index
+
+    @staticmethod
+    def _terms(data) -> List[str]:
+        """Terms in saved order, from the UTF-8 buffer or the string array older versions wrote."""
+        if 'term_offsets' not in data:
+            return data['terms'].tolist()
+        term_bytes = np.asarray(data['terms']).tobytes()
+        term_offsets = data['term_offsets'].tolist()
+        return [term_bytes[start:end].decode('utf-8') for start, end in zip(term_offsets[:-1], term_offsets[1:])]
@@ -0,0 +1,331 @@
+import os
+import sys
+import time
+import queue
+import pickle
+import signal
+import threading
+import subprocess
+import unicodedata
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pypdf
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# Pages handed to a worker at a time; each task opens the PDF once
+PAGES_PER_TASK = 8
+# Tasks queued per worker: how far extraction may run ahead of the consumer
+TASKS_PER_WORKER = 2
+
+# Character replacements applied in one translate() pass after the category filter
+REPLACEMENTS = str.maketrans({
+    '\x00': '',      # null byte
+    '\ufffd': '',    # Unicode replacement character
+    '\u0013': '',    # DC3 control character
+    '\u0001': ' ',   # Start of Heading control character - replace with space
+    '\u000e': '',    # Shift Out
+    '\u000f': '',    # Shift In
+    '\u0014': '',    # DC4
+    '\u0015': '',    # NAK
+    '\u0006': '',    # ACK
+    '\r': '\n'       # Convert carriage returns to newlines
+})
+COMMON_WORDS = {'the', 'be', 'to', 'of', 'and', 'a', 'in', 'that', 'have', 'i', 'it', 'for', 'not', 'on', 'with', 'he', 'as', 'you', 'do', 'at'}
+
+_pool = None
+_pool_lock = threading.Lock()
+_splitters = {}
+
+
+def fix_shifted_text(text: str) -> str:
+    """Fix text that has been shifted by 1 in the ASCII table."""
+    result = []
+    for char in text:
+        ascii_val = ord(char)
+        # Skip non-ASCII characters and spaces
+        if ascii_val < 32 or ascii_val > 126:
+            result.append(char)
+        elif char.isalpha():
+            # Shift letters back by 1, wrapping A->Z and a->z
+            if char == 'A':
+                result.append('Z')
+            elif char == 'a':
+                result.append('z')
+            else:
+                result.append(chr(ascii_val - 1))
+        elif ascii_val >= 33:
+            # For non-alphabetic characters, just shift back by 1 if in the printable range
+            result.append(chr(ascii_val - 1))
+        else:
+            result.append(char)
+    return ''.join(result)
+
+
+def looks_like_english(text: str) -> float:
+    """
+    Returns a score indicating how likely the text is to be proper English.
+    Higher score means more likely to be English.
+    """
+    words = text.lower().split()
+    if not words:
+        return 0.0
+
+    common_word_count = sum(1 for word in words if word in COMMON_WORDS)
+    # Words that look like proper words (at least 2 chars, mostly letters)
+    proper_word_count = sum(1 for word in words if len(word) >= 2 and sum(c.isalpha() for c in word) / len(word) > 0.7)
+
+    # Weighted average of the two ratios
+    return (common_word_count / len(words)) * 0.6 + (proper_word_count / len(words)) * 0.4
+
+
+def clean_page_text(page_text: str) -> str:
+    """Repair shifted text, normalize Unicode, strip control characters and collapse whitespace."""
+    try:
+        # First try to fix shifted text
+        if any(c.isalpha() for c in page_text):  # Only try if there are letters
+            sample = page_text[:100]  # Take a sample to check if it needs fixing
+            # If the fixed sample looks more like English, apply the fix
+            if looks_like_english(fix_shifted_text(sample)) > looks_like_english(sample):
+                page_text = fix_shifted_text(page_text)
+
+        page_text = unicodedata.normalize('NFKC', page_text)
+
+        # Remove non-printable characters
+        page_text = ''.join(char for char in page_text if unicodedata.category(char)[0] != 'C')
+
+        # Handle common encoding issues
+        page_text = page_text.encode('utf-8', errors='ignore').decode('utf-8')
+        page_text = page_text.translate(REPLACEMENTS)
+
+        # Clean up multiple spaces
+        page_text = ' '.join(page_text.split())
+
+    except Exception as e:
+        print(f"Warning: Error during text encoding cleanup: {str(e)}")
+
+    # Preserve important formatting
+    page_text = page_text.replace('\n\n', '[PARA]')  # Mark paragraphs
+    page_text = page_text.replace('\n', ' ')  # Replace single newlines
+    return page_text.replace('[PARA]', '\n\n')  # Restore paragraphs
+
+
+def _splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """Text splitter for the given sizes, built once per process."""
+    key = (chunk_size, chunk_overlap)
+    if key not in _splitters:
+        _splitters[key] = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+            separators=["\n\n", "\n", ".", "!", "?", ";", ":", " ", ""],  # Order matters
+            keep_separator=True
+        )
+    return _splitters[key]
+
+
+def process_page_range(file_path: str, start: int, end: int, chunk_size: int, chunk_overlap: int) -> Tuple[List[Dict], Dict]:
+    """
+    Extract, clean and chunk pages [start, end) of a PDF (runs in a worker process).
+
+    Returns:
+        (pages, timings): per page its 'chunks' and 'raw_chunks' (chunk count
+        of the uncleaned text), plus seconds spent per stage
+    """
+    timings = {'extract': 0.0, 'clean': 0.0, 'chunk': 0.0}
+    splitter = _splitter(chunk_size, chunk_overlap)
+    with open(file_path, 'rb') as f:
+        reader = pypdf.PdfReader(f)
+        pages = []
+        for page_number in range(start, end):
+            started = time.perf_counter()
+            raw_text = reader.pages[page_number].extract_text()
+            extracted = time.perf_counter()
+            text = clean_page_text(raw_text)
+            cleaned = time.perf_counter()
+            pages.append({
+                'chunks': splitter.split_text(text),
+                'raw_chunks': len(splitter.split_text(raw_text))
+            })
+            timings['extract'] += extracted - started
+            timings['clean'] += cleaned - extracted
+            timings['chunk'] += time.perf_counter() - cleaned
+    return pages, timings
+
+
+class PagePool:
+    """
+    Worker processes running process_page_range, fed in submission order.
+
+    Each worker runs this file as its own program (see _worker_main) and takes
+    calls over its stdin/stdout pipes. Workers are never forked from the threaded
+    server, where a child could inherit a lock another thread held (FAISS/OpenMP,
+    logging, the embedding cache) and deadlock. They also don't import the
+    server's main script the way multiprocessing children do, so starting them
+    doesn't start a second server. A worker exits when its pipe is closed,
+    including when the server dies.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._tasks = queue.SimpleQueue()
+        for _ in range(workers):
+            threading.Thread(target=self._serve, daemon=True).start()
+
+    def submit(self, file_path: str, start: int, end: int, chunk_size: int, chunk_overlap: int) -> Future:
+        """Queue process_page_range(...) for the next free worker."""
+        future = Future()
+        self._tasks.put((future, (file_path, start, end, chunk_size, chunk_overlap)))
+        return future
+
+    def shutdown(self):
+        """Stop the workers once the tasks already queued are done."""
+        for _ in range(self.workers):
+            self._tasks.put(None)
+
+    @staticmethod
+    def _start_worker() -> subprocess.Popen:
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__)],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def _serve(self):
+        """Hand queued tasks to one worker process, (re)started when needed."""
+        worker = None
+        try:
+            while True:
+                task = self._tasks.get()
+                if task is None:
+                    return
+                future, args = task
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if worker is None:
+                        worker = self._start_worker()
+                    pickle.dump(args, worker.stdin)
+                    worker.stdin.flush()
+                    ok, result = pickle.load(worker.stdout)
+                except Exception as e:
+                    if worker is not None:
+                        worker.kill()
+                        worker.wait()
+                        worker = None
+                    future.set_exception(RuntimeError(f"PDF page worker failed: {str(e)}"))
+                    continue
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(result)
+        finally:
+            if worker is not None:
+                worker.stdin.close()
+                worker.wait()
+
+
+def _worker_main():
+    """Entry point of a PagePool worker: answer process_page_range calls until stdin closes."""
+    # The server stops workers by closing the pipe; Ctrl+C in a terminal reaches them too
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    requests = sys.stdin.buffer
+    responses = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    # Warnings printed while extracting go to stderr, not into the response stream
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    while True:
+        try:
+            args = pickle.load(requests)
+        except EOFError:
+            return
+        try:
+            response = pickle.dumps((True, process_page_range(*args)))
+        except Exception as e:
+            try:
+                response = pickle.dumps((False, e))
+            except Exception:
+                response = pickle.dumps((False, RuntimeError(f"{type(e).__name__}: {str(e)}")))
+        responses.write(response)
+        responses.flush()
+
+
+def _get_pool(workers: int) -> Optional[PagePool]:
+    """Shared worker pool, created on first use."""
+    global _pool
+    if workers <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool.workers != workers:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = PagePool(workers)
+        return _pool
+
+
+def iter_pdf_pages(file_path: str, chunk_size: int, chunk_overlap: int, workers: int = 0,
+                   timings: Optional[Dict] = None) -> Iterator[Dict]:
+    """
+    Extract, clean and chunk the pages of a PDF on a process pool, yielding each
+    page (as in process_page_range) in page order as soon as it is ready.
+
+    Pages go to the workers in ranges of PAGES_PER_TASK, with at most
+    TASKS_PER_WORKER ranges per worker in flight, so a slow consumer holds
+    extraction back instead of letting finished pages pile up in memory.
+
+    Args:
+        workers: Worker processes (0 = one per CPU, 1 = in the calling thread)
+        timings: Updated with per-stage seconds summed over workers, the
+            number of workers used and the page count ('pages', set before the
+            first page is yielded)
+    """
+    timings = {} if timings is None else timings
+    timings.update(extract=0.0, clean=0.0, chunk=0.0)
+    with open(file_path, 'rb') as f:
+        num_pages = len(pypdf.PdfReader(f).pages)
+    timings['pages'] = num_pages
+
+    workers = workers or os.cpu_count() or 1
+    ranges = [(start, min(start + PAGES_PER_TASK, num_pages)) for start in range(0, num_pages, PAGES_PER_TASK)]
+    pool = _get_pool(workers) if len(ranges) > 1 else None
+    timings['workers'] = workers if pool is not None else 1
+
+    def finished(pages: List[Dict], range_timings: Dict) -> List[Dict]:
+        for stage, seconds in range_timings.items():
+            timings[stage] += seconds
+        return pages
+
+    if pool is None:
+        for start, end in ranges:
+            yield from finished(*process_page_range(file_path, start, end, chunk_size, chunk_overlap))
+        return
+
+    in_flight = deque()
+    try:
+        for start, end in ranges:
+            in_flight.append(pool.submit(file_path, start, end, chunk_size, chunk_overlap))
+            if len(in_flight) >= workers * TASKS_PER_WORKER:
+                yield from finished(*in_flight.popleft().result())
+        while in_flight:
+            yield from finished(*in_flight.popleft().result())
+    finally:
+        # The consumer stopped early (error or close): drop work that hasn't started
+        for future in in_flight:
+            future.cancel()
+
+
+def process_pdf_pages(file_path: str, chunk_size: int, chunk_overlap: int, workers: int = 0) -> Tuple[List[Dict], Dict]:
+    """
+    All pages of a PDF at once (see iter_pdf_pages).
+
+    Returns:
+        (pages, timings): per-page results, and the wall time plus per-stage
+        seconds summed over workers
+    """
+    started = time.perf_counter()
+    timings = {}
+    pages = list(iter_pdf_pages(file_path, chunk_size, chunk_overlap, workers, timings))
+    timings['wall'] = time.perf_counter() - started
+    return pages, timings
+
+
+if __name__ == '__main__':
+    _worker_main()
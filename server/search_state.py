@@ -0,0 +1,77 @@
+import functools
+import threading
+
+# DocumentProcessor attributes that make up what a search reads
+FIELDS = (
+    'index', 'index_params', 'documents', 'metadata', 'catalog', 'vectors', 'chunk_ids', 'canonical_ids',
+    'lexical_features', 'lexical_index', 'pending_ids', '_dedup_cache'
+)
+
+
+class SearchState:
+    """
+    One consistent version of the searchable data: FAISS index, chunk store,
+    manual metadata and catalog, and the per-chunk arrays aligned with them.
+
+    A published state is never changed. Writers work on copy() and publish the
+    result by replacing DocumentProcessor._state, so a search that started on
+    the old state finishes on it while the next one is being built.
+    """
+
+    def __init__(self):
+        for name in FIELDS:
+            setattr(self, name, None)
+
+    def copy(self) -> 'SearchState':
+        """
+        Starting point for the next state. Small containers (metadata, catalog,
+        pending IDs, the chunk store's manual table) are copied here; the index,
+        lexical index and large arrays stay shared until the writer first
+        changes them in place (see DocumentProcessor._own_index).
+        """
+        state = SearchState()
+        for name in FIELDS:
+            setattr(state, name, getattr(self, name))
+        if self.metadata is not None:
+            state.metadata = {file_id: dict(meta) for file_id, meta in self.metadata.items()}
+        if self.catalog is not None:
+            state.catalog = self.catalog.copy()
+        if self.pending_ids is not None:
+            state.pending_ids = set(self.pending_ids)
+        if self.documents is not None:
+            state.documents = self.documents.copy()
+        return state
+
+
+class StateField:
+    """DocumentProcessor attribute stored on the state the calling thread works with (see _view)."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return getattr(obj._view(), self.name)
+
+    def __set__(self, obj, value):
+        setattr(obj._view(), self.name, value)
+
+
+class StateView(threading.local):
+    """Per-thread state pinned by a running read or write (None: the published state)."""
+    state = None
+
+
+def reads_state(method):
+    """Run a DocumentProcessor method against the state published when it was called."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._local.state is not None:
+            return method(self, *args, **kwargs)
+        self._local.state = self._state
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._local.state = None
+    return wrapper
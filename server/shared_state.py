@@ -0,0 +1,140 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process owns VECTOR_DB_PATH
+    fcntl = None
+
+GENERATION_NAME = "generation"
+LOCK_NAME = "state.lock"
+MAINTENANCE_LOCK_NAME = "maintenance.lock"
+LOCKS_DIR = "locks"
+
+
+class SharedState:
+    """
+    Coordination between processes (e.g. gunicorn workers) serving one VECTOR_DB_PATH.
+
+    - generation: a counter in VECTOR_DB_PATH/generation that a writer bumps after
+      every change it persists; other workers compare it with the generation they
+      loaded to know when to catch up
+    - lock(): flock on state.lock, held exclusively by a writer while it brings
+      its state up to date, changes it and persists it, and shared by a reader
+      while it catches up, so readers never see half of a change
+    - try_maintenance(): one worker at a time runs background upkeep (resuming
+      uploads, retrying embeddings, compaction); the kernel drops its lock if it
+      dies, so another worker takes over
+    - hold()/is_held(): per-upload locks that tell a live ingestion from one
+      whose process died
+
+    flock is released when a process exits and is per open file, so files are
+    (re)opened per process: a forked worker never shares a lock with its parent.
+    Disabled (or without fcntl) every lock is a no-op and the generation stays 0.
+    """
+
+    def __init__(self, path: str, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled and fcntl is not None
+        self._files: Dict[str, object] = {}
+        self._pid = os.getpid()
+        self._mutex = threading.Lock()
+        self.maintaining = False
+
+    def _file(self, name: str):
+        """This process's open handle on a lock file."""
+        with self._mutex:
+            if self._pid != os.getpid():
+                # Inherited through fork: these belong to the parent
+                self._files = {}
+                self._pid = os.getpid()
+            if name not in self._files:
+                os.makedirs(os.path.dirname(os.path.join(self.path, name)), exist_ok=True)
+                self._files[name] = open(os.path.join(self.path, name), 'a+b')
+            return self._files[name]
+
+    @contextmanager
+    def lock(self, exclusive: bool = True):
+        if not self.enabled:
+            yield
+            return
+        f = self._file(LOCK_NAME)
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+    def generation(self) -> int:
+        if not self.enabled:
+            return 0
+        try:
+            with open(os.path.join(self.path, GENERATION_NAME), 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def bump(self) -> int:
+        """Publish a change (caller holds the exclusive lock); returns the new generation."""
+        if not self.enabled:
+            return 0
+        generation = self.generation() + 1
+        path = os.path.join(self.path, GENERATION_NAME)
+        with open(path + ".tmp", 'w') as f:
+            f.write(str(generation))
+        os.replace(path + ".tmp", path)
+        return generation
+
+    def changed_at(self) -> Optional[float]:
+        """When a change was last published (None if never)."""
+        try:
+            return os.path.getmtime(os.path.join(self.path, GENERATION_NAME))
+        except OSError:
+            return None
+
+    def try_maintenance(self) -> bool:
+        """Whether this process runs background upkeep; once acquired it is kept until exit."""
+        if not self.enabled:
+            self.maintaining = True
+            return True
+        try:
+            fcntl.flock(self._file(MAINTENANCE_LOCK_NAME), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.maintaining = True
+        except OSError:
+            pass
+        return self.maintaining
+
+    def hold(self, name: str):
+        """Lock VECTOR_DB_PATH/locks/<name> until release(name), or until this process dies."""
+        if self.enabled:
+            fcntl.flock(self._file(os.path.join(LOCKS_DIR, name)), fcntl.LOCK_EX)
+
+    def release(self, name: str):
+        if not self.enabled:
+            return
+        name = os.path.join(LOCKS_DIR, name)
+        with self._mutex:
+            f = self._files.pop(name, None)
+        if f is not None:
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+            f.close()
+
+    def is_held(self, name: str) -> bool:
+        """Whether some live process (this one included) holds the lock hold(name) takes."""
+        if not self.enabled:
+            return False
+        path = os.path.join(self.path, LOCKS_DIR, name)
+        if not os.path.exists(path):
+            return False
+        with open(path, 'a+b') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return True
+            fcntl.flock(f, fcntl.LOCK_UN)
+        return False
@@ -0,0 +1,131 @@
+import os
+import sys
+import hashlib
+import tempfile
+import textwrap
+import types
+
+# Configuration is read at import time, so point it at throwaway locations first
+os.environ.setdefault('AZURE_OPENAI_API_KEY', 'test-key')
+os.environ.setdefault('AZURE_OPENAI_ENDPOINT', 'http://localhost:1')
+os.environ.setdefault('AZURE_OPENAI_API_VERSION', '2023-05-15')
+os.environ.setdefault('AZURE_OPENAI_EMBEDDING_DEPLOYMENT', 'test-embeddings')
+os.environ.setdefault('AZURE_OPENAI_CHAT_DEPLOYMENT', 'test-chat')
+os.environ.setdefault('VECTOR_DB_PATH', tempfile.mkdtemp(prefix='vector_db_'))
+os.environ.setdefault('UPLOAD_FOLDER', tempfile.mkdtemp(prefix='uploads_'))
+os.environ.setdefault('PDF_WORKERS', '1')
+os.environ.setdefault('PENDING_RETRY_INTERVAL', '3600')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import openai
+import pytest
+
+
+class OfflineTranslator:
+    """Stands in for googletrans.Translator: every text is English already."""
+
+    def translate(self, text, src='auto', dest='en'):
+        return types.SimpleNamespace(text=text, src=src, dest=dest)
+
+    def detect(self, text):
+        return types.SimpleNamespace(lang='en', confidence=1.0)
+
+
+try:
+    import googletrans  # noqa: F401
+except ImportError:
+    # app.py, tools.py and PravusAgent.py import it at module level; the tests never translate
+    sys.modules['googletrans'] = types.SimpleNamespace(Translator=OfflineTranslator)
+
+DIMENSIONS = 1536
+
+
+def fake_embedding(text: str) -> list:
+    """Deterministic unit vector per text, standing in for Azure OpenAI."""
+    seed = int.from_bytes(hashlib.md5(text.encode('utf-8')).digest()[:4], 'little')
+    vector = np.random.default_rng(seed).standard_normal(DIMENSIONS).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeEmbeddingAPI:
+    """Replacement for openai.Embedding.create that records what it was asked to embed."""
+
+    def __init__(self):
+        self.texts = []
+        self.fail_texts = set()
+
+    def create(self, input, engine=None, **kwargs):
+        if self.fail_texts.intersection(input):
+            raise RuntimeError("embedding request failed")
+        self.texts.extend(input)
+        return {'data': [{'embedding': fake_embedding(text), 'index': i} for i, text in enumerate(input)]}
+
+
+@pytest.fixture
+def embedding_api(monkeypatch):
+    api = FakeEmbeddingAPI()
+    monkeypatch.setattr(openai.Embedding, 'create', api.create)
+    return api
+
+
+def write_pdf(path: str, pages: list) -> str:
+    """Write a minimal PDF with one page of plain text per entry in pages."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        lines = textwrap.wrap(text, 80) or ['']
+        body = "BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(
+            "(" + line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ") '" for line in lines
+        ) + " ET"
+        objects.append(f"<< /Length {len(body)} >>\nstream\n{body}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode('latin-1')
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1')
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode('latin-1')
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('latin-1')
+    with open(path, 'wb') as f:
+        f.write(out)
+    return path
+
+
+def manual_pages(topic: str, count: int = 3) -> list:
+    """Page texts for a test manual about topic, distinct per topic and page."""
+    return [
+        f"{topic} manual page {page}. " + " ".join(
+            f"The {topic} {word} step {page}.{n} explains how to check the {word} before calling service."
+            for n, word in enumerate(['drum', 'filter', 'hose', 'door', 'motor', 'pump', 'belt', 'valve'])
+        )
+        for page in range(1, count + 1)
+    ]
+
+
+@pytest.fixture
+def vector_db(tmp_path, monkeypatch):
+    """A fresh VECTOR_DB_PATH (and embedding cache) for the processors of one test."""
+    import document_processor
+
+    path = str(tmp_path / "vector_db")
+    monkeypatch.setattr(document_processor, 'VECTOR_DB_PATH', path)
+    monkeypatch.setattr(document_processor, 'EMBEDDING_CACHE_PATH', os.path.join(path, 'embedding_cache'))
+    return path
+
+
+@pytest.fixture
+def make_processor(vector_db, embedding_api, monkeypatch):
+    """Build DocumentProcessors on the test's VECTOR_DB_PATH (several act like several workers)."""
+    from document_processor import AzureOpenAIEmbeddings, DocumentProcessor
+
+    # A failed request fails at once instead of being retried with back-off
+    monkeypatch.setattr(AzureOpenAIEmbeddings._make_embedding_request, '__defaults__', (1, None, None))
+    return DocumentProcessor
@@ -0,0 +1,64 @@
+import pytest
+
+import PravusAgent as agent_module
+import tools
+from answer_cache import AnswerCache
+from conversation_store import ConversationStore
+from conftest import manual_pages, write_pdf
+
+
+class FakeLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_response(self, **kwargs):
+        self.calls += 1
+        return {'response': f"answer {self.calls}"}
+
+
+@pytest.fixture
+def chat(make_processor, tmp_path, monkeypatch):
+    processor = make_processor()
+    processor.process_pdf(write_pdf(str(tmp_path / "washer.pdf"), manual_pages("washer")), {'brand': 'Acme', 'model': 'W1'})
+    cache = AnswerCache(processor, threshold=0.95, ttl_seconds=3600, max_entries=10)
+    processor.add_change_listener(cache.on_manuals_changed)
+
+    monkeypatch.setattr(agent_module, 'open_conversation_store', ConversationStore)
+    # Skip the warranty question so every turn reaches retrieval and generation
+    monkeypatch.setattr(agent_module.ConversationMemory, 'has_prompted_for_warranty', lambda self: True)
+    llm = FakeLLM()
+    agent = agent_module.PravusAgent(processor, llm, {
+        'greet': tools.greet_tool, 'help': tools.help_tool, 'retrieve': tools.retrieve_tool,
+        'generate': tools.generate_tool, 'translate': tools.translate_tool, 'clarify': tools.clarify_tool
+    })
+
+    def ask(question, session_id):
+        return agent.act(question, {
+            'brand': 'Acme', 'model': 'W1', 'response_language': 'en', 'source_language': 'en',
+            'doc_processor': processor, 'llm_service': llm, 'answer_cache': cache, 'session_id': session_id
+        })
+
+    return ask, llm, cache
+
+
+def test_standalone_answers_are_shared_between_sessions(chat):
+    ask, llm, cache = chat
+
+    first = ask("how do I clean the washer filter", 's1')
+    second = ask("how do I clean the washer filter", 's2')
+
+    assert llm.calls == 1
+    assert second['response'] == first['response']
+    assert cache.get_stats()['hits'] == 1
+
+
+def test_follow_ups_never_use_the_cache(chat):
+    ask, llm, cache = chat
+
+    ask("my washer drum is noisy", 's1')
+    ask("what about the filter on it", 's1')
+    ask("what about the filter on it", 's2')
+
+    assert llm.calls == 3
+    assert cache.get_stats()['hits'] == 0
+
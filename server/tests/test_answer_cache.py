@@ -0,0 +1,50 @@
+import pytest
+
+from answer_cache import AnswerCache
+from conftest import manual_pages, write_pdf
+
+
+@pytest.fixture
+def processor(make_processor, tmp_path):
+    processor = make_processor()
+    processor.process_pdf(write_pdf(str(tmp_path / "washer.pdf"), manual_pages("washer")), {'brand': 'Acme', 'model': 'W1'})
+    return processor
+
+
+@pytest.fixture
+def cache(processor):
+    cache = AnswerCache(processor, threshold=0.95, ttl_seconds=3600, max_entries=10)
+    processor.add_change_listener(cache.on_manuals_changed)
+    return cache
+
+
+def sources_for(processor):
+    return [{'file_id': file_id} for file_id in processor.metadata]
+
+
+def test_hit_within_scope_only(processor, cache):
+    cache.store("how do I clean the filter", 'Acme', 'W1', 'en', "Open the flap.", sources_for(processor))
+
+    hit = cache.lookup("how do I clean the filter", 'Acme', 'W1', 'en')
+    assert hit['response'] == "Open the flap."
+    assert cache.lookup("how do I clean the filter", 'Acme', 'W1', 'de') is None
+    assert cache.lookup("how do I clean the filter", 'Other', None, 'en') is None
+    assert cache.lookup("why is the drum noisy", 'Acme', 'W1', 'en') is None
+
+
+def test_upload_in_scope_drops_answers(processor, cache, tmp_path):
+    cache.store("how do I clean the filter", 'Acme', None, 'en', "Open the flap.", sources_for(processor))
+
+    processor.process_pdf(write_pdf(str(tmp_path / "dryer.pdf"), manual_pages("dryer")), {'brand': 'Acme', 'model': 'D2'})
+
+    assert cache.lookup("how do I clean the filter", 'Acme', None, 'en') is None
+    assert cache.get_stats()['invalidations'] == 1
+
+
+def test_delete_of_source_drops_answers(processor, cache):
+    file_id = next(iter(processor.metadata))
+    cache.store("how do I clean the filter", 'Acme', 'W1', 'en', "Open the flap.", sources_for(processor))
+
+    processor.delete_document(file_id)
+
+    assert cache.get_stats()['entries'] == 0
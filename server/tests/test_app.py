@@ -0,0 +1,78 @@
+import pytest
+
+
+@pytest.fixture(scope='module')
+def client():
+    import app
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize('body, error', [
+    ({'queries': 'filter'}, 'queries must be a list'),
+    ({'queries': ['filter'], 'k': 0}, 'k must be a positive integer'),
+    ({'queries': ['filter'], 'k': -3}, 'k must be a positive integer'),
+    ({'queries': ['filter'], 'k': 2.5}, 'k must be a positive integer'),
+    ({'queries': ['filter'], 'k': '4'}, 'k must be a positive integer'),
+    ({'queries': ['filter', 7]}, 'Query 1'),
+    ({'queries': [['filter']]}, 'Query 0'),
+    ({'queries': [{'brand': 'Acme'}]}, 'Query 0'),
+    ({'queries': ['filter', {'query': 'drum', 'model': 5}]}, 'Query 1'),
+    ({'queries': []}, 'No queries provided'),
+])
+def test_batch_search_rejects_bad_input(client, body, error):
+    response = client.post('/api/search/batch', json=body)
+
+    assert response.status_code == 400
+    assert error in response.get_json()['error']
+
+
+def test_batch_search_accepts_strings_and_objects(client):
+    response = client.post('/api/search/batch', json={'queries': ['filter', {'query': 'drum', 'brand': 'Acme'}], 'k': 2})
+
+    assert response.status_code == 200
+    assert response.get_json()['count'] == 2
+
+
+def test_verify_counts_shared_vectors_as_consistent(client, embedding_api, tmp_path, monkeypatch):
+    import app
+    from conftest import manual_pages, write_pdf
+    from document_processor import AzureOpenAIEmbeddings
+
+    monkeypatch.setattr(AzureOpenAIEmbeddings._make_embedding_request, '__defaults__', (1, None, None))
+    pages = manual_pages("verify")
+    for model in ('V1', 'V2'):
+        app.doc_processor.process_pdf(write_pdf(str(tmp_path / f"{model}.pdf"), pages), {'brand': 'Acme', 'model': model})
+
+    body = client.get('/api/database/verify').get_json()
+
+    assert body['stats']['deduplication']['shared_chunks'] > 0
+    assert body['expected_index_size'] == body['stats']['index_size']
+    assert body['is_consistent']
+
+
+def test_upload_job_can_be_polled_until_done(client, embedding_api, tmp_path, monkeypatch):
+    import io
+    import time
+    from conftest import manual_pages, write_pdf
+    from document_processor import AzureOpenAIEmbeddings
+
+    monkeypatch.setattr(AzureOpenAIEmbeddings._make_embedding_request, '__defaults__', (1, None, None))
+    with open(write_pdf(str(tmp_path / "upload.pdf"), manual_pages("upload")), 'rb') as f:
+        pdf = f.read()
+
+    response = client.post('/api/upload', data={'file': (io.BytesIO(pdf), 'upload.pdf'), 'brand': 'Acme', 'model': 'U1'},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+    status_url = response.get_json()['status_url']
+
+    again = client.post('/api/upload', data={'file': (io.BytesIO(pdf), 'upload.pdf'), 'brand': 'Acme', 'model': 'U2'},
+                        content_type='multipart/form-data')
+    assert again.status_code == 409
+
+    deadline = time.time() + 30
+    job = client.get(status_url).get_json()
+    while job['state'] not in ('completed', 'failed') and time.time() < deadline:
+        time.sleep(0.1)
+        job = client.get(status_url).get_json()
+    assert job['state'] == 'completed'
+    assert job['result']['model'] == 'U1'
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+import bulk_ingest
+from conftest import manual_pages, write_pdf
+
+TOPICS = ["washer", "dryer", "fridge", "oven", "freezer"]
+
+
+def run(directory, checkpoint, monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['bulk_ingest.py', str(directory), '--checkpoint', str(checkpoint), *args])
+    with pytest.raises((SystemExit, KeyboardInterrupt)) as stopped:
+        bulk_ingest.main()
+    return stopped.value
+
+
+def test_rerun_after_an_interruption_ingests_each_manual_once(make_processor, tmp_path, monkeypatch):
+    directory = tmp_path / "manuals"
+    os.makedirs(directory / "kitchen")
+    rows = ["path,brand,model"]
+    for topic in TOPICS:
+        rel_path = os.path.join("kitchen", f"{topic}.pdf") if topic in ("fridge", "oven") else f"{topic}.pdf"
+        write_pdf(str(directory / rel_path), manual_pages(topic))
+        rows.append(f"{rel_path},Acme,{topic.upper()}")
+    (directory / "manifest.csv").write_text("\n".join(rows) + "\n")
+    checkpoint = tmp_path / "checkpoint.json"
+    monkeypatch.setattr(bulk_ingest, 'UPLOAD_FOLDER', str(tmp_path / "uploads"))
+
+    processed, interrupt_after = [], [2]
+    original = make_processor.process_pdf
+
+    def process_pdf(self, file_path, metadata, *args, **kwargs):
+        # The first run is killed while its third manual is being ingested
+        if interrupt_after and len(processed) >= interrupt_after[0]:
+            raise KeyboardInterrupt
+        processed.append(os.path.basename(file_path))
+        return original(self, file_path, metadata, *args, **kwargs)
+
+    monkeypatch.setattr(make_processor, 'process_pdf', process_pdf)
+    assert isinstance(run(directory, checkpoint, monkeypatch, '--jobs', '1', '--save-every', '1'), KeyboardInterrupt)
+    first_run = list(processed)
+    assert len(first_run) == 2
+
+    interrupt_after.clear()
+    processed.clear()
+    assert run(directory, checkpoint, monkeypatch, '--jobs', '2').code == 0
+    assert sorted(first_run + processed) == sorted(f"{topic}.pdf" for topic in TOPICS)
+
+    processed.clear()
+    assert run(directory, checkpoint, monkeypatch).code == 0
+    assert processed == []
+
+    filenames = [meta['filename'] for meta in make_processor().metadata.values()]
+    assert sorted(filenames) == sorted(f"{topic}.pdf" for topic in TOPICS)
@@ -0,0 +1,60 @@
+from catalog import ManualCatalog
+from conftest import manual_pages, write_pdf
+
+
+def manual(brand, model, start, end, filename=None):
+    return {'brand': brand, 'model': model, 'filename': filename, 'start_idx': start, 'end_idx': end, 'num_chunks': end - start}
+
+
+def test_lookups_follow_adds_and_removes():
+    catalog = ManualCatalog()
+    catalog.rebuild({
+        'washer': manual('Acme', 'W1', 0, 4, 'washer.pdf'),
+        'dryer': manual('Acme', 'D1', 4, 6, 'dryer.pdf'),
+        'fridge': manual('Bolt', 'W1', 6, 9, 'fridge.pdf'),
+    })
+
+    assert catalog.brands() == ['Acme', 'Bolt']
+    assert catalog.models() == ['D1', 'W1']
+    assert catalog.models('Acme') == ['D1', 'W1']
+    assert catalog.find(model='W1') == ['washer', 'fridge']
+    assert catalog.file_id_for('dryer.pdf') == 'dryer'
+    assert catalog.range_of('fridge') == (6, 9)
+
+    catalog.add('oven', manual('Cook', 'O1', 9, 10))
+    assert catalog.brands() == ['Acme', 'Bolt', 'Cook']
+    assert catalog.find(brand='Cook') == ['oven']
+
+    catalog.remove('dryer')
+    assert catalog.models('Acme') == ['W1']
+    assert catalog.file_id_for('dryer.pdf') is None
+    assert catalog.range_of('fridge') == (4, 7)
+    assert catalog.range_of('oven') == (7, 8)
+
+
+def test_callers_cannot_change_cached_lists():
+    catalog = ManualCatalog()
+    catalog.add('washer', manual('Acme', 'W1', 0, 4))
+
+    catalog.brands().append('Bolt')
+    catalog.models().clear()
+    catalog.models('Acme').append('X9')
+
+    assert catalog.brands() == ['Acme']
+    assert catalog.models() == ['W1']
+    assert catalog.models('Acme') == ['W1']
+
+
+def test_processor_catalog_is_refreshed_by_upload_and_delete(make_processor, tmp_path):
+    processor = make_processor()
+    processor.process_pdf(write_pdf(str(tmp_path / "washer.pdf"), manual_pages("washer")), {'brand': 'Acme', 'model': 'W1'})
+    assert processor.catalog.brands() == ['Acme']
+
+    dryer = processor.process_pdf(write_pdf(str(tmp_path / "dryer.pdf"), manual_pages("dryer")), {'brand': 'Bolt', 'model': 'D1'})
+    assert processor.catalog.brands() == ['Acme', 'Bolt']
+    assert processor.catalog.models() == ['D1', 'W1']
+
+    assert processor.delete_document(dryer)
+    assert processor.catalog.brands() == ['Acme']
+    assert processor.catalog.models() == ['W1']
+    assert processor.catalog.find(brand='Bolt') == []
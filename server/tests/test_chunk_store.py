@@ -0,0 +1,67 @@
+import json
+import os
+
+import numpy as np
+from langchain.schema import Document
+
+from chunk_store import ChunkStore
+
+
+def chunk(text, file_id, page, number, total, chunk_id):
+    return Document(page_content=text, metadata={
+        'file_id': file_id, 'filename': f"{file_id}.pdf", 'brand': 'Acme', 'model': file_id.upper(),
+        'page': page, 'chunk': number, 'total_chunks_in_page': total, 'chunk_id': chunk_id
+    })
+
+
+def test_saved_store_is_memory_mapped_and_reads_back(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks"))
+    docs = [
+        chunk("Clean the filter.", 'w1', 1, 1, 2, 10),
+        chunk("Température: 40 °C — Wolle", 'w1', 1, 2, 2, 11),
+        chunk("", 'w1', 2, 1, 1, 12),
+        chunk("Dryer lint screen", 'd1', 1, 1, 1, 20),
+    ]
+    store.extend(docs)
+    store.save()
+
+    reopened = ChunkStore(str(tmp_path / "chunks"))
+    assert reopened.load()
+    assert isinstance(reopened._blob, np.memmap)
+    assert reopened.texts() == [doc.page_content for doc in docs]
+    assert reopened.chunk_ids.tolist() == [10, 11, 12, 20]
+    assert reopened.pages.tolist() == [1, 1, 2, 1]
+    assert reopened.chunk_numbers.tolist() == [1, 2, 1, 1]
+    assert reopened.page_chunks.tolist() == [2, 2, 1, 1]
+    assert reopened.hashes.tolist() == store.hashes.tolist()
+    assert [reopened.file_id(i) for i in range(4)] == ['w1', 'w1', 'w1', 'd1']
+    assert reopened.count_by('model') == {'W1': 3, 'D1': 1}
+
+    second = reopened[1]
+    assert second.page_content == docs[1].page_content
+    assert {key: second.metadata[key] for key in docs[1].metadata} == docs[1].metadata
+    assert second.metadata['prev_chunk_preview'] == "Clean the filter."
+    assert reopened[0].metadata['next_chunk_preview'] == docs[1].page_content
+
+
+def test_delete_range_survives_a_reload(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks"))
+    store.extend([chunk(f"chunk {i}", 'w1' if i < 3 else 'd1', 1, i + 1, 5, i) for i in range(5)])
+    store.delete_range(0, 3)
+    store.save()
+
+    reopened = ChunkStore(str(tmp_path / "chunks"))
+    assert reopened.load()
+    assert reopened.texts() == ["chunk 3", "chunk 4"]
+    assert reopened.chunk_ids.tolist() == [3, 4]
+    assert [manual['file_id'] for manual in reopened.manuals] == ['d1']
+
+
+def test_inconsistent_store_is_not_loaded(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks"))
+    store.extend([chunk("Clean the filter.", 'w1', 1, 1, 1, 0)])
+    store.save()
+    with open(os.path.join(store.path, "store.json"), 'w', encoding='utf-8') as f:
+        json.dump({'chunk_count': 2, 'text_bytes': 17}, f)
+
+    assert not ChunkStore(store.path).load()
@@ -0,0 +1,65 @@
+import pytest
+
+import PravusAgent as agent_module
+from PravusAgent import ConversationSessions
+from conversation_store import SQLiteConversationStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(agent_module.time, 'time', clock.time)
+    return clock
+
+
+def test_least_recently_used_session_is_evicted(clock):
+    sessions = ConversationSessions(None, max_sessions=2, ttl_seconds=3600)
+    sessions.get('a').add_turn("washer leaks", "check the hose")
+    sessions.get('b')
+    sessions.get('a')
+    sessions.get('c')
+
+    stats = sessions.get_stats()
+    assert stats['live_sessions'] == 2
+    assert stats['evicted_lru'] == 1
+    assert sessions.get('a').conversations
+    # 'b' was the least recently used; it comes back empty without a store
+    assert sessions.get('b').conversations == []
+
+
+def test_idle_sessions_expire(clock):
+    sessions = ConversationSessions(None, max_sessions=10, ttl_seconds=60)
+    sessions.get('idle').add_turn("dryer is loud", "check the drum")
+    clock.now += 30
+    sessions.get('active')
+    clock.now += 45
+
+    assert sessions.get_stats()['live_sessions'] == 1
+    assert sessions.get('idle').conversations == []
+    assert sessions.get_stats()['evicted_ttl'] == 1
+
+
+def test_sessions_persist_and_follow_other_workers(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    first = ConversationSessions(None, store=SQLiteConversationStore(path, flush_interval=3600))
+    second = ConversationSessions(None, store=SQLiteConversationStore(path, flush_interval=3600))
+
+    first.get('s1').add_turn("my Acme washer leaks", "check the hose", {'brand': 'Acme'})
+    first.store.flush()
+    assert [t['user_input'] for t in second.get('s1').conversations] == ["my Acme washer leaks"]
+
+    first.get('s1').add_turn("still leaking", "call service")
+    first.store.flush()
+    assert len(second.get('s1').conversations) == 2
+
+    restarted = ConversationSessions(None, store=SQLiteConversationStore(path, flush_interval=3600))
+    assert [t['response'] for t in restarted.get('s1').conversations] == ["check the hose", "call service"]
+    assert restarted.get('s1').get_latest_problem_context()['brand'] == 'Acme'
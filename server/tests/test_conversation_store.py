@@ -0,0 +1,91 @@
+import sqlite3
+import time
+
+from conversation_store import SQLiteConversationStore
+
+
+def turn(text, timestamp=None):
+    return {'timestamp': timestamp or time.time(), 'user_input': text, 'response': f"re: {text}", 'metadata': {'brand': 'Acme'}}
+
+
+def open_store(tmp_path, **kwargs):
+    return SQLiteConversationStore(str(tmp_path / "conversations.db"), flush_interval=3600, **kwargs)
+
+
+def test_turns_survive_a_restart(tmp_path):
+    store = open_store(tmp_path)
+    store.append('s1', turn("first"))
+    store.append('s1', turn("second"))
+    store.append('s2', turn("other"))
+    store.flush()
+
+    stored = open_store(tmp_path).load('s1', limit=10)
+
+    assert [t['user_input'] for t in stored['turns']] == ["first", "second"]
+    assert stored['turns'][0]['metadata'] == {'brand': 'Acme'}
+    assert open_store(tmp_path).load('unknown', limit=10) is None
+
+
+def test_load_sees_queued_turns_and_keeps_the_latest(tmp_path):
+    store = open_store(tmp_path, max_history=3)
+    for i in range(5):
+        store.append('s1', turn(f"q{i}"))
+
+    assert [t['user_input'] for t in store.load('s1', limit=10)['turns']] == ["q2", "q3", "q4"]
+    assert [t['user_input'] for t in store.load('s1', limit=2)['turns']] == ["q3", "q4"]
+
+
+def test_changes_by_another_worker_are_detected(tmp_path):
+    a, b = open_store(tmp_path), open_store(tmp_path)
+    a.append('s1', turn("from a"))
+    a.flush()
+    version = b.load('s1', limit=10)['version']
+    assert not b.changed_elsewhere('s1', version)
+    assert not a.changed_elsewhere('s1', a.load('s1', limit=10)['version'])
+
+    a.append('s1', turn("again from a"))
+    a.flush()
+
+    assert b.changed_elsewhere('s1', version)
+
+
+def test_turns_of_another_worker_are_seen_after_own_writes(tmp_path):
+    a, b = open_store(tmp_path), open_store(tmp_path)
+    a.append('s1', turn("a1"))
+    a.flush()
+    version = a.load('s1', limit=10)['version']
+
+    # b adds a turn, then a's queued turn lands on top of it (a is the last writer)
+    b.load('s1', limit=10)
+    b.append('s1', turn("b1"))
+    b.flush()
+    a.append('s1', turn("a2"))
+    a.flush()
+
+    assert a.changed_elsewhere('s1', version)
+    stored = a.load('s1', limit=10)
+    assert [t['user_input'] for t in stored['turns']] == ["a1", "b1", "a2"]
+    assert not a.changed_elsewhere('s1', stored['version'])
+
+    # a's own turns don't make its copy look stale
+    a.append('s1', turn("a3"))
+    a.flush()
+    assert not a.changed_elsewhere('s1', stored['version'])
+    assert b.changed_elsewhere('s1', None)
+
+
+def test_clear_and_purge_remove_sessions(tmp_path):
+    store = open_store(tmp_path, ttl_seconds=60)
+    store.append('idle', turn("old", timestamp=time.time() - 120))
+    store.append('active', turn("new"))
+    store.append('cleared', turn("bye"))
+    store.clear('cleared')
+    store.flush()
+
+    store._purge()
+
+    assert store.load('idle', limit=10) is None
+    assert store.load('cleared', limit=10) is None
+    assert store.load('active', limit=10) is not None
+    with sqlite3.connect(store.path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM turns").fetchone()[0] == 1
@@ -0,0 +1,396 @@
+import os
+import json
+import threading
+
+import faiss
+import numpy as np
+import openai
+import pytest
+
+from conftest import fake_embedding, manual_pages, write_pdf
+from vector_index import index_type_of
+
+
+def upload(processor, tmp_path, name, pages, brand='Acme', model='W1'):
+    return processor.process_pdf(write_pdf(str(tmp_path / f"{name}.pdf"), pages), {'brand': brand, 'model': model})
+
+
+def test_lexical_match_is_fused_into_dense_results(make_processor, tmp_path):
+    processor = make_processor()
+    pages = manual_pages("washer", 4)
+    pages[2] += " Error code Z9Q7X means the drain pump is blocked."
+    upload(processor, tmp_path, "washer", pages)
+
+    # Fake embeddings carry no meaning, so only the BM25 side can find the error code
+    results = processor.similarity_search("Z9Q7X", k=1)
+
+    assert "Z9Q7X" in results[0].page_content
+
+
+def test_duplicate_manual_shares_index_vectors(make_processor, tmp_path):
+    processor = make_processor()
+    pages = manual_pages("washer")
+    upload(processor, tmp_path, "first", pages)
+    chunks = len(processor.documents)
+
+    upload(processor, tmp_path, "second", pages, model='W2')
+
+    stats = processor.get_database_stats()
+    assert stats['total_documents'] == 2 * chunks
+    assert stats['index_size'] == chunks
+    assert stats['deduplication']['shared_chunks'] == chunks
+    assert len(processor.similarity_search("washer filter", model='W2', brand='Acme', k=2)) == 2
+
+
+def test_deleting_the_original_keeps_the_duplicate_searchable(make_processor, tmp_path):
+    processor = make_processor()
+    pages = manual_pages("washer")
+    first = upload(processor, tmp_path, "first", pages)
+    upload(processor, tmp_path, "second", pages, model='W2')
+    chunks = len(processor.documents) // 2
+
+    assert processor.delete_document(first)
+
+    stats = processor.get_database_stats()
+    assert stats['total_documents'] == chunks
+    assert stats['index_size'] == chunks
+    assert stats['deduplication']['shared_chunks'] == 0
+    results = processor.similarity_search("washer filter", k=chunks)
+    assert {doc.metadata['model'] for doc in results} == {'W2'}
+
+
+def test_delete_removes_only_that_manual_without_reembedding(make_processor, embedding_api, tmp_path):
+    processor = make_processor()
+    washer = upload(processor, tmp_path, "washer", manual_pages("washer"))
+    washer_ids = processor.chunk_ids[processor.metadata[washer]['start_idx']:processor.metadata[washer]['end_idx']].tolist()
+    upload(processor, tmp_path, "dryer", manual_pages("dryer"), model='D1')
+    dryer_chunks = len(processor.documents) - len(washer_ids)
+    embedded = len(embedding_api.texts)
+
+    assert processor.delete_document(washer)
+
+    assert len(embedding_api.texts) == embedded
+    assert washer not in processor.metadata
+    assert len(processor.documents) == dryer_chunks
+    assert not set(washer_ids) & set(processor.chunk_ids.tolist())
+    assert not set(washer_ids) & set(faiss.vector_to_array(processor.index.id_map).tolist())
+    assert processor.get_database_stats()['index_size'] == dryer_chunks
+    results = processor.similarity_search("washer filter", k=dryer_chunks + 1)
+    assert len(results) == dryer_chunks
+    assert {doc.metadata['model'] for doc in results} == {'D1'}
+    # Searching embedded the query and nothing else
+    assert len(embedding_api.texts) == embedded + 1
+    assert not processor.delete_document(washer)
+
+
+def test_restart_loads_persisted_state_without_reembedding(make_processor, embedding_api, tmp_path):
+    processor = make_processor()
+    upload(processor, tmp_path, "washer", manual_pages("washer"))
+    chunks = len(processor.documents)
+    embedded = len(embedding_api.texts)
+
+    restarted = make_processor()
+
+    assert len(restarted.documents) == chunks
+    assert restarted.get_database_stats()['index_size'] == chunks
+    assert restarted.similarity_search("washer filter", k=1)
+    # Only the query was embedded; the manual came back from disk
+    assert len(embedding_api.texts) == embedded + 1
+
+
+def test_journal_replays_changes_and_drops_a_torn_entry(make_processor, tmp_path):
+    processor = make_processor()
+    first = upload(processor, tmp_path, "washer", manual_pages("washer"))
+    upload(processor, tmp_path, "dryer", manual_pages("dryer"), model='D1')
+    processor.delete_document(first)
+    chunks = len(processor.documents)
+    assert processor.journal.num_entries >= 3
+
+    # A crash in the middle of the next append
+    with open(processor.journal.log_path, 'ab') as f:
+        f.write(b'{"op": "add", "seq": 9')
+    restarted = make_processor()
+
+    assert len(restarted.documents) == chunks
+    assert set(restarted.metadata) == set(processor.metadata)
+    with open(restarted.journal.log_path, 'rb') as f:
+        assert f.read().endswith(b'\n')
+    assert {doc.metadata['model'] for doc in restarted.similarity_search("filter", k=chunks)} == {'D1'}
+
+
+def test_snapshot_folds_the_journal(make_processor, tmp_path):
+    processor = make_processor()
+    upload(processor, tmp_path, "washer", manual_pages("washer"))
+    with processor._writing():
+        processor._save_state()
+    assert processor.journal.num_entries == 0
+    upload(processor, tmp_path, "dryer", manual_pages("dryer"), model='D1')
+
+    restarted = make_processor()
+
+    assert len(restarted.documents) == len(processor.documents)
+    assert restarted.get_database_stats()['index_size'] == len(processor.documents)
+    assert set(restarted.metadata) == set(processor.metadata)
+
+
+def test_other_workers_pick_up_published_changes(make_processor, tmp_path, monkeypatch):
+    import document_processor
+
+    monkeypatch.setattr(document_processor, 'GENERATION_CHECK_INTERVAL', 0)
+    writer, reader = make_processor(), make_processor()
+    file_id = upload(writer, tmp_path, "washer", manual_pages("washer"))
+
+    assert reader.refresh()
+    assert file_id in reader.metadata
+    assert len(reader.similarity_search("washer filter", k=2)) == 2
+
+    writer.delete_document(file_id)
+    assert reader.refresh()
+    assert reader.similarity_search("washer filter", k=2) == []
+    assert not reader.refresh()
+
+
+def test_searches_keep_the_state_they_started_on(make_processor, tmp_path):
+    processor = make_processor()
+    upload(processor, tmp_path, "washer", manual_pages("washer"))
+    before = processor.snapshot()
+    chunks = len(before.documents)
+
+    upload(processor, tmp_path, "dryer", manual_pages("dryer"), model='D1')
+
+    assert len(before.documents) == chunks
+    assert before.index.ntotal == chunks
+    assert processor.snapshot() is not before
+    assert len(processor.documents) > chunks
+
+
+def test_only_uploads_interrupted_before_startup_are_resumed(make_processor, embedding_api, vector_db, tmp_path, monkeypatch):
+    import document_processor
+    from shared_state import SharedState
+
+    # One process, so nothing but the startup record tells interrupted uploads from in-flight ones
+    monkeypatch.setattr(document_processor, 'SHARED_INDEX', False)
+    started, resumed = threading.Event(), threading.Event()
+    monkeypatch.setattr(SharedState, 'try_maintenance', lambda self: started.wait(10))
+    monkeypatch.setattr(document_processor.DocumentProcessor, 'retry_pending_embeddings', lambda self: resumed.set() or 0)
+
+    os.makedirs(vector_db, exist_ok=True)
+    with open(os.path.join(vector_db, "pending_ingests.json"), 'w', encoding='utf-8') as f:
+        json.dump({'early': {'file_path': write_pdf(str(tmp_path / "early.pdf"), manual_pages("washer")),
+                             'metadata': {'brand': 'Acme', 'model': 'W1'}, 'started': '2024-01-01T00:00:00'}}, f)
+    processor = make_processor()
+    # An upload that starts after the processor did, before its background thread runs
+    processor._mark_ingest_started('late', write_pdf(str(tmp_path / "late.pdf"), manual_pages("dryer")),
+                                   {'brand': 'Acme', 'model': 'D1'})
+    started.set()
+    assert resumed.wait(30)
+
+    assert 'early' in processor.metadata
+    assert 'late' not in processor.metadata
+    assert list(processor._load_pending_ingests()) == ['late']
+    assert not any('dryer' in text for text in embedding_api.texts)
+
+
+def test_near_duplicate_chunks_keep_their_own_text(make_processor, embedding_api, tmp_path, monkeypatch):
+    # Rebranded pages embed exactly like the originals, but their text differs
+    monkeypatch.setattr(openai.Embedding, 'create', lambda input, engine=None, **kwargs: embedding_api.create(
+        [text.replace("Zephyr", "washer") for text in input], engine, **kwargs))
+    processor = make_processor()
+    pages = manual_pages("washer")
+    upload(processor, tmp_path, "washer", pages)
+    upload(processor, tmp_path, "zephyr", [page.replace("washer", "Zephyr") for page in pages], brand='Zephyr', model='Z1')
+    chunks = len(processor.documents) // 2
+
+    assert processor.get_database_stats()['deduplication']['shared_chunks'] == 0
+    results = processor.similarity_search("Zephyr filter", k=2 * chunks)
+    assert sum("Zephyr" in doc.page_content for doc in results) == chunks
+    assert all(("Zephyr" in doc.page_content) == (doc.metadata['brand'] == 'Zephyr') for doc in results)
+
+
+@pytest.mark.parametrize('storage', ['fp16', 'int8'])
+def test_compressed_storage_reranks_at_full_precision(make_processor, tmp_path, monkeypatch, storage):
+    import document_processor
+
+    monkeypatch.setattr(document_processor, 'VECTOR_STORAGE', storage)
+    processor = make_processor()
+    for name in ("washer", "dryer", "fridge"):
+        upload(processor, tmp_path, name, manual_pages(name, 12), model=name)
+    with processor._writing():
+        processor._rebuild_index()
+    assert processor.index_params['storage'] == storage
+
+    queries = np.asarray(processor.vectors[:20], dtype=np.float32)
+    D, I = processor._search_index(queries, 5)
+    exact = processor._exact_neighbors(queries, processor._indexed_positions(), 5)
+    assert np.all(np.diff(D, axis=1) >= 0)
+    assert I[:, 0].tolist() == processor.chunk_ids[:20].tolist()
+    assert np.mean([len(set(e) & set(i)) / 5 for e, i in zip(exact.tolist(), I.tolist())]) >= 0.9
+    stats = processor.get_database_stats()['vector_storage']
+    assert stats['compression_ratio'] > 1
+    assert stats['recall']['recall_reranked'] >= 0.9
+
+
+def test_recall_is_measured_without_blocking_writers(make_processor, tmp_path):
+    processor = make_processor()
+    upload(processor, tmp_path, "washer", manual_pages("washer", 12))
+    writer_has_lock, done = threading.Event(), threading.Event()
+
+    def writer():
+        with processor._lock:
+            writer_has_lock.set()
+            done.wait(30)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        assert writer_has_lock.wait(10)
+        measured = {}
+        reader = threading.Thread(target=lambda: measured.update(processor._measure_recall() or {}))
+        reader.start()
+        reader.join(10)
+        assert not reader.is_alive()
+        assert measured['recall_reranked'] == 1.0
+    finally:
+        done.set()
+        thread.join()
+
+
+@pytest.mark.parametrize('ann_type', ['ivf', 'hnsw'])
+def test_index_is_promoted_past_the_threshold_keeping_chunk_ids(make_processor, tmp_path, monkeypatch, ann_type):
+    import document_processor
+
+    monkeypatch.setattr(document_processor, 'ANN_INDEX_TYPE', ann_type)
+    processor = make_processor()
+    washer = upload(processor, tmp_path, "washer", manual_pages("washer", 6))
+    washer_ids = processor.chunk_ids.tolist()
+    assert index_type_of(processor.index) == 'flat'
+    monkeypatch.setattr(document_processor, 'ANN_PROMOTION_THRESHOLD', len(washer_ids) + 1)
+
+    upload(processor, tmp_path, "dryer", manual_pages("dryer", 6), model='D1')
+
+    assert processor.index_params['type'] == ann_type
+    assert index_type_of(processor.index) == ann_type
+    meta = processor.metadata[washer]
+    assert processor.chunk_ids[meta['start_idx']:meta['end_idx']].tolist() == washer_ids
+    assert sorted(faiss.vector_to_array(processor.index.id_map).tolist()) == processor.chunk_ids.tolist()
+    _, found = processor._search_index(np.asarray(processor.vectors, dtype=np.float32), 1)
+    assert found[:, 0].tolist() == processor.chunk_ids.tolist()
+    results = processor.similarity_search("washer filter", brand='Acme', model='W1', k=3)
+    assert len(results) == 3
+    assert {doc.metadata['model'] for doc in results} == {'W1'}
+
+
+def test_configured_index_type_is_used_from_the_start(make_processor, tmp_path, monkeypatch):
+    import document_processor
+
+    monkeypatch.setattr(document_processor, 'VECTOR_INDEX_TYPE', 'hnsw')
+    processor = make_processor()
+    upload(processor, tmp_path, "washer", manual_pages("washer", 6))
+
+    assert processor.index_params['type'] == 'hnsw'
+    assert index_type_of(processor.index) == 'hnsw'
+    assert len(processor.similarity_search("washer filter", k=2)) == 2
+
+
+def test_filtered_search_is_an_exact_scan_of_the_matching_manuals(make_processor, tmp_path):
+    processor = make_processor()
+    upload(processor, tmp_path, "washer", manual_pages("washer", 4), brand='Acme', model='W1')
+    upload(processor, tmp_path, "dryer", manual_pages("dryer", 4), brand='Acme', model='D1')
+    upload(processor, tmp_path, "fridge", manual_pages("fridge", 4), brand='Bolt', model='W1')
+    queries = np.stack([processor.embeddings.embed_query(q) for q in ("drain pump", "door seal", "filter")]).astype(np.float32)
+
+    for brand, model, expected in (('Acme', 'W1', {('Acme', 'W1')}), ('Acme', None, {('Acme', 'W1'), ('Acme', 'D1')}),
+                                   (None, 'W1', {('Acme', 'W1'), ('Bolt', 'W1')})):
+        manuals = processor._find_matching_manuals(brand, model, False)
+        assert {(manual['brand'], manual['model']) for manual in manuals} == expected
+        ranges = [(manual['start_idx'], manual['end_idx']) for manual in manuals]
+        D, P = processor._search_ranges_batch(queries, ranges, 5)
+
+        positions = np.concatenate([np.arange(start, end) for start, end in ranges])
+        vectors = np.asarray(processor.vectors, dtype=np.float32)[positions]
+        for query, distances, found in zip(queries, D, P):
+            brute = ((vectors - query) ** 2).sum(axis=1)
+            order = np.argsort(brute, kind='stable')[:5]
+            assert found.tolist() == positions[order].tolist()
+            np.testing.assert_allclose(distances, brute[order], rtol=1e-4, atol=1e-4)
+
+        results = processor.similarity_search("drain pump", brand=brand, model=model, k=6)
+        assert results
+        assert {(doc.metadata['brand'], doc.metadata['model']) for doc in results} <= expected
+
+
+def test_legacy_documents_json_is_migrated_to_the_chunk_store(make_processor, vector_db):
+    texts = ["Clean the drain pump filter monthly.", "Error E21 means the pump is blocked.", "Use the Wool program for wool."]
+    docs = [{'page_content': text, 'metadata': {'file_id': 'legacy', 'filename': 'legacy.pdf', 'brand': 'Acme', 'model': 'W1',
+                                                 'page': i + 1, 'chunk': 1, 'total_chunks_in_page': 1}}
+            for i, text in enumerate(texts)]
+    os.makedirs(vector_db)
+    with open(os.path.join(vector_db, "documents.json"), 'w', encoding='utf-8') as f:
+        json.dump(docs, f)
+    with open(os.path.join(vector_db, "metadata.json"), 'w', encoding='utf-8') as f:
+        json.dump({'legacy': {'filename': 'legacy.pdf', 'brand': 'Acme', 'model': 'W1',
+                              'num_chunks': 3, 'start_idx': 0, 'end_idx': 3}}, f)
+
+    processor = make_processor()
+
+    assert not os.path.exists(os.path.join(vector_db, "documents.json"))
+    assert os.path.exists(os.path.join(vector_db, "documents.json.migrated"))
+    assert processor.documents.texts() == texts
+    assert processor.chunk_ids.tolist() == [0, 1, 2]
+    assert [doc.metadata['page'] for doc in processor.documents] == [1, 2, 3]
+    assert processor.similarity_search("drain pump", brand='Acme', model='W1', k=1)
+
+    restarted = make_processor()
+    assert restarted.documents.texts() == texts
+    assert restarted.chunk_ids.tolist() == [0, 1, 2]
+
+
+def test_streamed_pages_keep_their_chunk_order(make_processor, tmp_path, monkeypatch):
+    import document_processor
+    import page_processing
+
+    # Several small embedding blocks in flight while later pages are still being parsed
+    monkeypatch.setattr(document_processor, 'EMBEDDING_BATCH_SIZE', 3)
+    monkeypatch.setattr(document_processor, 'EMBEDDING_WORKERS', 1)
+    monkeypatch.setattr(document_processor, 'INGEST_QUEUE_DEPTH', 1)
+    monkeypatch.setattr(document_processor, 'PDF_WORKERS', 2)
+    processor = make_processor()
+    path = write_pdf(str(tmp_path / "washer.pdf"), manual_pages("washer", 2 * page_processing.PAGES_PER_TASK + 3))
+    pages, _ = page_processing.process_pdf_pages(path, document_processor.DEFAULT_CHUNK_SIZE,
+                                                 document_processor.DEFAULT_CHUNK_OVERLAP, workers=1)
+    expected = [text for page in pages for text in page['chunks']]
+    stages = []
+
+    processor.process_pdf(path, {'brand': 'Acme', 'model': 'W1'}, progress=lambda stage, **counts: stages.append(stage))
+
+    assert len(expected) > 3 * 3
+    assert processor.documents.texts() == expected
+    pages_of_chunks = processor.documents.pages.tolist()
+    assert pages_of_chunks == sorted(pages_of_chunks)
+    np.testing.assert_array_equal(np.asarray(processor.vectors), np.stack([fake_embedding(text) for text in expected]))
+    assert stages.index('embedding') > stages.index('parsing')
+
+
+def test_embedding_stage_errors_fail_the_upload(make_processor, tmp_path, monkeypatch):
+    import document_processor
+
+    monkeypatch.setattr(document_processor, 'EMBEDDING_BATCH_SIZE', 3)
+    monkeypatch.setattr(document_processor, 'EMBEDDING_WORKERS', 1)
+    processor = make_processor()
+    upload(processor, tmp_path, "dryer", manual_pages("dryer"), model='D1')
+    chunks = len(processor.documents)
+    blocks = []
+
+    def embed_documents_partial(texts):
+        blocks.append(texts)
+        if len(blocks) == 2:
+            raise RuntimeError("embedding service unavailable")
+        return np.stack([fake_embedding(text) for text in texts]), []
+
+    monkeypatch.setattr(processor.embeddings, 'embed_documents_partial', embed_documents_partial)
+    with pytest.raises(RuntimeError, match="embedding service unavailable"):
+        upload(processor, tmp_path, "washer", manual_pages("washer", 6))
+
+    assert len(blocks) >= 2
+    assert len(processor.documents) == chunks
+    assert {doc.metadata['model'] for doc in processor.documents} == {'D1'}
@@ -0,0 +1,139 @@
+import os
+import subprocess
+import sys
+import textwrap
+import time
+
+import numpy as np
+
+from conftest import fake_embedding
+from embedding_cache import EmbeddingCache, QueryEmbeddingLRU
+
+DIMENSIONS = 8
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def vectors(texts):
+    return np.stack([fake_embedding(text)[:DIMENSIONS] for text in texts])
+
+
+def open_cache(path, max_size_mb=1):
+    return EmbeddingCache(str(path), dimensions=DIMENSIONS, max_size_mb=max_size_mb)
+
+
+def assert_cached(cache, texts):
+    found, missing = cache.get_many('model', texts)
+    assert missing == []
+    np.testing.assert_array_equal(found, vectors(texts))
+
+
+def test_put_and_get_survive_a_restart(tmp_path):
+    texts = ["Clean the filter", "  Clean   the filter ", "Error dE"]
+    cache = open_cache(tmp_path)
+    cache.put_many('model', texts[::2], vectors(texts[::2]))
+
+    reopened = open_cache(tmp_path)
+    found, missing = reopened.get_many('model', texts)
+    assert missing == []
+    np.testing.assert_array_equal(found[1], found[0])
+    assert reopened.get_many('other-model', texts)[1] == [0, 1, 2]
+
+
+def test_instances_on_one_directory_share_entries(tmp_path):
+    a, b = open_cache(tmp_path), open_cache(tmp_path)
+    a_texts = [f"a {i}" for i in range(5)]
+    b_texts = [f"b {i}" for i in range(5)]
+    a.put_many('model', a_texts, vectors(a_texts), flush=False)
+    b.put_many('model', b_texts, vectors(b_texts), flush=False)
+
+    # Neither reused the other's rows, and each sees what the other wrote
+    assert_cached(a, a_texts + b_texts)
+    assert_cached(b, a_texts + b_texts)
+
+    a.flush()
+    b.put_many('model', ["b late"], vectors(["b late"]))
+    assert_cached(open_cache(tmp_path), a_texts + b_texts + ["b late"])
+
+
+def test_concurrent_writer_process(tmp_path):
+    writer = subprocess.Popen([sys.executable, '-c', textwrap.dedent(f"""
+        import sys
+        sys.path[:0] = [{SERVER_DIR!r}, {os.path.join(SERVER_DIR, 'tests')!r}]
+        from test_embedding_cache import open_cache, vectors
+        cache = open_cache({str(tmp_path)!r})
+        open({str(tmp_path / 'ready')!r}, 'w').close()
+        for i in range(50):
+            texts = [f"b {{i}} {{j}}" for j in range(4)]
+            cache.put_many('model', texts, vectors(texts), flush=i % 10 == 0)
+    """)])
+    cache = open_cache(tmp_path)
+    while not (tmp_path / 'ready').exists():
+        assert writer.poll() is None
+        time.sleep(0.01)
+    a_texts = []
+    for i in range(50):
+        texts = [f"a {i} {j}" for j in range(4)]
+        cache.put_many('model', texts, vectors(texts), flush=i % 10 == 5)
+        a_texts += texts
+    assert writer.wait(timeout=60) == 0
+
+    b_texts = [f"b {i} {j}" for i in range(50) for j in range(4)]
+    assert_cached(cache, a_texts + b_texts)
+    assert_cached(open_cache(tmp_path), a_texts + b_texts)
+
+
+def test_eviction_and_compaction(tmp_path):
+    cache = open_cache(tmp_path, max_size_mb=1)
+    cache.max_entries = 4
+    texts = [f"t {i}" for i in range(6)]
+    cache.put_many('model', texts[:4], vectors(texts[:4]))
+    cache.get_many('model', texts[2:4])
+    cache.put_many('model', texts[4:], vectors(texts[4:]))
+
+    assert cache.get_many('model', texts[:2])[1] == [0, 1]
+    assert_cached(cache, texts[2:])
+    assert cache.get_stats()['evictions'] == 2
+
+    assert cache.compact()['entries'] == 4
+    assert cache.get_stats()['capacity'] == 4
+    reopened = open_cache(tmp_path)
+    reopened.max_entries = 4
+    assert_cached(reopened, texts[2:])
+    assert reopened.get_many('model', texts[:2])[1] == [0, 1]
+
+
+def test_clear_is_seen_by_other_instances(tmp_path):
+    a, b = open_cache(tmp_path), open_cache(tmp_path)
+    a.put_many('model', ["x"], vectors(["x"]))
+    assert_cached(b, ["x"])
+    a.clear()
+    assert b.get_many('model', ["x"])[1] == [0]
+
+
+def test_query_lru_evicts_the_least_recently_used():
+    lru = QueryEmbeddingLRU(max_entries=2)
+    for text in ("a", "b"):
+        lru.put('model', text, vectors([text])[0])
+    assert lru.get('model', " a ") is not None
+    lru.put('model', "c", vectors(["c"])[0])
+
+    assert lru.get('model', "b") is None
+    np.testing.assert_array_equal(lru.get('model', "a"), vectors(["a"])[0])
+    assert lru.get('other-model', "a") is None
+    assert lru.get_stats() == {'entries': 2, 'max_entries': 2, 'hits': 2, 'misses': 2, 'hit_rate': 0.5, 'evictions': 1}
+
+
+def test_repeated_queries_skip_the_api(vector_db, embedding_api, monkeypatch):
+    import document_processor
+
+    monkeypatch.setattr(document_processor, 'QUERY_CACHE_SIZE', 2)
+    monkeypatch.setattr(document_processor, 'QUERY_CACHE_DISK', False)
+    embeddings = document_processor.AzureOpenAIEmbeddings()
+
+    for query in ("drain pump", " drain  pump", "door seal", "drain pump", "filter", "door seal"):
+        np.testing.assert_array_equal(embeddings.embed_query(query), fake_embedding(" ".join(query.split())))
+
+    # "door seal" was evicted by "filter" after "drain pump" was used again
+    assert embedding_api.texts == ["drain pump", "door seal", "filter", "door seal"]
+    stats = embeddings.query_cache.get_stats()
+    assert (stats['entries'], stats['hits'], stats['misses'], stats['evictions']) == (2, 2, 4, 2)
@@ -0,0 +1,68 @@
+import numpy as np
+
+import document_processor
+from embedding_executor import EmbeddingExecutor, estimate_tokens
+
+
+def test_split_batch_hands_over_the_half_that_succeeded(make_processor, embedding_api):
+    processor = make_processor()
+    embeddings = processor.embeddings
+    embeddings.executor = EmbeddingExecutor(embeddings, workers=1, batch_size=4)
+    texts = [f"chunk {i}" for i in range(4)]
+    embedding_api.fail_texts = {"chunk 3"}
+
+    vectors, failed = embeddings.embed_documents_partial(texts)
+
+    assert failed == [2, 3]
+    assert np.any(vectors[:2]) and not np.any(vectors[2:])
+    # The good half went to the cache, so a retry only pays for the failed half
+    embedding_api.fail_texts = set()
+    embedding_api.texts = []
+    vectors, failed = embeddings.embed_documents_partial(texts)
+    assert failed == []
+    assert embedding_api.texts == ["chunk 2", "chunk 3"]
+
+
+def test_succeeded_runs():
+    assert EmbeddingExecutor._succeeded_runs(5, set()) == [(0, 5)]
+    assert EmbeddingExecutor._succeeded_runs(5, {0, 1, 2, 3, 4}) == []
+    assert EmbeddingExecutor._succeeded_runs(6, {2, 3}) == [(0, 2), (4, 6)]
+
+
+class RecordingBucket:
+    def __init__(self):
+        self.taken = []
+
+    def acquire(self, amount=1.0):
+        self.taken.append(amount)
+
+    def pause(self, seconds):
+        pass
+
+
+def test_retries_take_their_quota_again(make_processor, embedding_api, monkeypatch):
+    processor = make_processor()
+    embeddings = processor.embeddings
+    embeddings.executor = EmbeddingExecutor(embeddings, workers=1, batch_size=4)
+    embeddings.executor.request_bucket = requests = RecordingBucket()
+    embeddings.executor.token_bucket = tokens = RecordingBucket()
+    monkeypatch.setattr(document_processor.AzureOpenAIEmbeddings._make_embedding_request, '__defaults__', (3, None, None))
+    monkeypatch.setattr(document_processor.time, 'sleep', lambda seconds: None)
+    texts = [f"chunk {i}" for i in range(4)]
+    attempts = []
+
+    def create(input, engine=None, **kwargs):
+        attempts.append(len(requests.taken))
+        if len(attempts) < 3:
+            raise RuntimeError("service unavailable")
+        return embedding_api.create(input, engine=engine)
+
+    monkeypatch.setattr(document_processor.openai.Embedding, 'create', create)
+    vectors, failed = embeddings.executor.run(texts)
+
+    assert failed == []
+    assert np.all(np.any(vectors, axis=1))
+    # Every attempt waited for its own request and token allowance first
+    assert attempts == [1, 2, 3]
+    assert requests.taken == [1, 1, 1]
+    assert tokens.taken == [sum(estimate_tokens(text) for text in texts)] * 3
@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+
+from ingest_jobs import IngestJobs, COMPLETED, DUPLICATE, FAILED, QUEUED, QUEUE_FULL
+from shared_state import SharedState, fcntl
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(fcntl is None, reason="cross-process locks need fcntl")
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two IngestJobs as two server workers would have them: one database, separate owners."""
+    path = str(tmp_path / "ingest_jobs.db")
+    return [IngestJobs(path, SharedState(str(tmp_path)), max_queued=2) for _ in range(2)]
+
+
+def wait_for(jobs, job_id, state, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs.get(job_id)
+        if job['state'] == state:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} never reached {state}: {jobs.get(job_id)}")
+
+
+def test_any_worker_reports_a_job(workers):
+    a, b = workers
+    job, refused = a.reserve("manual.pdf")
+    assert refused is None
+
+    assert b.get(job['job_id'])['state'] == QUEUED
+    assert b.get(job['job_id'])['queue_position'] == 1
+
+    def run(progress):
+        progress('parsing', pages_total=4, pages_processed=2, chunks_parsed=10)
+        return {'success': True, 'file_id': 'abc'}
+
+    a.start(job['job_id'], run)
+    done = wait_for(b, job['job_id'], COMPLETED)
+    assert done['result'] == {'success': True, 'file_id': 'abc'}
+    assert done['progress'] == 1.0
+    assert [listed['job_id'] for listed in b.list()] == [job['job_id']]
+
+
+def test_same_file_is_refused_across_workers_until_finished(workers):
+    a, b = workers
+    job, _ = a.reserve("manual.pdf")
+
+    assert b.reserve("manual.pdf") == (None, DUPLICATE)
+    assert a.reserve("manual.pdf") == (None, DUPLICATE)
+
+    a.cancel(job['job_id'], "could not save")
+    assert b.get(job['job_id'])['state'] == FAILED
+    assert b.reserve("manual.pdf")[1] is None
+
+
+def test_queue_limit_is_per_worker(workers):
+    a, b = workers
+    a.reserve("one.pdf")
+    a.reserve("two.pdf")
+
+    assert a.reserve("three.pdf") == (None, QUEUE_FULL)
+    assert b.reserve("three.pdf")[1] is None
+
+
+def test_job_of_a_dead_process_is_failed_and_frees_its_file(tmp_path):
+    path = str(tmp_path / "ingest_jobs.db")
+    script = (
+        "import sys, time\n"
+        f"sys.path.insert(0, {SERVER_DIR!r})\n"
+        "from ingest_jobs import IngestJobs\n"
+        "from shared_state import SharedState\n"
+        f"jobs = IngestJobs({path!r}, SharedState({str(tmp_path)!r}))\n"
+        "print(jobs.reserve('manual.pdf')[0]['job_id'], flush=True)\n"
+        "time.sleep(60)\n"
+    )
+    worker = subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE, text=True)
+    try:
+        job_id = worker.stdout.readline().strip()
+        jobs = IngestJobs(path, SharedState(str(tmp_path)))
+
+        assert jobs.get(job_id)['state'] == QUEUED
+        assert jobs.reserve("manual.pdf") == (None, DUPLICATE)
+    finally:
+        worker.kill()
+        worker.wait()
+
+    job = jobs.get(job_id)
+    assert job['state'] == FAILED
+    assert 'interrupted' in job['error']
+    assert jobs.reserve("manual.pdf")[1] is None
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+
+from lexical_index import LexicalIndex, tokenize
+
+TEXTS = [
+    "Error code dE means the door is not locked",
+    "Clean the filter every month to keep the pump draining",
+    "The WA91V3 drum spins at 700 rpm",
+]
+
+
+def build():
+    index = LexicalIndex()
+    index.add(np.arange(len(TEXTS)), TEXTS)
+    return index
+
+
+def test_tokenize_keeps_codes_whole():
+    assert tokenize("Error dE on WA91V3_x") == ['error', 'de', 'on', 'wa91v3', 'x']
+
+
+def test_search_ranks_matching_chunks():
+    ids, scores = build().search("filter pump", k=2)
+    assert ids.tolist() == [1]
+    assert scores[0] > 0
+
+
+def test_search_respects_allowed_ids():
+    index = build()
+    assert sorted(index.search("the", k=3, allowed_ids=np.array([0, 2]))[0].tolist()) == [0, 2]
+    assert index.search("filter", k=3, allowed_ids=np.array([0, 2]))[0].tolist() == []
+
+
+def test_remove_drops_postings():
+    index = build()
+    index.remove(np.array([1]), [TEXTS[1]])
+    assert index.search("filter", k=3)[0].tolist() == []
+    assert index.doc_ids.tolist() == [0, 2]
+
+
+def test_copy_is_unaffected_by_changes_to_the_original():
+    index = build()
+    copy = index.copy()
+    index.remove(np.array([1]), [TEXTS[1]])
+    assert copy.search("filter", k=3)[0].tolist() == [1]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = build()
+    path = str(tmp_path / "lexical_index")
+    index.save(path)
+
+    loaded = LexicalIndex.load(path)
+
+    for query in ("door locked", "filter pump", "wa91v3 rpm"):
+        assert loaded.search(query, k=3)[0].tolist() == index.search(query, k=3)[0].tolist()
+
+
+def test_long_token_does_not_inflate_saved_terms(tmp_path):
+    index = LexicalIndex()
+    texts = [f"word{i}" for i in range(2000)] + ["x" * 20000]
+    index.add(np.arange(len(texts)), texts)
+    path = str(tmp_path / "lexical_index")
+    index.save(path)
+
+    # About 26 KB of term text, not 2001 terms padded to 20000 characters each
+    assert os.path.getsize(os.path.join(path, "terms.npy")) < 100_000
+    assert LexicalIndex.load(path).search("x" * 20000, k=1)[0].tolist() == [2000]
+
+
+def test_loads_terms_saved_as_a_string_array(tmp_path):
+    index = build()
+    path = str(tmp_path / "lexical_index")
+    index.save(path)
+    os.remove(os.path.join(path, "term_offsets.npy"))
+    np.save(os.path.join(path, "terms.npy"), np.array(sorted(index._postings), dtype=str))
+
+    assert LexicalIndex.load(path).search("filter", k=1)[0].tolist() == [1]
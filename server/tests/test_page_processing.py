@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+import page_processing
+from conftest import manual_pages, write_pdf
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_worker_pool_matches_in_thread_processing(tmp_path):
+    path = write_pdf(str(tmp_path / "manual.pdf"), manual_pages("washer", 2 * page_processing.PAGES_PER_TASK + 3))
+
+    in_thread, _ = page_processing.process_pdf_pages(path, 500, 50, workers=1)
+    pooled, timings = page_processing.process_pdf_pages(path, 500, 50, workers=2)
+
+    assert timings['workers'] == 2
+    assert [page['chunks'] for page in pooled] == [page['chunks'] for page in in_thread]
+
+
+def test_workers_do_not_import_the_main_script(tmp_path):
+    path = write_pdf(str(tmp_path / "manual.pdf"), manual_pages("washer", 2 * page_processing.PAGES_PER_TASK))
+    marker = tmp_path / "imported"
+    script = tmp_path / "server_main.py"
+    script.write_text(textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {SERVER_DIR!r})
+        if __name__ != '__main__':
+            open({str(marker)!r}, 'w').close()
+        import page_processing
+        if __name__ == '__main__':
+            pages, timings = page_processing.process_pdf_pages({path!r}, 500, 50, workers=2)
+            print(len(pages), timings['workers'])
+    """))
+
+    output = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=120)
+
+    assert output.returncode == 0, output.stderr
+    assert output.stdout.split() == [str(2 * page_processing.PAGES_PER_TASK), '2']
+    assert not marker.exists()
+
+
+def test_worker_errors_reach_the_caller(tmp_path):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    pool = page_processing.PagePool(1)
+    try:
+        with pytest.raises(Exception):
+            pool.submit(str(broken), 0, 1, 500, 50).result(timeout=60)
+        # The worker is still usable after a failed call
+        path = write_pdf(str(tmp_path / "manual.pdf"), manual_pages("washer", 1))
+        pages, _ = pool.submit(path, 0, 1, 500, 50).result(timeout=60)
+        assert len(pages) == 1
+    finally:
+        pool.shutdown()
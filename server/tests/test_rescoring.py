@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from rescoring import compute_lexical_features, rescore
+
+CHUNKS = [
+    "Select the Wool program and press Start. Use a neutral detergent approved for wool.",
+    "To clean the drain pump filter, open the flap and turn the filter anticlockwise.",
+    "Press the Temperature button to change the wash temperature. " * 10,
+    "Gentle cycle: follow these steps to protect delicate fabric. Select Gentle, set spin to 600, press Start.",
+    "Error code E21: the drain pump is blocked. Clean the drain pump filter.",
+    "",
+]
+QUERIES = ["drain pump filter", "Wool program", "how do I use the gentle cycle", "E21", "clean the drain pump", "xyz"]
+
+
+def rescore_one_at_a_time(distances, texts, query, detailed_boosts):
+    """The per-document loop similarity_search used before scoring was vectorized."""
+    scores = []
+    for score, text in zip(distances, texts):
+        query_lower = query.lower()
+        content_lower = text.lower()
+        if query_lower in content_lower:
+            score = score * 0.7
+        word_matches = sum(1 for word in query_lower.split() if word in content_lower)
+        if word_matches > 1:
+            score = score * (1.0 - (word_matches * 0.05))
+        if detailed_boosts and any(keyword in query_lower for keyword in ['program', 'cycle', 'course', 'setting', 'mode', 'function']):
+            if len(text) > 500:
+                score = score * 0.8
+            instructional_terms = ['press', 'select', 'button', 'follow', 'step', 'wash', 'rinse', 'spin', 'temperature', 'time', 'recommended', 'use']
+            if sum(1 for term in instructional_terms if term in content_lower) >= 3:
+                score = score * 0.85
+            detail_terms = ['gentle', 'protect', 'temperature', 'detergent', 'fabric', 'care', 'approved', 'woolmark', 'neutral', 'horizontal', 'cradling', 'soaking']
+            if sum(1 for term in detail_terms if term in content_lower) >= 2:
+                score = score * 0.9
+        scores.append(score)
+    return scores
+
+
+@pytest.mark.parametrize('detailed_boosts', [True, False])
+@pytest.mark.parametrize('query', QUERIES)
+def test_rescore_matches_the_per_document_loop(query, detailed_boosts):
+    distances = np.random.default_rng(0).uniform(0.2, 1.5, len(CHUNKS)).astype(np.float32)
+    features = compute_lexical_features(CHUNKS)
+
+    scores = rescore(distances, CHUNKS, features, query, detailed_boosts=detailed_boosts)
+
+    assert scores.tolist() == rescore_one_at_a_time(distances, CHUNKS, query, detailed_boosts)
+
+
+def test_rescore_of_no_candidates_is_empty():
+    assert len(rescore(np.zeros(0, dtype=np.float32), [], compute_lexical_features([]), "filter")) == 0
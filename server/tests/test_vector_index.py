@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from vector_index import bytes_per_vector, build_index, choose_index_type, default_params, exact_rerank, index_type_of
+
+DIMENSIONS = 64
+
+
+def clustered(count, seed=0):
+    """Unit vectors around a few centres, like chunks of related manuals."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((16, DIMENSIONS))
+    vectors = centres[rng.integers(0, len(centres), count)] + 0.3 * rng.standard_normal((count, DIMENSIONS))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def exact_neighbors(vectors, queries, k):
+    distances = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    return np.argsort(distances, axis=1, kind='stable')[:, :k]
+
+
+def recall(truth, found):
+    return float(np.mean([len(set(t.tolist()) & set(f.tolist())) / len(t) for t, f in zip(truth, found)]))
+
+
+@pytest.mark.parametrize('storage, min_recall, rerank_factor', [('fp16', 0.99, 4), ('int8', 0.9, 4), ('pq', 0.3, 16)])
+def test_rerank_restores_full_precision_order(storage, min_recall, rerank_factor):
+    vectors = clustered(2000)
+    ids = np.arange(len(vectors), dtype=np.int64) * 10
+    params = default_params('flat', len(vectors), {'pq_m': 32, 'pq_nbits': 4}, storage=storage)
+    index = build_index(DIMENSIONS, vectors, ids, params)
+    queries, k = clustered(40, seed=1), 10
+    truth = exact_neighbors(vectors, queries, k)
+
+    _, raw = index.search(queries, k)
+    _, candidates = index.search(queries, rerank_factor * k)
+    reranked = []
+    for query, row in zip(queries, candidates):
+        distances, order = exact_rerank(vectors, row // 10, query)
+        assert np.all(np.diff(distances[order]) >= 0)
+        np.testing.assert_allclose(distances[order], ((vectors[row[order] // 10] - query) ** 2).sum(axis=1), rtol=1e-5, atol=1e-6)
+        reranked.append(row[order[:k]] // 10)
+
+    assert recall(truth, raw // 10) >= min_recall
+    assert recall(truth, reranked) >= max(recall(truth, raw // 10), 0.95)
+    assert bytes_per_vector(index, params) < bytes_per_vector(build_index(DIMENSIONS, vectors[:1], ids[:1], {}), {})
+
+
+def test_auto_promotes_to_the_ann_type_at_the_threshold():
+    assert choose_index_type('auto', 99, 100, 'ivf') == 'flat'
+    assert choose_index_type('auto', 100, 100, 'ivf') == 'ivf'
+    assert choose_index_type('auto', 100, 100, 'hnsw') == 'hnsw'
+    assert choose_index_type('hnsw', 1, 100, 'ivf') == 'hnsw'
+    assert choose_index_type('flat', 10 ** 6, 100, 'ivf') == 'flat'
+
+
+@pytest.mark.parametrize('index_type', ['flat', 'ivf', 'hnsw'])
+def test_each_index_type_finds_vectors_by_their_ids(index_type):
+    vectors = clustered(1000)
+    ids = np.arange(len(vectors), dtype=np.int64) * 10 + 7
+    params = default_params(index_type, len(vectors))
+    index = build_index(DIMENSIONS, vectors, ids, params)
+
+    assert index_type_of(index) == index_type
+    _, found = index.search(vectors[:50], 1)
+    assert recall(ids[:50, None], found) >= 0.95
+    assert set(found.ravel().tolist()) <= set(ids.tolist())
@@ -64,12 +64,11 @@ def retrieve_tool(query, context):
     print(f"  - Brand: {brand}")
     print(f"  - Model: {model}")
     
-    active_manuals = [m for m in doc_processor.metadata.values() if not m.get('is_deleted', False)]
-    matching_manuals = [
-        m for m in active_manuals 
-        if (not brand or m.get('brand') == brand) and 
-           (not model or m.get('model') == model)
-    ]
+    # Catalog lookups instead of scanning every manual's metadata, both from the same published state
+    state = doc_processor.snapshot()
+    catalog, metadata = state.catalog, state.metadata
+    active_manuals = [metadata[file_id] for file_id in catalog.find() if file_id in metadata]
+    matching_manuals = [metadata[file_id] for file_id in catalog.find(brand, model) if file_id in metadata]
     
     print(f"📚 RETRIEVE: Found {len(active_manuals)} active manuals")
     print(f"📚 RETRIEVE: {len(matching_manuals)} manuals match brand/model criteria")
@@ -0,0 +1,160 @@
+import math
+from typing import Dict, Optional
+
+import numpy as np
+import faiss
+
+# Index types understood by build_index; 'auto' picks one based on corpus size
+INDEX_TYPES = ('flat', 'ivf', 'hnsw')
+
+# How vectors are encoded inside the index
+STORAGE_TYPES = ('float32', 'fp16', 'int8', 'pq')
+SCALAR_QUANTIZERS = {
+    'fp16': faiss.ScalarQuantizer.QT_fp16,
+    'int8': faiss.ScalarQuantizer.QT_8bit
+}
+
+
+def choose_storage(configured: str, num_vectors: int, pq_nbits: int = 8) -> str:
+    """
+    Resolve the configured vector encoding for the corpus size.
+
+    PQ codebooks need ~39 training points per centroid, so small corpora stay
+    at full precision until there is enough data to train them.
+    """
+    if configured not in STORAGE_TYPES:
+        return 'float32'
+    if configured == 'pq' and num_vectors < 39 * (2 ** pq_nbits):
+        return 'float32'
+    return configured
+
+
+def choose_index_type(configured: str, num_vectors: int, promotion_threshold: int, ann_type: str) -> str:
+    """Resolve the configured index type, promoting Flat to an ANN index past the threshold."""
+    if configured in INDEX_TYPES:
+        return configured
+    return ann_type if num_vectors >= promotion_threshold else 'flat'
+
+
+def default_params(index_type: str, num_vectors: int, overrides: Optional[Dict] = None,
+                   storage: str = 'float32') -> Dict:
+    """
+    Build/search parameters for an index type.
+
+    Zero or missing overrides fall back to size-based defaults (e.g. nlist ~ 4*sqrt(n),
+    capped so every list gets enough training points).
+    """
+    overrides = {key: value for key, value in (overrides or {}).items() if value}
+    params = {'type': index_type, 'storage': storage, 'trained_on': num_vectors}
+    if storage == 'pq':
+        params.update({'pq_m': 96, 'pq_nbits': 8})  # 96 bytes per 1536-d vector
+    if index_type == 'ivf':
+        nlist = int(4 * math.sqrt(max(num_vectors, 1)))
+        nlist = max(1, min(nlist, num_vectors // 39 or 1))
+        params.update({'nlist': nlist, 'nprobe': 16})
+    elif index_type == 'hnsw':
+        params.update({'M': 32, 'efConstruction': 200, 'efSearch': 128})
+    params.update({key: value for key, value in overrides.items() if key in params})
+    return params
+
+
+def build_index(dimensions: int, vectors: np.ndarray, ids: np.ndarray, params: Dict):
+    """
+    Create an ID-mapped index of the given type, train it if needed, and add vectors.
+
+    Every index is wrapped in IndexIDMap2 so entries are addressed by chunk ID
+    regardless of the underlying structure.
+    """
+    index_type = params.get('type', 'flat')
+    storage = params.get('storage', 'float32')
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    if index_type == 'ivf':
+        quantizer = faiss.IndexFlatL2(dimensions)
+        if storage in SCALAR_QUANTIZERS:
+            base = faiss.IndexIVFScalarQuantizer(quantizer, dimensions, params['nlist'], SCALAR_QUANTIZERS[storage], faiss.METRIC_L2)
+        elif storage == 'pq':
+            base = faiss.IndexIVFPQ(quantizer, dimensions, params['nlist'], params['pq_m'], params['pq_nbits'])
+        else:
+            base = faiss.IndexIVFFlat(quantizer, dimensions, params['nlist'], faiss.METRIC_L2)
+    elif index_type == 'hnsw':
+        if storage in SCALAR_QUANTIZERS:
+            base = faiss.IndexHNSWSQ(dimensions, SCALAR_QUANTIZERS[storage], params['M'])
+        elif storage == 'pq':
+            base = faiss.IndexHNSWPQ(dimensions, params['pq_m'], params['M'], params['pq_nbits'])
+        else:
+            base = faiss.IndexHNSWFlat(dimensions, params['M'])
+        base.hnsw.efConstruction = params['efConstruction']
+    else:
+        if storage in SCALAR_QUANTIZERS:
+            base = faiss.IndexScalarQuantizer(dimensions, SCALAR_QUANTIZERS[storage], faiss.METRIC_L2)
+        elif storage == 'pq':
+            base = faiss.IndexPQ(dimensions, params['pq_m'], params['pq_nbits'])
+        else:
+            base = faiss.IndexFlatL2(dimensions)
+
+    if not base.is_trained:
+        print(f"🏋️  Training {index_type.upper()}/{storage} index on {len(vectors)} vectors...")
+        base.train(vectors)
+
+    index = faiss.IndexIDMap2(base)
+    if len(vectors):
+        index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    apply_search_params(index, params)
+    return index
+
+
+def apply_search_params(index, params: Dict):
+    """Apply persisted query-time tuning (nprobe / efSearch) to an index."""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(base, faiss.IndexIVF) and params.get('nprobe'):
+        base.nprobe = params['nprobe']
+    elif isinstance(base, faiss.IndexHNSW) and params.get('efSearch'):
+        base.hnsw.efSearch = params['efSearch']
+
+
+def index_type_of(index) -> str:
+    """Name of the structure underneath an ID-mapped index."""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(base, faiss.IndexIVF):
+        return 'ivf'
+    if isinstance(base, faiss.IndexHNSW):
+        return 'hnsw'
+    return 'flat'
+
+
+def supports_remove(index_type: str) -> bool:
+    """HNSW graphs cannot drop entries in place; they have to be rebuilt."""
+    return index_type != 'hnsw'
+
+
+def bytes_per_vector(index, params: Dict) -> float:
+    """
+    Approximate resident bytes per indexed vector: the encoded vector plus ID
+    bookkeeping and, for ANN indexes, list IDs or graph links.
+    """
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(base, faiss.IndexHNSW):
+        code_size = faiss.downcast_index(base.storage).sa_code_size()
+        overhead = 2 * params.get('M', 32) * 4  # level-0 neighbour links
+    elif isinstance(base, faiss.IndexIVF):
+        code_size = base.code_size
+        overhead = 8  # inverted-list entry ID
+    else:
+        code_size = base.sa_code_size()
+        overhead = 0
+    # IndexIDMap2 keeps the ID array plus a reverse hash map
+    return float(code_size + overhead + 8 + 16)
+
+
+def exact_rerank(vectors: np.ndarray, positions: np.ndarray, query: np.ndarray):
+    """
+    Recompute full-precision squared L2 distances for candidate rows.
+
+    Returns:
+        (distances, order): exact distances and the candidate order, nearest first
+    """
+    candidates = np.asarray(vectors[positions], dtype=np.float32)
+    diff = candidates - query
+    distances = np.einsum('ij,ij->i', diff, diff)
+    return distances, np.argsort(distances, kind='stable')
@@ -42,7 +42,7 @@ import {
   Refresh as RefreshIcon,
   Storage as StorageIcon
 } from '@mui/icons-material';
-import { uploadFile, FileUploadResponse, getFiles, deleteFile, FileData, downloadFile } from '../services/api';
+import { uploadFile, FileUploadResponse, UploadJob, getFiles, deleteFile, FileData, downloadFile } from '../services/api';
 import { useTranslation } from 'react-i18next';
 
 const StyledCard = styled(Card)(({ theme }) => ({
@@ -131,6 +131,7 @@ const AdminPage: React.FC = () => {
   const [selectedFile, setSelectedFile] = useState<File | null>(null);
   const [isUploading, setIsUploading] = useState(false);
   const [uploadProgress, setUploadProgress] = useState(0);
+  const [uploadJob, setUploadJob] = useState<UploadJob | null>(null);
   const [uploadResult, setUploadResult] = useState<{
     type: 'success' | 'error';
     message: string;
@@ -350,20 +351,17 @@ ${t('admin.pleaseRenameOrDeleteExisting')}
     setUploadResult(null);
 
     try {
-      // Simulate progress for better UX
-      const progressInterval = setInterval(() => {
-        setUploadProgress(prev => Math.min(prev + 10, 90));
-      }, 200);
-
       const response: FileUploadResponse = await uploadFile(selectedFile, {
         brand: formData.brand.trim(),
         model: formData.model.trim(),
         product_type: formData.product_type.trim() || t('admin.table.unknown'),
         year: formData.year.trim() || new Date().getFullYear().toString(),
         language: formData.language
+      }, (job: UploadJob) => {
+        setUploadJob(job);
+        setUploadProgress(Math.round(job.progress * 100));
       });
 
-      clearInterval(progressInterval);
       setUploadProgress(100);
 
       setUploadResult({
@@ -402,6 +400,7 @@ ${t('admin.pleaseRenameOrDeleteExisting')}
       });
     } finally {
       setIsUploading(false);
+      setUploadJob(null);
     }
   };
 
@@ -711,7 +710,17 @@ ${t('admin.pleaseRenameOrDeleteExisting')}
                   <CircularProgress size={16} />
                 </Box>
                 <Typography variant="caption" color="text.secondary" sx={{ mb: 2, display: 'block' }}>
-                  {t('admin.uploadStatus.largeFileWarning')}
+                  {uploadJob && uploadJob.state === 'queued'
+                    ? t('admin.uploadStatus.queued', { position: uploadJob.queue_position })
+                    : uploadJob && uploadJob.pages_total
+                      ? t('admin.uploadStatus.jobProgress', {
+                          pages: uploadJob.pages_processed,
+                          totalPages: uploadJob.pages_total,
+                          chunks: uploadJob.chunks_embedded
+                        }) + (uploadJob.eta_seconds != null
+                          ? ' · ' + t('admin.uploadStatus.eta', { seconds: Math.ceil(uploadJob.eta_seconds) })
+                          : '')
+                      : t('admin.uploadStatus.largeFileWarning')}
                 </Typography>
                 <LinearProgress 
                   variant="determinate" 
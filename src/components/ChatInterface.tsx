@@ -27,7 +27,7 @@ import {
 // @ts-ignore
 import ReactMarkdown from 'react-markdown';
 import Header from './Header';
-import { summarizeConversation, sendMessage } from '../services/api';
+import { summarizeConversation, sendMessage, createSessionId } from '../services/api';
 
 // Styled components
 const MessageContainer = styled(Box)(({ theme }) => ({
@@ -314,6 +314,8 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ toggleColorMode, mode })
   const [currentFeedbackMessageId, setCurrentFeedbackMessageId] = useState<number | null>(null);
 
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // Conversation memory on the server is kept per chat session
+  const sessionIdRef = useRef<string>(createSessionId());
   const fileInputRef = useRef<HTMLInputElement>(null);
   const theme = useTheme();
 
@@ -332,7 +334,8 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ toggleColorMode, mode })
         method: 'POST',
         headers: {
           'Content-Type': 'application/json'
-        }
+        },
+        body: JSON.stringify({ session_id: sessionIdRef.current })
       }).catch(error => {
         console.error('Failed to clear memory:', error);
       });
@@ -566,7 +569,8 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ toggleColorMode, mode })
           awaiting_clarification: awaitingClarification,
           conversation: conversation,
           source_language: currentLanguage // Tell backend what language the user is actually using
-        }
+        },
+        sessionIdRef.current
       );
 
       setAwaitingClarification(data.awaiting_clarification);
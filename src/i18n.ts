@@ -162,6 +162,9 @@ i18n
               processing: 'Processing manual...',
               pleaseWait: 'Please wait while we process your file',
               largeFileWarning: 'Large files may take several minutes to process',
+              queued: 'Waiting for other uploads to finish (position {{position}})',
+              jobProgress: '{{pages}} of {{totalPages}} pages read, {{chunks}} chunks embedded',
+              eta: 'about {{seconds}}s left',
               success: 'Manual successfully uploaded',
               error: 'Failed to upload manual',
               validationError: 'Please fill in all required fields'
@@ -352,6 +355,9 @@ i18n
               processing: 'Procesando manual...',
               pleaseWait: 'Por favor espera mientras procesamos tu archivo',
               largeFileWarning: 'Los archivos grandes pueden tardar varios minutos en procesarse',
+              queued: 'Esperando a que terminen otras subidas (posición {{position}})',
+              jobProgress: '{{pages}} de {{totalPages}} páginas leídas, {{chunks}} fragmentos procesados',
+              eta: 'quedan unos {{seconds}}s',
               success: 'Manual subido exitosamente',
               error: 'Error al subir el manual',
               validationError: 'Por favor completa todos los campos requeridos'
@@ -26,6 +26,23 @@ export interface FileUploadResponse {
   language?: string;
   timestamp: number;
   message: string;
+  job_id?: string;
+}
+
+export interface UploadJob {
+  job_id: string;
+  filename: string;
+  state: 'queued' | 'running' | 'completed' | 'failed';
+  stage: string;
+  pages_total: number | null;
+  pages_processed: number;
+  chunks_total: number | null;
+  chunks_embedded: number;
+  progress: number; // 0..1
+  eta_seconds: number | null;
+  queue_position?: number;
+  result: FileUploadResponse | null;
+  error: string | null;
 }
 
 export interface FileData {
@@ -56,6 +73,16 @@ export interface ApiResponse {
   data?: any;
 }
 
+/**
+ * Create an id for a chat session; the backend keeps conversation memory per session
+ */
+export const createSessionId = (): string => {
+  if (typeof crypto !== 'undefined' && typeof crypto.randomUUID === 'function') {
+    return crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+};
+
 /**
  * Send a message to the backend and get a response
  */
@@ -69,7 +96,8 @@ export const sendMessage = async (
     awaiting_clarification?: boolean;
     conversation?: any[];
     source_language?: string;
-  }
+  },
+  sessionId?: string
 ): Promise<any> => {
   const response = await axios.post(`${API_BASE_URL}/chat`, {
     message,
@@ -77,6 +105,7 @@ export const sendMessage = async (
     responseLanguage,
     brand,
     model,
+    session_id: sessionId,
     ...(context && { 
       context: {
         ...context,
@@ -89,7 +118,40 @@ export const sendMessage = async (
 };
 
 /**
- * Upload a file to the backend with metadata
+ * Get the progress of a background upload job
+ */
+export const getUploadJob = async (jobId: string): Promise<UploadJob> => {
+  const response = await axios.get(`${API_BASE_URL}/jobs/${jobId}`, {
+    timeout: 10000,
+  });
+  return response.data;
+};
+
+/**
+ * Poll an upload job until it finishes, reporting progress along the way
+ */
+export const waitForUploadJob = async (
+  jobId: string,
+  onProgress?: (job: UploadJob) => void,
+  intervalMs: number = 1000
+): Promise<FileUploadResponse> => {
+  while (true) {
+    const job = await getUploadJob(jobId);
+    onProgress?.(job);
+    if (job.state === 'completed' && job.result) {
+      return job.result;
+    }
+    if (job.state === 'failed') {
+      throw new Error(`Upload failed: ${job.error || 'Error processing file'}`);
+    }
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+  }
+};
+
+/**
+ * Upload a file to the backend with metadata.
+ * The server processes it in the background; this resolves once processing
+ * completes, calling onProgress with each poll of the job.
  */
 export const uploadFile = async (
   file: File,
@@ -99,7 +161,8 @@ export const uploadFile = async (
     language?: string;
     product_type?: string;
     year?: string;
-  }
+  },
+  onProgress?: (job: UploadJob) => void
 ): Promise<FileUploadResponse> => {
   try {
     // Validate file type
@@ -131,7 +194,7 @@ export const uploadFile = async (
       headers: {
         'Content-Type': 'multipart/form-data',
       },
-      // Increase timeout to 5 minutes for large file processing
+      // Only the transfer happens in this request; processing is polled below
       timeout: 300000, // 5 minutes timeout
     });
     
@@ -139,6 +202,10 @@ export const uploadFile = async (
       throw new Error(response.data.error || 'Upload failed');
     }
     
+    // Existing manuals are answered directly, without a job
+    if (response.data.job_id) {
+      return await waitForUploadJob(response.data.job_id, onProgress);
+    }
     return response.data;
   } catch (error) {
     if (error instanceof AxiosError) {